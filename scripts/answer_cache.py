@@ -0,0 +1,114 @@
+"""
+answer_cache.py — Semantic answer cache for the /chat endpoint
+
+Parents ask the same few dozen questions (hours, fees, ages, location) in
+slightly different words. Before retrieval and generation, the question
+embedding is compared against recently answered questions; if one is within
+`threshold` cosine similarity, its stored answer is returned.
+
+Entries expire after `ttl` seconds, the least recently used entry is evicted
+when the cache is full, and everything is dropped when `version()` changes
+(the index manifest is rewritten by every `build`).
+
+Usage:
+    cache = AnswerCache(threshold=0.95, ttl=3600, version=lambda: manifest_mtime())
+    hit = cache.lookup(vec)
+    if hit is None:
+        answer = generate(...)
+        cache.store(question, vec, answer)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 512,
+                 version=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._version_fn = version or (lambda: None)
+        self._version = self._version_fn()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # slot → (question, answer, stored_at)
+        self._matrix = None             # (max_entries, dim) unit vectors
+        self._live = np.zeros(max_entries, dtype=bool)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def lookup(self, vec):
+        """Return the cached answer for the closest similar question, or None."""
+        q = _unit(vec)
+        with self._lock:
+            self._check_version()
+            if self._entries:
+                scores = self._matrix @ q
+                scores[~self._live] = -1.0
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.threshold:
+                    question, answer, stored_at = self._entries[slot]
+                    if time.monotonic() - stored_at <= self.ttl:
+                        self._entries.move_to_end(slot)
+                        self.hits += 1
+                        return answer
+                    self._drop(slot)
+                    self.expirations += 1
+            self.misses += 1
+            return None
+
+    def store(self, question: str, vec, answer) -> None:
+        q = _unit(vec)
+        with self._lock:
+            self._check_version()
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+            if len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            slot = int(np.argmin(self._live))
+            self._matrix[slot] = q
+            self._live[slot] = True
+            self._entries[slot] = (question, answer, time.monotonic())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._live[:] = False
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def _check_version(self) -> None:
+        version = self._version_fn()
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._live[:] = False
+
+    def _drop(self, slot: int) -> None:
+        del self._entries[slot]
+        self._live[slot] = False
+
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
@@ -0,0 +1,108 @@
+"""
+bench_extract.py — Page extraction throughput per parser backend
+
+Runs every installed extract.py backend over saved HTML pages and compares
+them with the old two-parse BeautifulSoup path (one parse for the page data,
+a second one for the links to crawl). Also checks that every backend returns
+the same extraction as html.parser.
+
+Usage:
+    python bench_extract.py                          # fixtures/html/*.html, 50 rounds
+    python bench_extract.py --html-dir saved_pages --rounds 200 --json bench_extract.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import numpy as np
+
+from extract import available_backends, extract
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+BASE_URL = "https://www.friendshipdaycare.com"
+
+
+def legacy(html: str, url: str) -> set:
+    """The pre-extract.py path: parse once for the page data, again for the links."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.select("nav, header, footer, script, style, iframe, noscript"):
+        tag.decompose()
+    main = soup.find("main") or soup.find("article") or soup.find("body")
+    [h.get_text(strip=True) for h in soup.find_all(["h1", "h2", "h3"])]
+    [p.get_text(strip=True) for p in main.find_all("p")]
+    [img["src"] for img in soup.find_all("img", src=True)]
+    [a.get_text(strip=True) for a in soup.find_all("a", href=True)]
+
+    soup = BeautifulSoup(html, "html.parser")
+    links = set()
+    for a in soup.find_all("a", href=True):
+        full = urljoin(url, a["href"])
+        if urlparse(full).netloc == urlparse(BASE_URL).netloc:
+            links.add(full.split("#")[0].rstrip("/"))
+    return links
+
+
+def run(fn, pages, rounds: int) -> list:
+    times = []
+    for _ in range(rounds):
+        for url, html in pages:
+            t = time.perf_counter()
+            fn(html, url)
+            times.append(time.perf_counter() - t)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction backends")
+    parser.add_argument("--html-dir", type=Path, default=FIXTURES, help="directory of saved *.html pages")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--json", type=Path, help="also write results here")
+    args = parser.parse_args()
+
+    files = sorted(args.html_dir.glob("*.html"))
+    pages = [(f"{BASE_URL}/{f.stem}", f.read_text(encoding="utf-8")) for f in files]
+    size = sum(len(html.encode("utf-8")) for _, html in pages)
+    backends = available_backends()
+
+    reference = None
+    if "html.parser" in backends:
+        reference = [extract(html, url, BASE_URL, "html.parser") for url, html in pages]
+
+    candidates = [("legacy (2× html.parser)", legacy)]
+    candidates += [(name, lambda html, url, name=name: extract(html, url, BASE_URL, name)) for name in backends]
+    results = []
+    for name, fn in candidates:
+        fn(*reversed(pages[0]))  # warm-up: imports
+        times = run(fn, pages, args.rounds)
+        same = "-"
+        if reference is not None and name in backends:
+            same = all(extract(html, url, BASE_URL, name) == ref for (url, html), ref in zip(pages, reference))
+        results.append({
+            "backend": name,
+            "pages_per_sec": round(len(times) / sum(times), 1),
+            "mb_per_sec": round(size * args.rounds / sum(times) / 2**20, 2),
+            "p50_ms": round(float(np.percentile(times, 50)) * 1000, 3),
+            "p95_ms": round(float(np.percentile(times, 95)) * 1000, 3),
+            "same_output": same,
+        })
+    base = results[0]["pages_per_sec"]
+    for r in results:
+        r["speedup"] = round(r["pages_per_sec"] / base, 2)
+
+    print(f"\n📊 {len(pages)} pages ({size / 1024:.0f} KiB) × {args.rounds} rounds\n")
+    cols = list(results[0])
+    print("  ".join(f"{c:>24}" if c == "backend" else f"{c:>13}" for c in cols))
+    for r in results:
+        print("  ".join(f"{r[c]!s:>24}" if c == "backend" else f"{r[c]!s:>13}" for c in cols))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✅ Results → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
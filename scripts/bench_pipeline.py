@@ -0,0 +1,565 @@
+"""
+bench_pipeline.py — End-to-end benchmark: scrape → build → serve, fully offline
+
+Everything runs locally, so results only move when our code does:
+
+    fixture site   N generated, interlinked HTML pages served by http.server
+    fake OpenAI    deterministic hash embeddings, canned chat answers (and SSE),
+                   with an optional latency knob; nothing leaves the machine
+    corpora        synthetic pages.jsonl files sized to ~1k / 10k / 100k chunks
+
+Each stage runs the real `rag_pipeline.py` command in its own subprocess and
+working directory, so peak RSS is that process's own high-water mark:
+
+    crawl   `scrape --fetch http` over the fixture site  → pages/sec, peak RSS
+    build   `build --full` per corpus                     → chunks/sec, peak RSS
+    serve   `serve` per corpus, /chat under concurrent load
+                                                          → startup to ready, p50/p95/p99, req/s, peak RSS,
+                                                            per-worker RSS/PSS, mean batch and context tokens,
+                                                            mean time per stage (serve's /metrics)
+
+The answer cache is disabled and every question is distinct, so each /chat
+request pays for embedding, retrieval and generation.
+
+Usage:
+    python bench_pipeline.py                                   # crawl 200 pages; 1k/10k/100k chunks
+    python bench_pipeline.py --sizes 1000 10000 --requests 500 --concurrency 32
+    python bench_pipeline.py --stages build serve --retriever numpy --json bench_pipeline.json
+    python bench_pipeline.py --llm-latency 0.3                 # closer to real API round trips
+    python bench_pipeline.py --stages build serve --batch-max 1  # serve without micro-batching
+    python bench_pipeline.py --stages build serve --retriever numpy --workers 4
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PIPELINE = SCRIPTS_DIR / "rag_pipeline.py"
+STAGES = ["crawl", "build", "serve"]
+SIZES = [1_000, 10_000, 100_000]       # target chunks per synthetic corpus
+SECTIONS_PER_PAGE = 10                 # each section is sized to become one chunk
+WORDS_PER_PARAGRAPH = 55               # 2 paragraphs ≈ 200 tokens: one chunk, never split
+DIMS = 256                             # fake embedding width
+HEALTH_TIMEOUT = 300                   # seconds for `serve` to answer /health
+WORDS = (
+    "child children play learn learning montessori teacher classroom toddler infant preschool "
+    "outdoor garden story reading music art paint snack lunch nap schedule parent family tour "
+    "enroll enrollment tuition program curriculum safety license staff ratio care day week month "
+    "morning afternoon pickup dropoff holiday closed open activity skill social emotional language "
+    "math science sensory practical life independence creativity friendship kindness routine"
+).split()
+
+
+def vocabulary(size=2000, seed=0):
+    """Domain words plus made-up ones, so BM25 and chunk IDs see a realistic spread."""
+    rng = random.Random(seed)
+    extra = {"".join(rng.choice("abcdefghijklmnoprstuvw") for _ in range(rng.randint(4, 10)))
+             for _ in range(size)}
+    return WORDS + sorted(extra)
+
+
+def sentence(rng, words, n):
+    return " ".join(rng.choice(words) for _ in range(n)).capitalize() + "."
+
+
+def paragraph(rng, words, n_words):
+    out, left = [], n_words
+    while left > 0:
+        n = min(left, rng.randint(8, 16))
+        out.append(sentence(rng, words, n))
+        left -= n
+    return " ".join(out)
+
+
+# ─────────────────────────────────────────────
+# Fixture site and synthetic corpora
+# ─────────────────────────────────────────────
+def write_fixture_site(root: Path, pages: int, seed=0) -> None:
+    """`pages` interlinked pages: home → every page, each page → a few random others."""
+    rng = random.Random(seed)
+    words = vocabulary(seed=seed)
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "p").mkdir(exist_ok=True)
+
+    def html(title, links, sections):
+        nav = "".join(f'<a href="{href}">{text}</a>' for href, text in links)
+        body = "".join(f"<h2>{h}</h2>" + "".join(f"<p>{p}</p>" for p in ps) for h, ps in sections)
+        return (f"<!DOCTYPE html><html><head><title>{title}</title>"
+                f'<meta name="description" content="{title} at Friendship Daycare"></head>'
+                f"<body><header><nav>{nav}</nav></header><main><h1>{title}</h1>{body}</main>"
+                f"<footer>© Friendship Daycare</footer></body></html>")
+
+    def sections(n):
+        return [(sentence(rng, words, 4)[:-1], [paragraph(rng, words, 40), paragraph(rng, words, 30)])
+                for _ in range(n)]
+
+    home_links = [(f"/p/{i}.html", f"Page {i}") for i in range(pages)]
+    (root / "index.html").write_text(html("Home", home_links, sections(3)), encoding="utf-8")
+    for i in range(pages):
+        links = [("/", "Home")] + [(f"/p/{j}.html", f"Page {j}") for j in rng.sample(range(pages), min(5, pages))]
+        (root / "p" / f"{i}.html").write_text(html(f"Page {i}", links, sections(4)), encoding="utf-8")
+
+
+def write_corpus(path: Path, chunks: int, seed=0) -> int:
+    """A pages.jsonl of about `chunks` chunks; returns the page count."""
+    from page_store import PageWriter
+
+    rng = random.Random(seed)
+    words = vocabulary(seed=seed)
+    n_pages = max(1, chunks // SECTIONS_PER_PAGE)
+    with PageWriter(path, fsync=False) as out:
+        for i in range(n_pages):
+            secs = [{"heading": f"{sentence(rng, words, 3)[:-1]} {i}.{s}",
+                     "paragraphs": [paragraph(rng, words, WORDS_PER_PARAGRAPH) for _ in range(2)]}
+                    for s in range(SECTIONS_PER_PAGE)]
+            text = "\n\n".join("\n\n".join([s["heading"], *s["paragraphs"]]) for s in secs)
+            out.write({"url": f"https://bench.local/p/{i}", "title": f"Page {i}", "text": text, "sections": secs})
+    return n_pages
+
+
+# ─────────────────────────────────────────────
+# Fake OpenAI API (runs in its own process: `--fake-openai PORT`)
+# ─────────────────────────────────────────────
+def fake_embedding(text: str, dims: int) -> np.ndarray:
+    """Deterministic unit vector, like the real API's (Chroma's scores assume unit length)."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dims, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    dims = DIMS
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path.endswith("/embeddings"):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            as_base64 = body.get("encoding_format") == "base64"
+            data = []
+            for i, text in enumerate(inputs):
+                vec = fake_embedding(str(text), self.dims)
+                emb = base64.b64encode(vec.tobytes()).decode("ascii") if as_base64 else vec.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": emb})
+            tokens = sum(len(str(t)) // 4 for t in inputs)
+            self.send_json({"object": "list", "data": data, "model": body["model"],
+                            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+        elif self.path.endswith("/chat/completions"):
+            question = body["messages"][-1]["content"].rsplit("Question:", 1)[-1].strip()
+            answer = f"Thanks for asking about {question[:60]}! Please call us to learn more."
+            if body.get("stream"):
+                self.send_stream(body["model"], answer.split(" "))
+            else:
+                self.send_json({
+                    "id": "bench", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": answer}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+        else:
+            self.send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    def send_json(self, data, status=200):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_stream(self, model, words):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, word in enumerate(words):
+            chunk = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": (" " if i else "") + word},
+                                  "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+def run_fake_openai(port: int, dims: int, latency: float) -> None:
+    FakeOpenAI.dims, FakeOpenAI.latency = dims, latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAI)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+# ─────────────────────────────────────────────
+# Process helpers
+# ─────────────────────────────────────────────
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout=30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"nothing listening on port {port} after {timeout:.0f}s")
+
+
+def maxrss_mb(rusage) -> float:
+    """ru_maxrss is KiB on Linux, bytes on macOS."""
+    return rusage.ru_maxrss / (2**20 if sys.platform == "darwin" else 1024)
+
+
+def reap(proc: subprocess.Popen) -> tuple:
+    """Wait for `proc`; returns (exit code, peak RSS in MB) of that process."""
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, round(maxrss_mb(rusage), 1)
+
+
+def stop(proc: subprocess.Popen, timeout=30.0) -> tuple:
+    """SIGINT (so uvicorn runs its shutdown), SIGKILL after `timeout`; then reap()."""
+    proc.send_signal(signal.SIGINT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return proc.returncode, round(maxrss_mb(rusage), 1)
+        time.sleep(0.1)
+    proc.kill()
+    return reap(proc)
+
+
+def run_pipeline(args: list, cwd: Path, env: dict, log: Path) -> dict:
+    """Run one rag_pipeline.py command to completion: elapsed seconds and peak RSS."""
+    with open(log, "w") as out:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, str(PIPELINE), *args], cwd=cwd, env=env,
+                                stdout=out, stderr=subprocess.STDOUT)
+        code, rss = reap(proc)
+        elapsed = time.perf_counter() - started
+    if code != 0:
+        raise RuntimeError(f"`rag_pipeline.py {' '.join(args)}` exited {code}; see {log}:\n"
+                           + log.read_text()[-2000:])
+    return {"seconds": round(elapsed, 3), "peak_rss_mb": rss}
+
+
+def count_lines(path: Path) -> int:
+    from page_store import PageReader
+    return sum(1 for _ in PageReader(path).lines())
+
+
+def count_chunks(workdir: Path) -> int:
+    from rag_pipeline import MANIFEST_FILE
+    manifest = json.loads((workdir / MANIFEST_FILE).read_text(encoding="utf-8"))
+    # Pages that repeat a chunk share its ID; count each stored chunk once
+    return len({cid for entry in manifest["pages"].values() for cid in entry["chunks"]})
+
+
+def percentile(values, p) -> float:
+    return round(float(np.percentile(values, p)) * 1000, 2) if values else None
+
+
+# ─────────────────────────────────────────────
+# Stages
+# ─────────────────────────────────────────────
+def bench_crawl(workdir: Path, env: dict, pages: int, workers: int) -> dict:
+    site = workdir / "site"
+    write_fixture_site(site, pages)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1",
+                               "--directory", str(site)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        run = run_pipeline(["scrape", "--base-url", f"http://127.0.0.1:{port}", "--fetch", "http",
+                            "--full", "--workers", str(workers)], workdir, env, workdir / "crawl.log")
+    finally:
+        server.terminate()
+        server.wait()
+    from rag_pipeline import PAGES_FILE
+    scraped = count_lines(workdir / PAGES_FILE)
+    return {"pages": scraped, **run, "pages_per_s": round(scraped / run["seconds"], 1)}
+
+
+def bench_build(workdir: Path, env: dict, chunks: int, embed_workers: int) -> dict:
+    from rag_pipeline import PAGES_FILE
+    pages = write_corpus(workdir / PAGES_FILE, chunks)
+    run = run_pipeline(["build", "--full", "--embed-workers", str(embed_workers)],
+                       workdir, env, workdir / "build.log")
+    built = count_chunks(workdir)
+    return {"pages": pages, "chunks": built, **run, "chunks_per_s": round(built / run["seconds"], 1)}
+
+
+async def load(url: str, questions: list, concurrency: int) -> dict:
+    import httpx
+
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120.0) as client:
+        queue = asyncio.Queue()
+        for q in questions:
+            queue.put_nowait(q)
+
+        async def user():
+            nonlocal errors
+            while not queue.empty():
+                question = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    resp = await client.post(url, json={"question": question})
+                    resp.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": len(questions),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": percentile(latencies, 100),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+    }
+
+
+def bench_serve(workdir: Path, env: dict, requests: int, concurrency: int, retriever: str,
+                dense_only: bool, warmup: int, batch_window_ms: float, batch_max: int, workers: int) -> dict:
+    import httpx
+    from rag_pipeline import METRICS_DUMP
+
+    port = free_port()
+    cmd = [sys.executable, str(PIPELINE), "serve", "--host", "127.0.0.1", "--port", str(port),
+           "--answer-threshold", "2", "--retriever", retriever,
+           "--batch-window-ms", str(batch_window_ms), "--batch-max", str(batch_max), "--workers", str(workers)]
+    cmd += ["--dense-only"] if dense_only else []
+    rng = random.Random(1)
+    words = vocabulary()
+    questions = [f"{i}: {sentence(rng, words, rng.randint(5, 12))[:-1]}?" for i in range(warmup + requests)]
+
+    with open(workdir / "serve.log", "w") as out:
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=out, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + HEALTH_TIMEOUT
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"serve exited {proc.returncode}; see {workdir / 'serve.log'}")
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"serve not healthy after {HEALTH_TIMEOUT}s")
+                time.sleep(0.1)
+            startup = time.perf_counter() - started
+
+            url = f"http://127.0.0.1:{port}/chat"
+            # Other workers' metrics reach /metrics with their next dump
+            settle = METRICS_DUMP * 1.5 if workers > 1 else 0
+            if warmup:
+                asyncio.run(load(url, questions[:warmup], min(concurrency, warmup)))
+            time.sleep(settle)
+            before = histogram_totals(port)
+            result = asyncio.run(load(url, questions[warmup:], concurrency))
+            time.sleep(settle)
+            after = histogram_totals(port)
+            memory = worker_memory(proc.pid)
+        finally:
+            _, rss = stop(proc)
+
+    def means(metric, scale=1):
+        was = before.get(metric, {})
+        return {label: round((total - was.get(label, (0, 0))[0]) / (n - was.get(label, (0, 0))[1]) * scale, 2)
+                for label, (total, n) in after.get(metric, {}).items() if n > was.get(label, (0, 0))[1]}
+
+    batches = means("rag_batch_size")
+    context = means("rag_context_tokens")
+    return {"startup_s": round(startup, 3), **result, "peak_rss_mb": rss, "workers": workers, **memory,
+            "embed_batch": batches.get("embed", 0), "retrieve_batch": batches.get("retrieve", 0),
+            "context_tokens": context.get("packed", 0), "tokens_saved": context.get("saved", 0),
+            "stage_mean_ms": means("rag_stage_seconds", 1000)}
+
+
+def worker_memory(pid: int) -> dict:
+    """Mean RSS and PSS of the serving processes (the forked workers, else `pid` itself), in MB.
+
+    RSS counts shared pages (the mapped index) in full for every worker; PSS
+    splits them between the processes sharing them, so PSS × workers is the
+    real total.
+    """
+    try:
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    except OSError:  # not Linux
+        return {}
+    rss, pss = [], []
+    for p in children or [str(pid)]:
+        fields = {}
+        for line in Path(f"/proc/{p}/smaps_rollup").read_text().splitlines()[1:]:
+            name, value = line.split(":", 1)
+            fields[name] = int(value.split()[0])
+        rss.append(fields["Rss"])
+        pss.append(fields["Pss"])
+    return {"worker_rss_mb": round(sum(rss) / len(rss) / 1024, 1), "worker_pss_mb": round(sum(pss) / len(pss) / 1024, 1)}
+
+
+def histogram_totals(port: int) -> dict:
+    """metric → label → (sum, count) for serve's one-label histograms (stage latency, batch and context size)."""
+    import httpx
+
+    totals = {}
+    for line in httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=5.0).text.splitlines():
+        for suffix, i in (("_sum", 0), ("_count", 1)):
+            for metric in ("rag_stage_seconds", "rag_batch_size", "rag_context_tokens"):
+                if line.startswith(f"{metric}{suffix}{{"):
+                    label = line.split('="', 1)[1].split('"', 1)[0]
+                    totals.setdefault(metric, {}).setdefault(label, [0.0, 0])[i] = float(line.rsplit(" ", 1)[1])
+    return totals
+
+
+# ─────────────────────────────────────────────
+# Driver
+# ─────────────────────────────────────────────
+def environment() -> dict:
+    import importlib.metadata as md
+
+    versions = {}
+    for pkg in ["chromadb", "fastapi", "httpx", "numpy", "openai", "selectolax", "lxml", "tiktoken", "uvicorn"]:
+        try:
+            versions[pkg] = md.version(pkg)
+        except md.PackageNotFoundError:
+            versions[pkg] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "commit": commit, "packages": versions}
+
+
+def print_table(title, rows):
+    if not rows:
+        return
+    print(f"\n📊 {title}\n")
+    cols = list(rows[0])
+    print("  ".join(f"{c:>12}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{r[c]!s:>12}" for c in cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of rag_pipeline.py")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--pages", type=int, default=200, help="fixture site size for the crawl")
+    parser.add_argument("--crawl-workers", type=int, default=8)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="target chunks per corpus")
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=300, help="/chat requests per corpus")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests before the measured ones")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--retriever", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--dense-only", action="store_true", help="serve without BM25 fusion")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0, help="serve's micro-batching window")
+    parser.add_argument("--batch-max", type=int, default=32, help="serve's max batch (1 = no batching)")
+    parser.add_argument("--workers", type=int, default=1, help="serve's pre-forked workers (needs --retriever numpy)")
+    parser.add_argument("--dims", type=int, default=DIMS, help="fake embedding width")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="seconds the fake API sleeps per call (0 = measure only our overhead)")
+    parser.add_argument("--workdir", type=Path, help="keep all artifacts here (default: a temp dir)")
+    parser.add_argument("--json", type=Path, help="also write results here")
+    parser.add_argument("--fake-openai", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.workers > 1 and args.retriever != "numpy":
+        parser.error("--workers > 1 needs --retriever numpy")
+
+    if args.fake_openai:  # child process
+        run_fake_openai(args.fake_openai, args.dims, args.llm_latency)
+        return
+
+    root = args.workdir or Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    root.mkdir(parents=True, exist_ok=True)
+    api_port = free_port()
+    api = subprocess.Popen([sys.executable, __file__, "--fake-openai", str(api_port), "--dims", str(args.dims),
+                            "--llm-latency", str(args.llm_latency)])
+    env = {**os.environ, "OPENAI_BASE_URL": f"http://127.0.0.1:{api_port}/v1", "OPENAI_API_KEY": "bench",
+           "ANONYMIZED_TELEMETRY": "False", "PYTHONUNBUFFERED": "1"}
+    results = {"env": environment(), "config": {k: (str(v) if isinstance(v, Path) else v)
+                                                for k, v in vars(args).items() if k != "fake_openai"},
+               "crawl": None, "corpora": []}
+
+    try:
+        wait_for_port(api_port)
+        if "crawl" in args.stages:
+            print(f"🕷  Crawling a {args.pages + 1}-page fixture site...")
+            workdir = root / "crawl"
+            workdir.mkdir(exist_ok=True)
+            results["crawl"] = bench_crawl(workdir, env, args.pages, args.crawl_workers)
+
+        for size in args.sizes if {"build", "serve"} & set(args.stages) else []:
+            workdir = root / f"corpus-{size}"
+            workdir.mkdir(exist_ok=True)
+            entry = {"target_chunks": size}
+            print(f"🧱 Building a ~{size}-chunk corpus...")
+            entry["build"] = bench_build(workdir, env, size, args.embed_workers)
+            if "serve" in args.stages:
+                print(f"🚀 Serving it: {args.requests} × /chat at concurrency {args.concurrency}...")
+                entry["serve"] = bench_serve(workdir, env, args.requests, args.concurrency, args.retriever,
+                                             args.dense_only, args.warmup, args.batch_window_ms, args.batch_max,
+                                             args.workers)
+            results["corpora"].append(entry)
+    finally:
+        api.terminate()
+        api.wait()
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if results["crawl"]:
+        print_table("Crawl", [results["crawl"]])
+    print_table("Build", [{"target": c["target_chunks"], **c["build"]} for c in results["corpora"]])
+    served = [c for c in results["corpora"] if "serve" in c]
+    print_table(f"Serve (/chat, {args.retriever}{', dense only' if args.dense_only else ' + BM25'})",
+                [{"chunks": c["build"]["chunks"], **{k: v for k, v in c["serve"].items() if k != "stage_mean_ms"}}
+                 for c in served])
+    print_table("Mean ms per stage (from /metrics)",
+                [{"chunks": c["build"]["chunks"], **c["serve"]["stage_mean_ms"]} for c in served
+                 if c["serve"]["stage_mean_ms"]])
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✅ Results → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+bench_retrievers.py — Chroma vs. NumPy retriever: startup, latency, RSS
+
+Run after `python rag_pipeline.py build` (it needs both chroma_db/ and
+vector_index/). Each backend is measured in its own subprocess so startup
+time and resident memory are not polluted by the other.
+
+Usage:
+    python bench_retrievers.py                  # 500 queries, k=4, batch 32
+    python bench_retrievers.py --queries 2000 --k 8 --json bench_retrievers.json
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rag_pipeline import CHROMA_DIR, COLLECTION, VECTOR_INDEX_DIR
+
+BACKENDS = ["chroma", "numpy"]
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), falling back to peak RSS."""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, p) -> float:
+    return float(np.percentile(values, p)) * 1000
+
+
+def run_backend(backend: str, queries_path: str, k: int, batch: int) -> dict:
+    base_rss = rss_mb()
+    started = time.perf_counter()
+    if backend == "numpy":
+        from retrievers import NumpyRetriever
+        retriever = NumpyRetriever(VECTOR_INDEX_DIR)
+    else:
+        import chromadb
+        from retrievers import ChromaRetriever
+        retriever = ChromaRetriever(chromadb.PersistentClient(path=CHROMA_DIR).get_collection(COLLECTION))
+    queries = np.load(queries_path)
+    retriever.search(queries[0], k)  # first query pays lazy loading
+    startup = time.perf_counter() - started
+
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        retriever.search(q, k)
+        latencies.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        retriever.search_batch(queries[i:i + batch], k)
+    batched = time.perf_counter() - t
+
+    return {
+        "backend": backend,
+        "startup_s": round(startup, 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "single_qps": round(len(queries) / sum(latencies), 1),
+        "batched_qps": round(len(queries) / batched, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_delta_mb": round(rss_mb() - base_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval backends")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--json", type=Path, help="also write results here")
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--queries-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:  # child process
+        print(json.dumps(run_backend(args.backend, args.queries_file, args.k, args.batch)))
+        return
+
+    # Queries: stored chunk vectors with noise, so they look like real questions
+    from retrievers import NumpyRetriever
+    index = NumpyRetriever(VECTOR_INDEX_DIR)
+    rng = np.random.default_rng(0)
+    rows = np.asarray(index.matrix[rng.integers(0, len(index), args.queries)])
+    queries = rows + rng.normal(0, 0.02, rows.shape).astype(np.float32)
+    del index
+
+    results = []
+    with tempfile.NamedTemporaryFile(suffix=".npy") as f:
+        np.save(f.name, queries)
+        for backend in BACKENDS:
+            out = subprocess.run(
+                [sys.executable, __file__, "--backend", backend, "--queries-file", f.name,
+                 "--k", str(args.k), "--batch", str(args.batch)],
+                check=True, capture_output=True, text=True,
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"\n📊 {args.queries} queries, k={args.k}, {queries.shape[1]}-dim\n")
+    cols = list(results[0])
+    print("  ".join(f"{c:>13}" for c in cols))
+    for r in results:
+        print("  ".join(f"{r[c]!s:>13}" for c in cols))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n✅ Results → {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bm25.py — Precomputed inverted index with BM25 scoring
+
+Dense embeddings blur exact terms: street names, program names and fee
+amounts. This lexical index catches those. It is built from the same chunks,
+in the same order, as the NumPy vector index and lives next to it:
+
+    vector_index/bm25_terms.json      term → [postings offset, document frequency]
+    vector_index/bm25_docs.npy        posting doc ids (int32), grouped by term
+    vector_index/bm25_tfs.npy         posting term frequencies (uint16)
+    vector_index/bm25_doc_len.npy     tokens per document (int32)
+
+The postings are memory-mapped, so serve workers share them.
+
+`rrf_fuse` merges ranked lists from several retrievers with reciprocal rank
+fusion, which needs no score calibration between BM25 and cosine similarity.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its of on or "
+    "our the their there this to we what when where which who will with you your".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        if tok in STOPWORDS:
+            continue
+        if tok[0].isdigit():
+            tok = tok.replace(",", "")  # "1,200" and "1200" are the same fee
+        tokens.append(tok)
+    return tokens
+
+
+def write_bm25(path, texts) -> None:
+    """Build the inverted index for `texts` (doc id = position) into `path`."""
+    path = Path(path)
+    postings = {}
+    doc_len = np.zeros(len(texts), dtype=np.int32)
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        doc_len[doc] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    terms, docs, tfs = {}, [], []
+    for term in sorted(postings):
+        terms[term] = [len(docs), len(postings[term])]
+        for doc, tf in postings[term]:
+            docs.append(doc)
+            tfs.append(min(tf, 65535))
+
+    (path / "bm25_terms.json").write_text(json.dumps(terms, ensure_ascii=False), encoding="utf-8")
+    np.save(path / "bm25_docs.npy", np.asarray(docs, dtype=np.int32))
+    np.save(path / "bm25_tfs.npy", np.asarray(tfs, dtype=np.uint16))
+    np.save(path / "bm25_doc_len.npy", doc_len)
+
+
+class BM25Retriever:
+    """Lexical top-k over the chunks of a NumpyRetriever (which materializes the hits)."""
+
+    def __init__(self, path, chunks):
+        path = Path(path)
+        self.chunks = chunks
+        self.terms = json.loads((path / "bm25_terms.json").read_text(encoding="utf-8"))
+        self.docs = np.load(path / "bm25_docs.npy", mmap_mode="r")
+        self.tfs = np.load(path / "bm25_tfs.npy", mmap_mode="r")
+        self.doc_len = np.load(path / "bm25_doc_len.npy").astype(np.float32)
+        self.n = len(self.doc_len)
+        self.avgdl = float(self.doc_len.mean()) if self.n else 0.0
+        # Per-document length normalization is query independent
+        self.norm = K1 * (1 - B + B * self.doc_len / self.avgdl) if self.n else self.doc_len
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.terms:
+                continue
+            start, df = self.terms[term]
+            docs = self.docs[start:start + df]
+            tf = self.tfs[start:start + df].astype(np.float32)
+            idf = math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (K1 + 1) / (tf + self.norm[docs])
+        return scores
+
+    def search(self, query: str, k: int) -> list:
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.chunks.hit(int(i), scores[i]) for i in top]
+
+
+def rrf_fuse(ranked_lists, k: int, rrf_k: int = RRF_K) -> list:
+    """Reciprocal rank fusion of lists of Hits; the fused score replaces `score`."""
+    fused, hits = {}, {}
+    for ranked in ranked_lists:
+        for rank, hit in enumerate(ranked):
+            fused[hit.id] = fused.get(hit.id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            # Keep the copy that knows its position on the page
+            if hit.id not in hits or hits[hit.id].position < 0 <= hit.position:
+                hits[hit.id] = hit
+    best = sorted(fused, key=fused.get, reverse=True)[:k]
+    for hit_id in best:
+        hits[hit_id].score = fused[hit_id]
+    return [hits[hit_id] for hit_id in best]
@@ -0,0 +1,110 @@
+"""
+chunker.py — Structure-aware, token-sized chunking for rag_pipeline.py build
+
+Pages are split along their own structure instead of fixed word windows:
+paragraphs are packed into chunks of up to `max_tokens`, a heading starts a
+new chunk once the current one is at least half full, and a chunk that
+continues a section repeats that section's heading so it reads on its own.
+Only paragraphs longer than a whole chunk are cut, at sentence boundaries
+first, then at word boundaries.
+
+Accepts either page shape:
+    rag_pipeline.py    {"sections": [{"heading", "paragraphs"}], "text"}
+    scrape_to_json.py  {"headings", "paragraphs"}
+and falls back to the blank-line separated "text" of older page records.
+
+Everything is a generator, so chunks flow into the embedding stage one
+page at a time.
+"""
+
+import re
+
+CHUNK_TOKENS = 300
+HEADING_SHARE = 0.25        # most of a chunk a (repeated) heading may take; longer ones are cut
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def page_sections(page: dict) -> list:
+    if page.get("sections"):
+        return page["sections"]
+    if page.get("paragraphs"):
+        return [{"heading": "", "paragraphs": page["paragraphs"]}]
+    return [{"heading": "", "paragraphs": [p for p in page.get("text", "").split("\n\n") if p.strip()]}]
+
+
+def split_long(text: str, count_tokens, max_tokens: int):
+    """Yield pieces of `text` that each fit in `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        yield text
+        return
+    piece, size = [], 0
+    for sentence in SENTENCE_RE.split(text):
+        tokens = count_tokens(sentence)
+        if tokens > max_tokens:
+            if piece:
+                yield " ".join(piece)
+                piece, size = [], 0
+            words = sentence.split()
+            # Word windows sized from the sentence's own tokens-per-word ratio
+            step = max(1, int(len(words) * max_tokens / tokens))
+            for i in range(0, len(words), step):
+                yield " ".join(words[i:i + step])
+            continue
+        if piece and size + tokens > max_tokens:
+            yield " ".join(piece)
+            piece, size = [], 0
+        piece.append(sentence)
+        size += tokens
+    if piece:
+        yield " ".join(piece)
+
+
+def truncate(text: str, count_tokens, max_tokens: int) -> str:
+    """The longest word prefix of `text` that fits in `max_tokens` (empty if none does)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def iter_chunks(page: dict, count_tokens, max_tokens: int = CHUNK_TOKENS):
+    """Yield the chunk texts of one page."""
+    parts, size, has_body = [], 0, False
+
+    def flush():
+        nonlocal parts, size, has_body
+        text = "\n\n".join(parts)
+        parts, size, has_body = [], 0, False
+        return text
+
+    for section in page_sections(page):
+        # Every chunk of the section repeats its heading, so it only gets a share of the budget
+        heading = truncate((section.get("heading") or "").strip(), count_tokens, int(max_tokens * HEADING_SHARE))
+        heading_tokens = count_tokens(heading) if heading else 0
+        if heading and has_body and size >= max_tokens // 2:
+            yield flush()
+        if heading:
+            parts.append(heading)
+            size += heading_tokens
+
+        for para in section.get("paragraphs", []):
+            for piece in split_long(para, count_tokens, max(1, max_tokens - heading_tokens)):
+                tokens = count_tokens(piece)
+                if has_body and size + tokens > max_tokens:
+                    yield flush()
+                    if heading:  # continuing a section: repeat its heading
+                        parts.append(heading)
+                        size += heading_tokens
+                parts.append(piece)
+                size += tokens
+                has_body = True
+
+    if has_body:  # a trailing heading with nothing under it is dropped
+        yield flush()
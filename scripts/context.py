@@ -0,0 +1,181 @@
+"""
+context.py — Token-budgeted context packing for rag_pipeline.py serve
+
+Retrieval returns a wider candidate set than the prompt needs; this stage
+turns it into the prompt context:
+
+    rerank   a cheap local score: the candidate's retrieval rank blended
+             with how much of the question's wording it covers (terms and
+             adjacent term pairs, tokenized like BM25)
+    merge    chunks from the same URL that are neighbours on the page
+             (`Hit.position`, stored with each chunk by build) or share text are
+             joined into one passage, and the shared text — a continued
+             section's repeated heading, an overlapping tail — is kept once.
+             A chunk contained in another is dropped.
+    pack     passages go in best first while they fit `budget` tokens (and
+             `max_passages`). If even the best passage is too long, it is
+             cut to the budget rather than left out.
+    order    passages from one page stay together, in page order
+
+The source URLs returned are the pages of the packed passages, best first,
+followed by the other pages a deduplicated chunk stands for (`Hit.sources`).
+
+`PackStats.saved` is what the merging saved: the tokens of the packed
+chunks joined as they are, minus the tokens actually sent.
+
+Usage:
+    packer = ContextPacker(token_counter(CHAT_MODEL), budget=1200)
+    context, sources, stats = packer.pack(question, hits)
+"""
+
+import re
+from dataclasses import dataclass, field
+
+from bm25 import tokenize
+
+RERANK_WEIGHT = 0.5          # share of the rerank score from question coverage (the rest: retrieval rank)
+MIN_OVERLAP_WORDS = 8        # shortest shared tail/head that counts as overlapping text
+SEPARATOR = "\n\n---\n\n"
+WORD_RE = re.compile(r"\S+")
+
+
+@dataclass
+class PackStats:
+    candidates: int = 0
+    chunks: int = 0          # chunks in the context
+    passages: int = 0        # after merging
+    merged: int = 0          # chunks joined onto a neighbour or dropped as contained
+    truncated: bool = False
+    tokens: int = 0          # context tokens sent
+    raw_tokens: int = 0      # the same chunks joined as they are
+
+    @property
+    def saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+
+@dataclass
+class Passage:
+    url: str
+    text: str
+    score: float
+    position: int
+    hits: list = field(default_factory=list)
+    tokens: int = 0
+
+
+def join(a: str, b: str, adjacent: bool = False) -> str | None:
+    """`a` then `b` with the text they share kept once; None if they neither overlap nor are neighbours."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    pa, pb = a.split("\n\n"), b.split("\n\n")
+    # Paragraph overlap: the tail of `a` opens `b`
+    for k in range(min(len(pa), len(pb)) - 1, 0, -1):
+        if pa[-k:] == pb[:k]:
+            return "\n\n".join(pa + pb[k:])
+    # Word overlap: a fixed-size window repeated across the boundary
+    wa, wb = a.split(), b.split()
+    for k in range(min(len(wa), len(wb)) - 1, MIN_OVERLAP_WORDS - 1, -1):
+        if wa[-k] == wb[0] and wa[-k:] == wb[:k]:
+            rest = b[list(WORD_RE.finditer(b))[k - 1].end():].lstrip()
+            return f"{a} {rest}" if rest else a
+    if not adjacent:
+        return None
+    # Neighbours: a continued section repeats its heading
+    if len(pb) > 1 and pb[0] in pa:
+        pb = pb[1:]
+    return "\n\n".join(pa + pb)
+
+
+class ContextPacker:
+    def __init__(self, count_tokens, budget: int, max_passages: int | None = None):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.max_passages = max_passages
+        self.separator_tokens = count_tokens(SEPARATOR)
+
+    def rerank(self, question: str, hits: list) -> list:
+        """(score, hit) pairs, best first."""
+        q = tokenize(question)
+        terms, pairs = set(q), set(zip(q, q[1:]))
+        scored = []
+        for rank, hit in enumerate(hits):
+            tokens = tokenize(hit.text)
+            coverage = len(terms & set(tokens)) / len(terms) if terms else 0.0
+            if pairs:
+                coverage = (coverage + len(pairs & set(zip(tokens, tokens[1:]))) / len(pairs)) / 2
+            retrieval = 1.0 - rank / len(hits)
+            scored.append(((1 - RERANK_WEIGHT) * retrieval + RERANK_WEIGHT * coverage, hit))
+        scored.sort(key=lambda s: s[0], reverse=True)
+        return scored
+
+    def merge(self, scored: list, stats: PackStats) -> list:
+        by_url = {}
+        for score, hit in scored:
+            by_url.setdefault(hit.url, []).append((score, hit))
+        passages = []
+        for url, group in by_url.items():
+            if all(h.position >= 0 for _, h in group):
+                group.sort(key=lambda s: s[1].position)
+            merged = []
+            for score, hit in group:
+                last = merged[-1] if merged else None
+                text = None
+                if last is not None:
+                    prev = last.hits[-1].position
+                    adjacent = hit.position >= 0 and prev >= 0 and hit.position - prev == 1
+                    text = join(last.text, hit.text, adjacent)
+                    if text is None and hit.position < 0:  # page order unknown: try the other way round
+                        text = join(hit.text, last.text)
+                if text is None:
+                    merged.append(Passage(url, hit.text, score, hit.position, [hit]))
+                    continue
+                last.text = text
+                last.score = max(last.score, score)
+                last.hits.append(hit)
+                stats.merged += 1
+            passages.extend(merged)
+        for p in passages:
+            p.tokens = self.count_tokens(p.text)
+        return passages
+
+    def truncate(self, passage: Passage) -> None:
+        words = passage.text.split(" ")
+        keep = len(words)
+        while keep > 1 and passage.tokens > self.budget:
+            keep = max(1, int(keep * min(0.9, self.budget / passage.tokens)))
+            passage.text = " ".join(words[:keep])
+            passage.tokens = self.count_tokens(passage.text)
+
+    def pack(self, question: str, hits: list) -> tuple:
+        """→ (context text, source URLs, PackStats)"""
+        stats = PackStats(candidates=len(hits))
+        passages = sorted(self.merge(self.rerank(question, hits), stats), key=lambda p: p.score, reverse=True)
+
+        chosen, used = [], 0
+        for p in passages:
+            if self.max_passages and len(chosen) >= self.max_passages:
+                break
+            cost = p.tokens + (self.separator_tokens if chosen else 0)
+            if used + cost <= self.budget:
+                chosen.append(p)
+                used += cost
+        if not chosen and passages:
+            self.truncate(passages[0])
+            chosen.append(passages[0])
+            stats.truncated = True
+
+        # Best page first; a page's passages together, in page order
+        pages = list(dict.fromkeys(p.url for p in chosen))
+        chosen.sort(key=lambda p: (pages.index(p.url), p.position))
+        context = SEPARATOR.join(p.text for p in chosen)
+
+        hits_used = [h for p in chosen for h in p.hits]
+        sources = list(dict.fromkeys(pages + [url for h in hits_used for url in h.sources]))
+        stats.chunks = len(hits_used)
+        stats.passages = len(chosen)
+        stats.tokens = self.count_tokens(context) if context else 0
+        stats.raw_tokens = self.count_tokens(SEPARATOR.join(h.text for h in hits_used)) if hits_used else 0
+        return context, sources, stats
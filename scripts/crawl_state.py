@@ -0,0 +1,116 @@
+"""
+crawl_state.py — Persistent crawl state for incremental re-crawls
+
+Remembers, per URL: ETag, Last-Modified, SHA-256 of the raw HTML, the
+outgoing links and when it was last crawled. The crawler uses it to send
+conditional requests and skip pages that have not changed; the scrapers
+carry the previous records of those pages forward.
+
+At the end of a run `finish()` returns the diff downstream steps consume:
+
+    {
+      "added":     ["https://…"],   # new URLs this run
+      "changed":   ["https://…"],   # content hash differs from last run
+      "removed":   ["https://…"],   # known last run, not reachable now
+      "unchanged": 41
+    }
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def sha256(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class CrawlState:
+    def __init__(self, path: Path, entries: dict | None = None):
+        self.path = Path(path)
+        self.entries = entries or {}
+        self.previous = set(self.entries)
+        self.added, self.changed, self.unchanged = set(), set(), set()
+
+    @classmethod
+    def load(cls, path: Path) -> "CrawlState":
+        path = Path(path)
+        entries = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        return cls(path, entries)
+
+    @property
+    def visited(self) -> set:
+        return self.added | self.changed | self.unchanged
+
+    def get(self, url: str) -> dict | None:
+        return self.entries.get(url)
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.entries.get(url) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def links(self, url: str) -> list:
+        return (self.entries.get(url) or {}).get("links", [])
+
+    def record(self, url: str, headers: dict, digest: str, links) -> None:
+        """Store a freshly fetched page and classify it as added or changed."""
+        prev = self.entries.get(url)
+        if prev is None:
+            self.added.add(url)
+        elif prev.get("sha256") != digest:
+            self.changed.add(url)
+        else:
+            self.unchanged.add(url)
+        self.entries[url] = {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "sha256": digest,
+            "links": sorted(links),
+            "crawled_at": _now(),
+        }
+
+    def mark_unchanged(self, url: str, headers: dict | None = None) -> None:
+        """The server answered 304, or sent back identical bytes."""
+        entry = self.entries[url]
+        if headers:
+            entry["etag"] = headers.get("etag", entry.get("etag"))
+            entry["last_modified"] = headers.get("last-modified", entry.get("last_modified"))
+        entry["crawled_at"] = _now()
+        self.unchanged.add(url)
+
+    def keep(self, url: str) -> None:
+        """The fetch failed transiently; keep the last good entry as it is for this run."""
+        if url in self.entries:
+            self.unchanged.add(url)
+
+    def finish(self, complete: bool = True) -> dict:
+        """
+        Drop URLs that were not reached and return the run diff.
+        An incomplete crawl (deadline hit) keeps unreached URLs and reports no removals.
+        """
+        removed = sorted(self.previous - self.visited) if complete else []
+        for url in removed:
+            del self.entries[url]
+        return {
+            "added": sorted(self.added),
+            "changed": sorted(self.changed),
+            "removed": removed,
+            "unchanged": len(self.unchanged),
+        }
+
+    def save(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
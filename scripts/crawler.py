@@ -0,0 +1,471 @@
+"""
+crawler.py — Concurrent hybrid HTTP / Playwright crawl engine
+Shared by rag_pipeline.py and scrape_to_json.py
+
+N fetch workers pull URLs from a shared priority frontier (frontier.py):
+seeded from robots.txt and sitemap.xml, keyed by canonical URL, shallowest
+and most recently modified pages first, bounded by max-depth / max-pages.
+Redirects and <link rel=canonical> fold duplicate URLs into one page. Each
+host gets its own concurrency cap and request rate limit (robots.txt
+Crawl-delay included), and a global deadline stops the crawl cleanly.
+
+Pages are fetched with a pooled async HTTP client (keep-alive, gzip) first.
+Only pages that need JavaScript to render — an empty <main> (or <body>) in
+the server response — are loaded again in headless Chromium, which is
+started on first use. `render` / `no_render` URL path patterns override the
+heuristic, and `fetch="http"` never starts a browser at all.
+
+Fetching and parsing are separate stages. Fetched pages go through a bounded
+queue (a full queue pauses the browsers) to a pool of parser processes, so
+HTML parsing never blocks the event loop and uses every core.
+
+With a CrawlState (see crawl_state.py) pages seen before are first probed
+with a conditional request; a 304 or identical content hash skips the
+browser entirely and the page's stored links are followed instead. A
+sitemap <lastmod> older than the last crawl skips even the probe (a date-only
+<lastmod> only when that whole day lies before the crawl). An error
+status is never stored as content: a 404/410 page drops out of the state
+(and is reported removed), while other errors keep the page's last good copy.
+
+Usage:
+    from crawler import CrawlConfig, crawl
+
+    def handle(url, html):
+        ...                      # parse the page
+        return {"https://…"}     # links to enqueue
+
+    stats = await crawl([BASE_URL], handle, CrawlConfig(workers=8))
+
+    # or parse in worker processes; handle then gets parse's return value
+    parse = functools.partial(extract, base_url=BASE_URL)   # picklable, top-level
+    stats = await crawl([BASE_URL], lambda url, page: page["internal_links"], parse=parse)
+
+Local testing against a static mirror:
+    python -m http.server 8080 --directory ./mirror
+    python rag_pipeline.py scrape --base-url http://localhost:8080 --workers 8
+    python rag_pipeline.py scrape --fetch http --render "/gallery*"
+    python rag_pipeline.py scrape --max-depth 2 --max-pages 50   # then --resume for the next 50
+"""
+
+import asyncio
+import fnmatch
+import inspect
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from crawl_state import sha256
+from frontier import Frontier, Site, canonical_link, discover, parse_lastmod
+
+BLOCKED_RESOURCES = "**/*.{png,jpg,jpeg,gif,svg,woff,woff2}"
+FETCH_MODES = ["auto", "http", "browser"]
+RENDER_MIN_TEXT = 20     # visible characters in <main> below which a page is rendered
+USER_AGENT = "Mozilla/5.0 (compatible; friendshipdaycare-crawler/1.0)"
+GONE = {404, 410}        # statuses that mean the page was removed, not that the fetch failed
+DAY = 86400
+
+MAIN_RE = re.compile(r"<main\b[^>]*>(.*?)</main>", re.S | re.I)
+BODY_RE = re.compile(r"<body\b[^>]*>(.*)</body>", re.S | re.I)
+INVISIBLE_RE = re.compile(r"<(script|style|noscript|template)\b.*?</\1\s*>", re.S | re.I)
+TAG_RE = re.compile(r"<[^>]*>")
+
+
+@dataclass
+class CrawlConfig:
+    workers: int = 4                  # concurrent fetches (and browser pages, once one is started)
+    per_host_concurrency: int = 4     # in-flight requests per host
+    per_host_rate: float = 0.0        # max requests/sec per host (0 = unlimited)
+    deadline: float | None = None     # seconds for the whole crawl (None = no limit)
+    timeout_ms: int = 15000           # per-page navigation timeout
+    blocked_resources: str = BLOCKED_RESOURCES
+    incremental: bool = True          # probe known pages with conditional requests
+    parse_workers: int | None = None  # parser processes (None = one per CPU)
+    parse_queue: int = 32             # fetched pages waiting for a parser before fetching pauses
+    fetch: str = "auto"               # auto: HTTP, browser when needed | http | browser
+    render: tuple = ()                # URL path globs always rendered in the browser
+    no_render: tuple = ()             # URL path globs never rendered
+    http_connections: int = 20        # pooled keep-alive connections
+    max_depth: int | None = None      # link hops from the seeds (sitemap URLs are depth 1)
+    max_pages: int | None = None      # URLs handed to the fetchers before the crawl stops
+    sitemap: bool = True              # seed from sitemap.xml / robots.txt Sitemap: lines
+    robots: bool = True               # obey robots.txt Disallow and Crawl-delay
+    resume: bool = False              # continue the pending URLs of a crawl that stopped early
+
+
+@dataclass
+class CrawlStats:
+    fetched: int = 0
+    rendered: int = 0                 # fetched pages that needed the browser
+    unchanged: int = 0
+    fresh: int = 0                    # unchanged per sitemap <lastmod>, not even probed
+    duplicates: int = 0               # fetched, but redirect / rel=canonical points at a seen page
+    failed: int = 0
+    elapsed: float = 0.0
+    timed_out: bool = False
+    truncated: bool = False           # max_pages reached with URLs left
+    resumed: bool = False
+
+    @property
+    def pages_per_sec(self) -> float:
+        return (self.fetched + self.unchanged) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def complete(self) -> bool:
+        """Every reachable page was visited in this run, so unvisited ones are really gone."""
+        return not (self.timed_out or self.truncated or self.resumed)
+
+
+class HostLimiter:
+    """Caps concurrent requests and spaces request starts for one host."""
+
+    def __init__(self, concurrency: int, rate: float):
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        if self._interval:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self._interval
+            if wait > 0:
+                try:
+                    await asyncio.sleep(wait)
+                except BaseException:  # cancelled while spacing: give the permit back
+                    self._sem.release()
+                    raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+
+
+class FetchError(Exception):
+    """The server answered with an error status; the body is not page content."""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"HTTP {status}")
+        self.url = url
+        self.status = status
+
+
+def unchanged_since(lastmod: float, crawled_at: float) -> bool:
+    """
+    True when a sitemap <lastmod> proves the page hasn't changed since
+    `crawled_at`. A date-only <lastmod> parses to UTC midnight but means
+    "some time that day", so it only counts for a crawl on a later day.
+    """
+    if lastmod % DAY == 0:
+        lastmod += DAY
+    return lastmod <= crawled_at
+
+
+def needs_render(html: str, min_text: int = RENDER_MIN_TEXT) -> bool:
+    """True when the server-rendered HTML has (almost) no visible content to extract."""
+    m = MAIN_RE.search(html) or BODY_RE.search(html)
+    if not m:
+        return True
+    text = TAG_RE.sub(" ", INVISIBLE_RE.sub(" ", m.group(1)))
+    return len("".join(text.split())) < min_text
+
+
+async def crawl(seeds, handle, config: CrawlConfig | None = None,
+                state=None, on_unchanged=None, parse=None, frontier_path=None) -> CrawlStats:
+    """
+    Crawl from `seeds` until the frontier is empty or the deadline passes.
+
+    `handle(url, html)` is called once per fetched page (it may be sync or
+    async) and returns the links found on it; unseen links are enqueued.
+    With `parse`, `parse(html, url)` runs in a worker process first and
+    `handle(url, parsed)` gets its (picklable) result instead of the HTML.
+    When `state` says a page is unchanged, `on_unchanged(url)` is called
+    instead and the links stored for it are enqueued.
+
+    URLs are canonicalized (frontier.py) and only same-site ones are
+    crawled. `frontier_path` persists learned aliases and, after an early
+    stop, the pending URLs for `config.resume`.
+    """
+    import httpx
+
+    config = config or CrawlConfig()
+    stats = CrawlStats()
+    site = Site.from_url(seeds[0])
+    limits = {"max_depth": config.max_depth, "max_pages": config.max_pages}
+    if frontier_path:
+        frontier = Frontier.load(frontier_path, site, resume=config.resume, **limits)
+    else:
+        frontier = Frontier(site, **limits)
+    frontier.user_agent = USER_AGENT
+    fetched_pages: asyncio.Queue = asyncio.Queue(maxsize=max(1, config.parse_queue))
+    parse_workers = config.parse_workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=parse_workers) if parse else None
+    limiters: dict = {}
+    http = httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(max_connections=config.http_connections,
+                            max_keepalive_connections=config.http_connections),
+        timeout=config.timeout_ms / 1000,
+        follow_redirects=True,
+    )
+    browser = {}                      # started on first render: playwright, browser, idle pages
+    browser_lock = asyncio.Lock()
+
+    def limiter_for(url):
+        host = urlparse(url).netloc
+        if host not in limiters:
+            limiters[host] = HostLimiter(config.per_host_concurrency, config.per_host_rate)
+        return limiters[host]
+
+    def fetch_mode(url):
+        path = urlparse(url).path or "/"
+        if any(fnmatch.fnmatchcase(path, p) for p in config.render):
+            return "browser"
+        if any(fnmatch.fnmatchcase(path, p) for p in config.no_render):
+            return "http"
+        return config.fetch
+
+    async def render(url):
+        if not browser:
+            async with browser_lock:
+                if not browser:
+                    from playwright.async_api import async_playwright
+
+                    pw = await async_playwright().start()
+                    chromium = await pw.chromium.launch(headless=True)
+                    idle = asyncio.Queue()
+                    for _ in range(max(1, config.workers)):
+                        context = await chromium.new_context()
+                        await context.route(config.blocked_resources, lambda r: r.abort())
+                        idle.put_nowait(await context.new_page())
+                    browser.update(playwright=pw, browser=chromium, idle=idle)
+                    print("  🌐 Started headless browser for JavaScript-rendered pages")
+        page = await browser["idle"].get()
+        try:
+            resp = await page.goto(url, wait_until="domcontentloaded", timeout=config.timeout_ms)
+            if resp and resp.status >= 400:
+                raise FetchError(url, resp.status)
+            html = await page.content()
+            try:
+                body = await resp.body()
+            except Exception:
+                body = html
+            return html, (resp.headers if resp else {}), sha256(body), page.url
+        finally:
+            browser["idle"].put_nowait(page)
+
+    async def fetch(url, lastmod=None):
+        """Return (html, headers, sha256, final URL), or None if the page is unchanged since the last crawl."""
+        mode = fetch_mode(url)
+        entry = state.get(url) if state and config.incremental else None
+        if entry and lastmod and unchanged_since(lastmod, parse_lastmod(entry.get("crawled_at")) or 0):
+            state.mark_unchanged(url)
+            stats.fresh += 1
+            return None
+        if entry or mode != "browser":
+            # One plain request answers the conditional probe and, for
+            # server-rendered pages, is the fetch itself
+            resp = await http.get(url, headers=state.conditional_headers(url) if entry else None)
+            if entry and (resp.status_code == 304 or
+                          (resp.is_success and sha256(resp.content) == entry["sha256"])):
+                state.mark_unchanged(url, resp.headers)
+                return None
+            if not resp.is_success and resp.status_code != 304:
+                raise FetchError(url, resp.status_code)
+            if mode == "http" or (mode == "auto" and resp.status_code != 304 and not needs_render(resp.text)):
+                return resp.text, resp.headers, sha256(resp.content), str(resp.url)
+        stats.rendered += 1
+        return await render(url)
+
+    def page_url(url, final_url, html):
+        """
+        The URL a fetched page is kept under: where a redirect ended up, or
+        what its rel=canonical declares (on-site only). None if that page
+        has been seen already.
+        """
+        target = frontier.canonical(final_url) or url
+        declared = canonical_link(html, final_url)
+        if declared:
+            target = frontier.canonical(declared) or target
+        if target == url or frontier.alias(url, target):
+            return target
+        return None
+
+    async def worker():
+        """Fetch stage: frontier → HTTP client or browser → parse queue."""
+        while True:
+            entry = await frontier.get()
+            url = entry.url
+            keep_open = False
+            try:
+                print(f"  → {url}")
+                async with limiter_for(url):
+                    fetched = await fetch(url, entry.lastmod)
+                if fetched is None:
+                    stats.unchanged += 1
+                    if on_unchanged:
+                        on_unchanged(url)
+                    for link in state.links(url):
+                        frontier.add(link, entry.depth + 1)
+                elif (target := page_url(url, fetched[3], fetched[0])) is None:
+                    stats.duplicates += 1
+                    print(f"    ↪ duplicate of {frontier.canonical(url)}")
+                else:
+                    stats.fetched += 1
+                    # Blocks while the parsers are behind; the frontier entry
+                    # stays open until the page has been parsed
+                    await fetched_pages.put((entry, target, *fetched[:3]))
+                    keep_open = True
+            except asyncio.CancelledError:
+                # Deadline: still in flight, so save() keeps it pending for --resume
+                keep_open = True
+                raise
+            except FetchError as e:
+                stats.failed += 1
+                if e.status in GONE:
+                    # Not recorded as visited, so finish() reports it removed
+                    print(f"    ✗ {url}: {e} (gone)")
+                elif state and state.get(url):
+                    # Keep the last good copy rather than losing the page to a transient error
+                    print(f"    ⚠ {url}: {e}; keeping the previous copy")
+                    state.keep(url)
+                    if on_unchanged:
+                        on_unchanged(url)
+                    for link in state.links(url):
+                        frontier.add(link, entry.depth + 1)
+                else:
+                    print(f"    ⚠ {url}: {e}")
+            except Exception as e:
+                stats.failed += 1
+                print(f"    ⚠ {url}: {e}")
+            finally:
+                if not keep_open:
+                    frontier.task_done(entry)
+
+    async def parser():
+        """Parse stage: parse queue → worker process → handle → frontier."""
+        loop = asyncio.get_running_loop()
+        while True:
+            entry, url, html, headers, digest = await fetched_pages.get()
+            try:
+                result = await loop.run_in_executor(pool, parse, html, url) if parse else html
+                found = handle(url, result)
+                if inspect.isawaitable(found):
+                    found = await found
+                links = sorted({c for c in map(frontier.canonical, found or ()) if c})
+                if state:
+                    state.record(url, headers, digest, links)
+                for link in links:
+                    frontier.add(link, entry.depth + 1)
+            except asyncio.CancelledError:
+                raise                   # left open: save() keeps it pending for --resume
+            except Exception as e:
+                stats.failed += 1
+                print(f"    ⚠ {url}: {e}")
+            fetched_pages.task_done()
+            frontier.task_done(entry)
+
+    robots, delay, sitemap = await discover(http, site, USER_AGENT, config.robots, config.sitemap)
+    frontier.robots = robots
+    if delay and (not config.per_host_rate or config.per_host_rate > 1 / delay):
+        # robots.txt Crawl-delay wins over an unset or faster --per-host-rate
+        limiters[urlparse(site.origin).netloc] = HostLimiter(config.per_host_concurrency, 1 / delay)
+        print(f"  🐢 robots.txt Crawl-delay: {delay}s between requests")
+    for url in seeds:
+        frontier.add(url)
+    for url, lastmod in sitemap:
+        frontier.add(url, 1, lastmod)
+    if frontier.resumed:
+        print(f"  ⏯  Resuming: {frontier.qsize()} pending URLs, {len(frontier.seen)} already seen")
+
+    started = time.monotonic()
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, config.workers))]
+    workers += [asyncio.create_task(parser()) for _ in range(parse_workers if parse else 1)]
+    try:
+        await asyncio.wait_for(frontier.join(), timeout=config.deadline)
+    except asyncio.TimeoutError:
+        stats.timed_out = True
+        print(f"\n⏱  Deadline of {config.deadline}s reached — {frontier.qsize()} URLs left in frontier")
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await http.aclose()
+        if browser:
+            await browser["browser"].close()
+            await browser["playwright"].stop()
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    stats.elapsed = time.monotonic() - started
+    stats.truncated, stats.resumed = frontier.truncated, frontier.resumed
+    frontier.save(complete=not (stats.timed_out or stats.truncated))
+    print(
+        f"\n📊 Crawled {stats.fetched} pages ({stats.rendered} rendered, {stats.unchanged} unchanged, "
+        f"{stats.duplicates} duplicates, {stats.failed} failed) in {stats.elapsed:.1f}s "
+        f"— {stats.pages_per_sec:.1f} pages/sec with {max(1, config.workers)} workers"
+        + (f", {parse_workers} parser processes" if parse else "")
+    )
+    skipped = ", ".join(f"{n} {why}" for why, n in frontier.skipped.items() if n)
+    if skipped or stats.fresh:
+        print(f"   Not fetched: {stats.fresh} fresh per sitemap lastmod" + (f", skipped {skipped}" if skipped else ""))
+    if stats.truncated:
+        print(f"   ⏸  --max-pages {config.max_pages} reached; {len(frontier.pending())} URLs saved for --resume")
+    return stats
+
+
+# ─────────────────────────────────────────────
+# CLI helpers
+# ─────────────────────────────────────────────
+def add_crawl_args(parser, base_url: str):
+    """Register the shared crawl options on an argparse parser."""
+    parser.add_argument("--base-url", default=base_url, help=f"site to crawl (default: {base_url})")
+    parser.add_argument("--workers", type=int, default=CrawlConfig.workers,
+                        help="concurrent fetches (and browser pages, if one is needed)")
+    parser.add_argument("--fetch", choices=FETCH_MODES, default=CrawlConfig.fetch,
+                        help="auto: plain HTTP, browser only for pages that need JavaScript")
+    parser.add_argument("--render", action="append", default=[], metavar="PATTERN",
+                        help="URL path glob always rendered in the browser (repeatable)")
+    parser.add_argument("--no-render", action="append", default=[], metavar="PATTERN",
+                        help="URL path glob never rendered in the browser (repeatable)")
+    parser.add_argument("--per-host-concurrency", type=int, default=CrawlConfig.per_host_concurrency,
+                        help="max in-flight requests per host")
+    parser.add_argument("--per-host-rate", type=float, default=CrawlConfig.per_host_rate,
+                        help="max requests/sec per host (0 = unlimited)")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="stop the crawl after this many seconds")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="HTML parser processes (default: one per CPU)")
+    parser.add_argument("--max-depth", type=int, default=None, help="link hops from the start page")
+    parser.add_argument("--max-pages", type=int, default=None, help="stop after this many URLs")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the pending URLs of a crawl stopped by --deadline / --max-pages")
+    parser.add_argument("--no-sitemap", action="store_true", help="don't seed from sitemap.xml")
+    parser.add_argument("--ignore-robots", action="store_true", help="don't obey robots.txt")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the crawl state and re-fetch every page")
+
+
+def config_from_args(args, **overrides) -> CrawlConfig:
+    return CrawlConfig(
+        workers=args.workers,
+        per_host_concurrency=args.per_host_concurrency,
+        per_host_rate=args.per_host_rate,
+        deadline=args.deadline,
+        parse_workers=args.parse_workers,
+        fetch=args.fetch,
+        render=tuple(args.render),
+        no_render=tuple(args.no_render),
+        incremental=not args.full,
+        max_depth=args.max_depth,
+        max_pages=args.max_pages,
+        sitemap=not args.no_sitemap,
+        robots=not args.ignore_robots,
+        resume=args.resume,
+        **overrides,
+    )
@@ -1,16 +1,75 @@
 #!/usr/bin/env python3
 """
 Create video thumbnail placeholders for the gallery video section
+
+Renders any number of thumbnails from a manifest (JSON or YAML) on a process
+pool. Each worker loads its fonts once, draws the play button once and
+measures text from cached glyph widths; thumbnails whose inputs haven't
+changed since the last run (.thumbnail_state.json) are skipped.
+
+Usage:
+    python3 scripts/create_video_thumbnails.py                        # the three gallery thumbnails
+    python3 scripts/create_video_thumbnails.py --manifest thumbs.yaml --workers 8
+    python3 scripts/create_video_thumbnails.py --force                # re-render everything
+
+Manifest (a list, or {"defaults": {...}, "thumbnails": [...]}):
+    defaults:
+      color: [75, 207, 250]
+    thumbnails:
+      - filename: video-thumb-1.jpg
+        title: Montessori Activities
+        description: Watch children engage in hands-on learning activities
+        emoji: "🎨"
+        color: "#ff6b9d"
 """
 
+import argparse
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
 from PIL import Image, ImageDraw, ImageFont
-import requests
-from io import BytesIO
 
-def create_images_folder():
+RENDERER_VERSION = 2          # bump when the drawing changes; forces a re-render
+WIDTH, HEIGHT = 800, 450      # 16:9 aspect ratio
+MARGIN = 50                   # px on each side of the description
+FONT_CANDIDATES = [
+    "/System/Library/Fonts/Arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "DejaVuSans.ttf",
+]
+STATE_FILE = Path(".thumbnail_state.json")    # output filename → input hash
+
+DEFAULT_THUMBNAILS = [
+    {
+        'filename': 'video-thumb-1.jpg',
+        'title': 'Montessori Activities',
+        'description': 'Watch children engage in hands-on learning activities that promote independence and creativity',
+        'emoji': '🎨',
+        'color': (255, 107, 157)  # Pink
+    },
+    {
+        'filename': 'video-thumb-2.jpg',
+        'title': 'Learning Through Play',
+        'description': 'See how we combine education with fun activities that help children develop essential skills',
+        'emoji': '🎈',
+        'color': (75, 207, 250)  # Blue
+    },
+    {
+        'filename': 'video-thumb-3.jpg',
+        'title': 'Story Time Adventures',
+        'description': 'Gentle stories that teach values and morals in an age-appropriate way',
+        'emoji': '📚',
+        'color': (120, 224, 143)  # Green
+    }
+]
+
+
+def create_images_folder(images_folder=os.path.join("public", "images")):
     """Create the images folder if it doesn't exist"""
-    images_folder = os.path.join("public", "images")
     if not os.path.exists(images_folder):
         os.makedirs(images_folder)
         print(f"✅ Created folder: {images_folder}")
@@ -18,149 +77,225 @@ def create_images_folder():
         print(f"📁 Folder already exists: {images_folder}")
     return images_folder
 
+
+# ─────────────────────────────────────────────
+# Per-process caches: fonts, glyph widths, static layers
+# ─────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def font_path():
+    """The first usable TrueType font file, or None for Pillow's built-in font"""
+    for path in FONT_CANDIDATES:
+        try:
+            # A bare name is looked up in the system font folders; .path is the file found
+            path = ImageFont.truetype(path, 12).path
+        except OSError:
+            continue
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    path = font_path()
+    if path:
+        return ImageFont.truetype(path, size)
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1 has a single fixed-size default font
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4096)
+def glyph_width(size, char):
+    return load_font(size).getlength(char)
+
+
+def text_width(text, size):
+    return sum(glyph_width(size, ch) for ch in text)
+
+
+def wrap(text, size, max_width):
+    """Greedy word wrap in one pass, measuring each word once"""
+    space = glyph_width(size, ' ')
+    lines, line, width = [], [], 0.0
+    for word in text.split():
+        word_width = text_width(word, size)
+        if line and width + space + word_width > max_width:
+            lines.append(' '.join(line))
+            line, width = [word], word_width
+        else:
+            width += (space if line else 0) + word_width
+            line.append(word)
+    if line:
+        lines.append(' '.join(line))
+    return lines
+
+
+@lru_cache(maxsize=32)
+def background(size, color):
+    return Image.new('RGB', size, color)
+
+
+@lru_cache(maxsize=8)
+def play_button(radius):
+    """White circle with a black play triangle, as an RGBA layer"""
+    layer = Image.new('RGBA', (2 * radius + 1, 2 * radius + 1), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    draw.ellipse([0, 0, 2 * radius, 2 * radius], fill=(255, 255, 255, 255))
+    s = radius / 40
+    c = radius
+    draw.polygon([(c - 15 * s, c - 20 * s), (c - 15 * s, c + 20 * s), (c + 20 * s, c)], fill=(0, 0, 0, 255))
+    return layer
+
+
+# ─────────────────────────────────────────────
+# Rendering
+# ─────────────────────────────────────────────
+def draw_centered(draw, text, y, size, width):
+    x = (width - text_width(text, size)) // 2
+    draw.text((x, y), text, fill='white', font=load_font(size))
+
+
 def create_thumbnail(title, description, emoji, color, filename, folder):
     """Create a colorful video thumbnail with text and emoji"""
-    # Create image
-    width, height = 800, 450  # 16:9 aspect ratio
-    img = Image.new('RGB', (width, height), color)
+    width, height = WIDTH, HEIGHT
+    img = background((width, height), color).copy()
     draw = ImageDraw.Draw(img)
-    
-    try:
-        # Try to use a nice font
-        title_font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", 48)
-        desc_font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", 24)
-        emoji_font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", 80)
-    except:
-        # Fallback to default font
-        title_font = ImageFont.load_default()
-        desc_font = ImageFont.load_default()
-        emoji_font = ImageFont.load_default()
-    
-    # Draw emoji at top
-    emoji_bbox = draw.textbbox((0, 0), emoji, font=emoji_font)
-    emoji_width = emoji_bbox[2] - emoji_bbox[0]
-    emoji_x = (width - emoji_width) // 2
-    draw.text((emoji_x, 50), emoji, fill='white', font=emoji_font)
-    
-    # Draw title
-    title_bbox = draw.textbbox((0, 0), title, font=title_font)
-    title_width = title_bbox[2] - title_bbox[0]
-    title_x = (width - title_width) // 2
-    draw.text((title_x, 180), title, fill='white', font=title_font)
-    
-    # Draw description (word wrap)
-    words = description.split()
-    lines = []
-    current_line = []
-    
-    for word in words:
-        test_line = ' '.join(current_line + [word])
-        test_bbox = draw.textbbox((0, 0), test_line, font=desc_font)
-        test_width = test_bbox[2] - test_bbox[0]
-        
-        if test_width <= width - 100:  # 50px margin on each side
-            current_line.append(word)
-        else:
-            if current_line:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-            else:
-                lines.append(word)
-    
-    if current_line:
-        lines.append(' '.join(current_line))
-    
-    # Draw description lines
+
+    # Emoji at top, title, then the wrapped description
+    draw_centered(draw, emoji, 50, 80, width)
+    draw_centered(draw, title, 180, 48, width)
     y_offset = 250
-    for line in lines:
-        line_bbox = draw.textbbox((0, 0), line, font=desc_font)
-        line_width = line_bbox[2] - line_bbox[0]
-        line_x = (width - line_width) // 2
-        draw.text((line_x, y_offset), line, fill='white', font=desc_font)
+    for line in wrap(description, 24, width - 2 * MARGIN):
+        draw_centered(draw, line, y_offset, 24, width)
         y_offset += 35
-    
-    # Add play button overlay
-    play_center_x, play_center_y = width // 2, height // 2 + 50
-    play_radius = 40
-    
-    # Draw play button circle
-    play_bbox = [
-        play_center_x - play_radius,
-        play_center_y - play_radius,
-        play_center_x + play_radius,
-        play_center_y + play_radius
-    ]
-    draw.ellipse(play_bbox, fill=(255, 255, 255))
-    
-    # Draw play triangle
-    triangle_points = [
-        (play_center_x - 15, play_center_y - 20),
-        (play_center_x - 15, play_center_y + 20),
-        (play_center_x + 20, play_center_y)
-    ]
-    draw.polygon(triangle_points, fill='black')
-    
-    # Save image
+
+    # Play button overlay
+    radius = 40
+    button = play_button(radius)
+    img.paste(button, (width // 2 - radius, height // 2 + 50 - radius), button)
+
     filepath = os.path.join(folder, filename)
-    img.save(filepath, 'JPEG', quality=85)
-    print(f"✅ Created thumbnail: {filename}")
+    tmp = filepath + '.tmp'
+    img.save(tmp, 'JPEG', quality=85)
+    os.replace(tmp, filepath)
     return True
 
+
+def render(thumb):
+    """Process-pool entry point: returns (filename, error or None)"""
+    try:
+        create_thumbnail(thumb['title'], thumb['description'], thumb['emoji'], thumb['color'],
+                         thumb['filename'], thumb['folder'])
+        return thumb['filename'], None
+    except Exception as e:
+        return thumb['filename'], str(e)
+
+
+# ─────────────────────────────────────────────
+# Manifest and change detection
+# ─────────────────────────────────────────────
+def load_manifest(path):
+    """Thumbnail specs from a JSON or YAML manifest, with defaults applied"""
+    path = Path(path)
+    text = path.read_text(encoding='utf-8')
+    if path.suffix in ('.yaml', '.yml'):
+        import yaml
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, list):
+        data = {'thumbnails': data}
+    defaults = data.get('defaults', {})
+    return [{**defaults, **thumb} for thumb in data['thumbnails']]
+
+
+def normalize(thumb, folder):
+    color = thumb.get('color', (75, 207, 250))
+    return {
+        'filename': thumb['filename'],
+        'title': thumb.get('title', ''),
+        'description': thumb.get('description', ''),
+        'emoji': thumb.get('emoji', ''),
+        'color': tuple(color) if isinstance(color, list) else color,
+        'folder': str(folder),
+    }
+
+
+def input_hash(thumb):
+    """Everything that affects the output pixels"""
+    font = font_path()
+    font_id = [font, os.path.getsize(font), os.path.getmtime(font)] if font else None
+    key = json.dumps([RENDERER_VERSION, WIDTH, HEIGHT, font_id, thumb], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    path = Path(path)
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+
+
+def save_state(state, path=STATE_FILE):
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True), encoding='utf-8')
+    tmp.replace(path)
+
+
 def main():
     """Create all video thumbnails"""
+    parser = argparse.ArgumentParser(description="Render video thumbnails from a manifest")
+    parser.add_argument("--manifest", type=Path, help="JSON/YAML list of thumbnails (default: the gallery three)")
+    parser.add_argument("--out", default=os.path.join("public", "images"), help="output folder")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="render processes")
+    parser.add_argument("--force", action="store_true", help="re-render even if inputs are unchanged")
+    parser.add_argument("--state", type=Path, default=STATE_FILE, help="input-hash state file")
+    args = parser.parse_args()
+
     print("🎬 Creating video thumbnails for gallery...")
-    
+
     # Create the images folder
-    images_folder = create_images_folder()
-    
-    # Define thumbnails to create
-    thumbnails = [
-        {
-            'filename': 'video-thumb-1.jpg',
-            'title': 'Montessori Activities',
-            'description': 'Watch children engage in hands-on learning activities that promote independence and creativity',
-            'emoji': '🎨',
-            'color': (255, 107, 157)  # Pink
-        },
-        {
-            'filename': 'video-thumb-2.jpg',
-            'title': 'Learning Through Play',
-            'description': 'See how we combine education with fun activities that help children develop essential skills',
-            'emoji': '🎈',
-            'color': (75, 207, 250)  # Blue
-        },
-        {
-            'filename': 'video-thumb-3.jpg',
-            'title': 'Story Time Adventures',
-            'description': 'Gentle stories that teach values and morals in an age-appropriate way',
-            'emoji': '📚',
-            'color': (120, 224, 143)  # Green
-        }
-    ]
-    
-    # Create each thumbnail
+    images_folder = create_images_folder(args.out)
+
+    specs = load_manifest(args.manifest) if args.manifest else DEFAULT_THUMBNAILS
+    thumbnails = [normalize(t, images_folder) for t in specs]
+
+    # Skip outputs whose inputs haven't changed
+    state = {} if args.force else load_state(args.state)
+    hashes = {t['filename']: input_hash(t) for t in thumbnails}
+    todo = [t for t in thumbnails
+            if state.get(t['filename']) != hashes[t['filename']]
+            or not os.path.exists(os.path.join(images_folder, t['filename']))]
+    skipped = len(thumbnails) - len(todo)
+
     successful = 0
-    for thumb in thumbnails:
-        try:
-            if create_thumbnail(
-                thumb['title'],
-                thumb['description'],
-                thumb['emoji'],
-                thumb['color'],
-                thumb['filename'],
-                images_folder
-            ):
-                successful += 1
-        except Exception as e:
-            print(f"❌ Error creating {thumb['filename']}: {e}")
-    
-    print(f"\n🎉 Successfully created {successful}/{len(thumbnails)} video thumbnails!")
+    workers = max(1, min(args.workers or 1, len(todo)))
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(render, todo, chunksize=max(1, len(todo) // (workers * 4))))
+        else:
+            results = [render(t) for t in todo]
+        for filename, error in results:
+            if error:
+                print(f"❌ Error creating {filename}: {error}")
+                continue
+            print(f"✅ Created thumbnail: {filename}")
+            state[filename] = hashes[filename]
+            successful += 1
+    finally:
+        save_state(state, args.state)
+
+    print(f"\n🎉 Successfully created {successful}/{len(todo)} video thumbnails "
+          f"({skipped} unchanged, skipped)!")
     print(f"📁 Thumbnails saved to: {images_folder}")
-    
-    if successful == len(thumbnails):
+
+    if successful == len(todo):
         print("\n✅ All video thumbnails are now available for the gallery!")
     else:
-        print(f"\n⚠️  {len(thumbnails) - successful} thumbnails failed to create")
+        print(f"\n⚠️  {len(todo) - successful} thumbnails failed to create")
+
 
 if __name__ == "__main__":
     main()
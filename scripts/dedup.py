@@ -0,0 +1,177 @@
+"""
+dedup.py — Near-duplicate pages and chunks, found before anything is embedded
+
+The site repeats whole blocks (program blurbs, contact sections, calls to
+action) on many pages, and some pages are near-copies of each other. Both
+are fingerprinted from word 5-shingles:
+
+    pages    64-bit SimHash; within PAGE_DISTANCE bits of a page already
+             kept → the page is reported as a near-duplicate. Its chunks
+             still go through chunk dedup, so the ones it shares collapse
+             and the ones that differ (a fee, an age range, opening hours)
+             are kept. Candidates come from four 16-bit blocks
+             (pigeonhole: at distance ≤ 3 one block matches exactly).
+    chunks   an exact copy of a kept chunk's text is looked up directly;
+             otherwise MinHash (NUM_PERM hashes) with LSH banding: an
+             estimated Jaccard similarity ≥ CHUNK_THRESHOLD to a chunk
+             already kept, with the same numbers in it → the chunk is a
+             near-duplicate of that one. Two chunks whose numbers differ
+             ("fees: $1,200" / "fees: $1,450", "7am to 6pm" / "8am to
+             5pm") are both kept however much else they share.
+
+A duplicate's URL is merged into the sources of the copy that is kept, so
+one stored chunk stands for every page it appears on.
+
+Usage:
+    dedup = Deduplicator()
+    for url, page_text, chunks in pages:              # in a stable order
+        same = dedup.page(url, page_text)             # → URL of the page it nearly copies, or None
+        for cid, text in chunks:
+            kept = dedup.chunk(cid, text)             # → ID of the chunk it copies, or None
+    print(dedup.summary())
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+SHINGLE_WORDS = 5
+NUM_PERM = 64                # MinHash signature length
+BANDS = 16                   # LSH bands of NUM_PERM // BANDS rows: candidates from ~0.5 Jaccard
+CHUNK_THRESHOLD = 0.8        # estimated Jaccard above which two chunks are one
+PAGE_DISTANCE = 3            # SimHash bits two near-duplicate pages may differ in
+PAGE_MIN_SHINGLES = 50       # shorter pages are too small for SimHash to be reliable
+
+WORD_RE = re.compile(r"\w+")
+MIX = np.uint64(0x9E3779B97F4A7C15)
+_rng = np.random.default_rng(0x5EED)  # fixed: signatures must be comparable across builds
+PERM_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+PERM_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+BITS = np.arange(64, dtype=np.uint64)
+_word_hashes = {}
+
+
+def _word_hash(word: str) -> int:
+    h = _word_hashes.get(word)
+    if h is None:
+        h = _word_hashes[word] = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(),
+                                                "little")
+    return h
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> np.ndarray:
+    """Distinct 64-bit hashes of the text's lowercase word k-grams."""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    h = np.fromiter((_word_hash(w) for w in words), dtype=np.uint64, count=len(words))
+    k = min(k, len(h))
+    n = len(h) - k + 1
+    out = h[:n].copy()
+    for i in range(1, k):
+        out = out * MIX + h[i:i + n]   # wraps mod 2**64
+    return np.unique(out)
+
+
+def minhash(hashes: np.ndarray) -> np.ndarray:
+    """NUM_PERM minimums of multiply-shift hashes of the shingles."""
+    if not len(hashes):
+        return np.zeros(NUM_PERM, dtype=np.uint32)
+    return ((hashes[:, None] * PERM_A + PERM_B) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+
+def simhash(hashes: np.ndarray) -> int:
+    if not len(hashes):
+        return 0
+    votes = ((hashes[:, None] >> BITS) & np.uint64(1)).sum(axis=0)
+    return int(((votes * 2 > len(hashes)).astype(np.uint64) << BITS).sum())
+
+
+@dataclass
+class DedupStats:
+    pages: int = 0
+    duplicate_pages: int = 0
+    chunks: int = 0
+    duplicate_chunks: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Share of chunks that were not embedded because a copy was kept."""
+        return self.duplicate_chunks / self.chunks if self.chunks else 0.0
+
+
+class Deduplicator:
+    def __init__(self, threshold: float = CHUNK_THRESHOLD, page_distance: int = PAGE_DISTANCE):
+        self.threshold = threshold
+        self.page_distance = page_distance
+        self.stats = DedupStats()
+        self._rows = NUM_PERM // BANDS
+        self._bands = [{} for _ in range(BANDS)]  # band bytes → chunk slots
+        self._signatures = []
+        self._chunk_ids = []
+        self._numbers = []                          # per chunk slot: its words that contain a digit
+        self._exact = {}                            # digest of the chunk's words → chunk ID
+        self._page_blocks = [{} for _ in range(4)]  # 16-bit block → page slots
+        self._page_hashes = []
+        self._page_urls = []
+
+    def page(self, url: str, text: str) -> str | None:
+        """URL of a near-identical page seen earlier, else None (and `url` is kept)."""
+        self.stats.pages += 1
+        hashes = shingles(text)
+        if len(hashes) < PAGE_MIN_SHINGLES:
+            return None
+        h = simhash(hashes)
+        blocks = [(h >> (16 * i)) & 0xFFFF for i in range(4)]
+        for i, block in enumerate(blocks):
+            for slot in self._page_blocks[i].get(block, ()):
+                if (h ^ self._page_hashes[slot]).bit_count() <= self.page_distance:
+                    self.stats.duplicate_pages += 1
+                    return self._page_urls[slot]
+        slot = len(self._page_hashes)
+        self._page_hashes.append(h)
+        self._page_urls.append(url)
+        for i, block in enumerate(blocks):
+            self._page_blocks[i].setdefault(block, []).append(slot)
+        return None
+
+    def chunk(self, chunk_id: str, text: str) -> str | None:
+        """ID of a near-identical chunk seen earlier, else None (and `chunk_id` is kept)."""
+        self.stats.chunks += 1
+        # Repeated blocks and the shared parts of near-duplicate pages are mostly verbatim
+        words = WORD_RE.findall(text.lower())
+        exact = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+        if exact in self._exact:
+            self.stats.duplicate_chunks += 1
+            return self._exact[exact]
+        numbers = frozenset(w for w in words if any(c.isdigit() for c in w))
+        sig = minhash(shingles(text))
+        bands = [sig[b * self._rows:(b + 1) * self._rows].tobytes() for b in range(BANDS)]
+        candidates = set()
+        for bucket, band in zip(self._bands, bands):
+            candidates.update(bucket.get(band, ()))
+        best, best_sim = None, self.threshold
+        for slot in candidates:
+            if self._numbers[slot] != numbers:  # a fee, an age, an hour: a different fact
+                continue
+            sim = float(np.count_nonzero(self._signatures[slot] == sig)) / NUM_PERM
+            if sim >= best_sim:
+                best, best_sim = slot, sim
+        if best is not None:
+            self.stats.duplicate_chunks += 1
+            return self._chunk_ids[best]
+        slot = len(self._signatures)
+        self._signatures.append(sig)
+        self._chunk_ids.append(chunk_id)
+        self._numbers.append(numbers)
+        self._exact[exact] = chunk_id
+        for bucket, band in zip(self._bands, bands):
+            bucket.setdefault(band, []).append(slot)
+        return None
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s.chunks} chunks → {s.chunks - s.duplicate_chunks} unique "
+                f"({s.ratio:.1%} near-duplicates dropped; {s.duplicate_pages} of {s.pages} pages near-duplicates)")
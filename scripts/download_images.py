@@ -3,139 +3,444 @@
 Download all images from Cloudflare R2 storage
 and save them to the public/images folder for local development.
 
+The whole `images/` prefix is listed page by page and transferred on a thread
+pool sharing one boto3 client. Objects whose local copy already has the same
+size and checksum (ETag) are skipped, and a manifest (.r2_images_manifest.json)
+records what was transferred, so reruns only move new or changed images.
+
+Modes:
+    pull   (default) R2 → public/images; R2 wins when the two differ
+    sync   both ways: local-only images and videos are uploaded, R2-only
+           objects are downloaded, and a file changed on one side since the last run is
+           copied to the other (changed on both: the newer mtime wins).
+           Nothing is ever deleted.
+
+Layout: both modes keep every object flat as public/images/<file name>, as
+this script always has, so keys in sub-prefixes (images/a/x.jpg) land next to
+the rest (x.jpg; the first key wins if two share a name). `sync` maps a local
+file back to the R2 key of that name, or uploads it as images/<file name>
+when R2 has none; files in local subdirectories are not synced.
+
+Objects bigger than --chunk-size-mb move as multipart transfers: parallel
+ranged GETs on download, parallel part uploads on upload.
+
 Prerequisites:
 - Python 3 installed
 - .env.local file with R2 credentials
 - boto3 package installed: pip install boto3 python-dotenv
+
+Usage:
+    python3 scripts/download_images.py
+    python3 scripts/download_images.py --workers 32
+    python3 scripts/download_images.py sync --dry-run       # show what would move, and how many bytes
+    python3 scripts/download_images.py sync --chunk-size-mb 16 --part-concurrency 8
+    python3 scripts/download_images.py sync --prefix videos/ --dest public/videos
+
+Testing without R2 (any S3-compatible endpoint works, e.g. moto):
+    moto_server -p 5000 &
+    R2_ENDPOINT_URL=http://127.0.0.1:5000 R2_BUCKET_NAME=test \\
+    R2_ACCESS_KEY_ID=x R2_SECRET_ACCESS_KEY=x python3 scripts/download_images.py
+
+    # or in-process: `pull(client, bucket, dest)` with a client from moto's mock_aws()
 """
 
+import argparse
+import hashlib
+import json
 import os
-import boto3
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+
+import boto3
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
 
-def create_images_folder():
+PREFIX = "images/"
+IMAGES_FOLDER = Path("public/images")
+MANIFEST_FILE = Path(".r2_images_manifest.json")   # key → etag, size, local mtime
+WORKERS = 16                                       # concurrent files
+CHUNK_SIZE = 8 * 2**20                             # multipart part size (and threshold)
+PART_CONCURRENCY = 4                               # parallel parts per large file
+MEDIA_SUFFIXES = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg', '.ico',   # what sync uploads
+                  '.mp4', '.webm', '.mov'}
+# image_derivatives.py output (toys-640.3f2a9c1e.webp): generated, never uploaded
+VARIANT_RE = re.compile(r'.+-\d+\.[0-9a-f]{8}\.(webp|avif)')
+
+
+def create_images_folder(images_folder=IMAGES_FOLDER):
     """Create the public/images folder if it doesn't exist"""
-    images_folder = Path("public/images")
+    images_folder = Path(images_folder)
     images_folder.mkdir(parents=True, exist_ok=True)
     return images_folder
 
-def create_r2_client():
-    """Create and configure R2 client using boto3"""
+
+def create_r2_client(max_pool_connections=WORKERS):
+    """Create and configure R2 client using boto3 (R2_ENDPOINT_URL overrides the R2 endpoint)"""
     # Load environment variables from .env.local
     load_dotenv('.env.local')
-    
+
     account_id = os.getenv('NEXT_PUBLIC_R2_ACCOUNT_ID')
     access_key_id = os.getenv('R2_ACCESS_KEY_ID')
     secret_access_key = os.getenv('R2_SECRET_ACCESS_KEY')
-    
-    if not all([account_id, access_key_id, secret_access_key]):
+    endpoint_url = os.getenv('R2_ENDPOINT_URL')
+
+    if not all([account_id or endpoint_url, access_key_id, secret_access_key]):
         print('❌ Missing R2 credentials in .env.local')
         print('Required variables: NEXT_PUBLIC_R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY')
         exit(1)
-    
-    endpoint_url = f'https://{account_id}.r2.cloudflarestorage.com'
-    
+
     return boto3.client(
         's3',
-        endpoint_url=endpoint_url,
+        endpoint_url=endpoint_url or f'https://{account_id}.r2.cloudflarestorage.com',
         aws_access_key_id=access_key_id,
         aws_secret_access_key=secret_access_key,
-        region_name='auto'
+        region_name='auto',
+        # One client is shared by every worker thread: give each its own
+        # keep-alive connection and retry throttling adaptively
+        config=Config(
+            max_pool_connections=max_pool_connections,
+            retries={'max_attempts': 10, 'mode': 'adaptive'},
+            tcp_keepalive=True,
+        ),
     )
 
-def download_image_from_r2(client, bucket_name, key, images_folder):
-    """Download a single image from R2 and save it locally"""
-    try:
-        filename = Path(key).name
-        print(f"Downloading: {key}")
-        
-        file_path = images_folder / filename
-        
-        # Download the file
-        client.download_file(bucket_name, key, str(file_path))
-        
-        # Get file size
-        file_size_kb = file_path.stat().st_size / 1024
-        print(f"✅ Saved: {filename} ({file_size_kb:.2f} KB)")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error downloading {key}: {e}")
+
+def transfer_config(chunk_size=CHUNK_SIZE, part_concurrency=PART_CONCURRENCY):
+    """Multipart (ranged, parallel) transfers for objects above `chunk_size`"""
+    return TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=part_concurrency,
+        use_threads=part_concurrency > 1,
+    )
+
+
+# ─────────────────────────────────────────────
+# Listing and change detection
+# ─────────────────────────────────────────────
+def list_images(client, bucket_name, prefix=PREFIX):
+    """Yield every image object under `prefix`, across all listing pages"""
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            # Skip folder markers and extensionless keys
+            if '.' in obj['Key'] and not obj['Key'].endswith('/'):
+                yield obj
+
+
+def local_path(images_folder, key):
+    """Where `key` lives locally: flat, by file name"""
+    return Path(images_folder) / Path(key).name
+
+
+def list_local(images_folder):
+    """
+    Names of the images and videos directly in the local folder. Subdirectories
+    (such as image_derivatives.py's responsive/), dotfiles, temp files, other
+    files and generated variants are left out, so `sync` never uploads them.
+    """
+    for path in Path(images_folder).iterdir():
+        if path.is_file() and path.suffix.lower() in MEDIA_SUFFIXES and not path.name.startswith('.') \
+                and not VARIANT_RE.fullmatch(path.name):
+            yield path.name
+
+
+def file_md5(path, block_size=1 << 20):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def multipart_etag(path, part_size):
+    """The ETag S3/R2 give an object uploaded in `part_size` parts: md5(part md5s)-N"""
+    digests = []
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(part_size), b''):
+            digests.append(hashlib.md5(block).digest())
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def load_manifest(path=MANIFEST_FILE):
+    path = Path(path)
+    if path.exists():
+        return json.loads(path.read_text(encoding='utf-8'))
+    return {}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding='utf-8')
+    tmp.replace(path)
+
+
+def is_current(obj, file_path, entry, chunk_size=CHUNK_SIZE):
+    """True if the local file already holds this object's content"""
+    if not file_path.exists():
+        return False
+    stat = file_path.stat()
+    if stat.st_size != obj['Size']:
         return False
+    etag = obj['ETag'].strip('"')
+    # Fast path: transferred by us and nobody touched either side since
+    if entry and entry['etag'] == etag and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    if '-' not in etag:  # single-part ETags are the MD5 of the content
+        return file_md5(file_path) == etag
+    # Multipart: recompute with our own part size, or the one the part count implies
+    parts = int(etag.rsplit('-', 1)[1])
+    implied = -(-stat.st_size // parts // 2**20) * 2**20
+    if any(multipart_etag(file_path, size) == etag for size in {chunk_size, implied} if size):
+        return True
+    # Uploaded by another client with a part size we can't guess: with nothing on
+    # record to compare against, the size has to do, and the ETag is recorded from here on
+    return entry is None
+
+
+def decide(mode, obj, file_path, entry, chunk_size=CHUNK_SIZE):
+    """Return (op, reason) for one key; op is 'download', 'upload' or None"""
+    if obj is None:
+        return ('upload', 'local only') if mode == 'sync' else (None, '')
+    if not file_path.exists():
+        return 'download', 'only in R2'
+    if is_current(obj, file_path, entry, chunk_size):
+        return None, 'unchanged'
+    if mode == 'pull':
+        return 'download', 'changed'
+
+    stat = file_path.stat()
+    remote_changed = not entry or entry['etag'] != obj['ETag'].strip('"')
+    local_changed = not entry or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns
+    if remote_changed and not local_changed:
+        return 'download', 'changed in R2'
+    if local_changed and not remote_changed:
+        return 'upload', 'changed locally'
+    if stat.st_mtime > obj['LastModified'].timestamp():
+        return 'upload', 'changed on both sides, local is newer'
+    return 'download', 'changed on both sides, R2 is newer'
+
+
+def plan(client, bucket_name, images_folder=IMAGES_FOLDER, prefix=PREFIX, manifest=None,
+         mode='pull', workers=WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    Compare the bucket with the local folder. Returns (actions, current):
+    actions are dicts with op, key, path, size, reason; current maps the keys
+    already in sync to their R2 object.
+    """
+    images_folder = Path(images_folder)
+    manifest = manifest or {}
+    remote = {obj['Key']: obj for obj in list_images(client, bucket_name, prefix)}
+
+    # Flat layout: keys in different sub-prefixes can share a file name
+    owners = {}
+    for key in sorted(remote):
+        owners.setdefault(Path(key).name, key)
+    for key in sorted(set(remote) - set(owners.values())):
+        print(f"⚠️  Skipping {key}: {Path(key).name} already comes from {owners[Path(key).name]}")
+    keys = set(owners.values())
+    if mode == 'sync':
+        # A local file is the object of the same name, or a new one at the top of the prefix
+        keys |= {owners.get(name, prefix + name) for name in list_local(images_folder)}
+
+    def check(key):
+        file_path = local_path(images_folder, key)
+        return key, file_path, decide(mode, remote.get(key), file_path, manifest.get(key), chunk_size)
+
+    actions, current = [], {}
+    # Deciding may hash files, so it runs on the pool too
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, file_path, (op, reason) in pool.map(check, sorted(keys)):
+            if op is None:
+                if key in remote:
+                    current[key] = remote[key]
+                continue
+            size = remote[key]['Size'] if op == 'download' else file_path.stat().st_size
+            actions.append({'op': op, 'key': key, 'path': file_path, 'size': size,
+                            'reason': reason, 'obj': remote.get(key)})
+    return actions, current
+
+
+# ─────────────────────────────────────────────
+# Transfers
+# ─────────────────────────────────────────────
+def download_image_from_r2(client, bucket_name, key, file_path, config=None, last_modified=None):
+    """Download a single image from R2 and save it locally (atomically)"""
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(file_path.name + '.part')
+    client.download_file(bucket_name, key, str(tmp_path), Config=config or transfer_config())
+    os.replace(tmp_path, file_path)
+    if last_modified is not None:
+        # Local mtime = R2's, so "which side is newer" stays meaningful
+        ts = last_modified.timestamp()
+        os.utime(file_path, (ts, ts))
+    return file_path
+
+
+def upload_image_to_r2(client, bucket_name, key, file_path, config=None):
+    """Upload a single local image to R2; returns the new ETag"""
+    client.upload_file(str(file_path), bucket_name, key, Config=config or transfer_config())
+    return client.head_object(Bucket=bucket_name, Key=key)['ETag'].strip('"')
+
+
+def manifest_entry(etag, file_path):
+    stat = Path(file_path).stat()
+    return {'etag': etag.strip('"'), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'path': str(file_path)}
+
+
+def summarize(actions):
+    down = [a for a in actions if a['op'] == 'download']
+    up = [a for a in actions if a['op'] == 'upload']
+    return {'download': len(down), 'download_bytes': sum(a['size'] for a in down),
+            'upload': len(up), 'upload_bytes': sum(a['size'] for a in up)}
+
+
+def run(client, bucket_name, images_folder=IMAGES_FOLDER, prefix=PREFIX, manifest_path=MANIFEST_FILE,
+        mode='pull', workers=WORKERS, chunk_size=CHUNK_SIZE, part_concurrency=PART_CONCURRENCY,
+        dry_run=False):
+    """Plan and (unless `dry_run`) carry out a pull or sync; returns a summary dict"""
+    images_folder = create_images_folder(images_folder)
+    manifest = load_manifest(manifest_path)
+    started = time.monotonic()
+    actions, current = plan(client, bucket_name, images_folder, prefix, manifest, mode, workers, chunk_size)
+    stats = {'listed': len(current) + sum(a['obj'] is not None for a in actions), 'skipped': len(current),
+             **summarize(actions), 'downloaded': 0, 'uploaded': 0, 'failed': 0, 'bytes': 0}
+    if dry_run:
+        for a in actions:
+            arrow = '⬇' if a['op'] == 'download' else '⬆'
+            print(f"{arrow}  {a['key']} ({a['size'] / 1024:.2f} KB) — {a['reason']}")
+        stats['elapsed'] = time.monotonic() - started
+        return stats
+
+    for key, obj in current.items():
+        manifest[key] = manifest_entry(obj['ETag'], local_path(images_folder, key))
+    config = transfer_config(chunk_size, part_concurrency)
+
+    def transfer(a):
+        if a['op'] == 'download':
+            download_image_from_r2(client, bucket_name, a['key'], a['path'], config, a['obj']['LastModified'])
+            return a['obj']['ETag']
+        return upload_image_to_r2(client, bucket_name, a['key'], a['path'], config)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(transfer, a): a for a in actions}
+            for future in as_completed(futures):
+                a = futures[future]
+                try:
+                    etag = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"❌ Error {a['op']}ing {a['key']}: {e}")
+                    continue
+                manifest[a['key']] = manifest_entry(etag, a['path'])
+                stats['bytes'] += a['size']
+                if a['op'] == 'download':
+                    stats['downloaded'] += 1
+                    print(f"✅ Saved: {a['path'].relative_to(images_folder)} ({a['size'] / 1024:.2f} KB)")
+                else:
+                    stats['uploaded'] += 1
+                    print(f"⬆️  Uploaded: {a['key']} ({a['size'] / 1024:.2f} KB)")
+    finally:
+        # Keep what finished even if interrupted, so the rerun picks up from here
+        save_manifest(manifest, manifest_path)
+
+    stats['elapsed'] = time.monotonic() - started
+    return stats
+
+
+def pull(client, bucket_name, images_folder=IMAGES_FOLDER, prefix=PREFIX,
+         manifest_path=MANIFEST_FILE, workers=WORKERS, **kwargs):
+    """Download new or changed objects under `prefix`; returns a summary dict"""
+    return run(client, bucket_name, images_folder, prefix, manifest_path, 'pull', workers, **kwargs)
+
+
+def sync(client, bucket_name, images_folder=IMAGES_FOLDER, prefix=PREFIX,
+         manifest_path=MANIFEST_FILE, workers=WORKERS, **kwargs):
+    """Two-way delta sync between `prefix` and the local folder; returns a summary dict"""
+    return run(client, bucket_name, images_folder, prefix, manifest_path, 'sync', workers, **kwargs)
+
 
 def main():
-    """Main function to download all images from R2"""
-    print("🚀 Starting image download from Cloudflare R2...")
-    print("📁 Images will be saved to: public/images/")
+    """Main function to download (or sync) all images from R2"""
+    parser = argparse.ArgumentParser(description="Download or sync images between Cloudflare R2 and public/images")
+    parser.add_argument("mode", nargs="?", choices=["pull", "sync"], default="pull",
+                        help="pull: R2 → local (default); sync: both directions")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would be transferred")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="concurrent files")
+    parser.add_argument("--chunk-size-mb", type=float, default=CHUNK_SIZE / 2**20,
+                        help="multipart part size; larger objects move in parallel parts")
+    parser.add_argument("--part-concurrency", type=int, default=PART_CONCURRENCY,
+                        help="parallel parts per large file")
+    parser.add_argument("--prefix", default=PREFIX, help="bucket prefix to transfer")
+    parser.add_argument("--dest", type=Path, default=IMAGES_FOLDER, help="local folder")
+    parser.add_argument("--manifest", type=Path, default=MANIFEST_FILE, help="sync manifest file")
+    args = parser.parse_args()
+
+    verb = "sync with" if args.mode == "sync" else "download from"
+    print(f"🚀 Starting image {verb} Cloudflare R2{' (dry run)' if args.dry_run else ''}...")
+    print(f"📁 Local folder: {args.dest}/")
     print()
-    
+
     # Load environment variables
     load_dotenv('.env.local')
     bucket_name = os.getenv('R2_BUCKET_NAME')
-    
+
     if not bucket_name:
         print('❌ Missing R2_BUCKET_NAME in .env.local')
         exit(1)
-    
-    # Create the images folder
-    images_folder = create_images_folder()
-    
-    # Create R2 client
-    client = create_r2_client()
-    
+
+    client = create_r2_client(max_pool_connections=args.workers * max(1, args.part_concurrency))
+
     try:
-        # List all images in the images/ folder
-        print(f"📋 Listing images in bucket: {bucket_name}/images/")
-        
-        response = client.list_objects_v2(
-            Bucket=bucket_name,
-            Prefix='images/',
-            MaxKeys=100
-        )
-        
-        if 'Contents' not in response or len(response['Contents']) == 0:
-            print('⚠️  No images found in R2 bucket images/ folder')
-            return
-        
-        # Filter for actual image files (not folders)
-        image_files = [
-            obj for obj in response['Contents']
-            if '.' in obj['Key'] and not obj['Key'].endswith('/')
-        ]
-        
-        print(f"Found {len(image_files)} images in R2")
-        print()
-        
-        # Download each image
-        successful_downloads = 0
-        failed_downloads = 0
-        
-        for obj in image_files:
-            key = obj['Key']
-            
-            if download_image_from_r2(client, bucket_name, key, images_folder):
-                successful_downloads += 1
-            else:
-                failed_downloads += 1
-        
-        print("\n" + "="*50)
-        print("📊 Download Summary:")
-        print(f"✅ Successful downloads: {successful_downloads}")
-        print(f"❌ Failed downloads: {failed_downloads}")
-        print(f"📁 Images saved to: {images_folder.absolute()}")
-        
-        if successful_downloads > 0:
-            print("\n🎉 Images are now available for local development!")
-            print("💡 You can reference them in your components like:")
-            print("   /images/filename.jpg")
-            print("   /images/daycare-logo.png")
-            print("   etc.")
-    
+        print(f"📋 Listing images in bucket: {bucket_name}/{args.prefix}")
+        stats = run(client, bucket_name, args.dest, args.prefix, args.manifest, args.mode, args.workers,
+                    int(args.chunk_size_mb * 2**20), args.part_concurrency, args.dry_run)
     except Exception as e:
         print(f"❌ Error: {e}")
         exit(1)
 
+    if stats['listed'] == 0 and not stats['upload']:
+        print(f'⚠️  No images found in R2 bucket {args.prefix} folder')
+        return
+
+    down_mb = stats['download_bytes'] / 2**20
+    up_mb = stats['upload_bytes'] / 2**20
+    print("\n" + "="*50)
+    if args.dry_run:
+        print("📊 Plan (dry run, nothing transferred):")
+        print(f"Found {stats['listed']} images in R2, {stats['skipped']} already in sync")
+        print(f"⬇  Would download: {stats['download']} files ({down_mb:.1f} MB)")
+        print(f"⬆  Would upload: {stats['upload']} files ({up_mb:.1f} MB)")
+        return
+
+    mb = stats['bytes'] / 2**20
+    print("📊 Transfer Summary:")
+    print(f"Found {stats['listed']} images in R2")
+    print(f"✅ Downloaded: {stats['downloaded']} ({down_mb:.1f} MB planned)")
+    if args.mode == "sync":
+        print(f"⬆️  Uploaded: {stats['uploaded']} ({up_mb:.1f} MB planned)")
+    print(f"⏭  Unchanged (skipped): {stats['skipped']}")
+    print(f"❌ Failed transfers: {stats['failed']}")
+    print(f"🚚 Moved {mb:.1f} MB in {stats['elapsed']:.1f}s ({mb / max(stats['elapsed'], 1e-9):.1f} MB/s)")
+    print(f"📁 Images saved to: {args.dest.absolute()}")
+
+    if stats['downloaded'] > 0:
+        print("\n🎉 Images are now available for local development!")
+        print("💡 You can reference them in your components like:")
+        print("   /images/filename.jpg")
+        print("   /images/daycare-logo.png")
+        print("   etc.")
+
+    if stats['failed']:
+        exit(1)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,166 @@
+"""
+embedder.py — Batched, parallel embedding stage for rag_pipeline.py build
+
+Packs chunks into requests sized by token count (and the provider's
+per-request input cap), runs them on a bounded thread pool, and retries
+rate limits / transient errors with exponential backoff. Each finished
+batch is handed to a callback right away, so whatever the callback writes
+(the Chroma collection, for `build`) doubles as the resume checkpoint.
+With an EmbeddingCache, texts embedded before never reach the API.
+
+Usage:
+    from embedder import Embedder
+
+    items = [(chunk_id, text, meta), ...]        # anything with text at [1]
+    Embedder(OpenAI(), "text-embedding-3-small", workers=4).run(
+        items, lambda batch, vectors: col.upsert(...)
+    )
+
+Point OPENAI_BASE_URL at a local fake server to exercise it offline.
+"""
+
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+MAX_INPUTS_PER_REQUEST = 2048     # OpenAI embeddings API limit
+MAX_TOKENS_PER_REQUEST = 100_000  # well under the 300k/request ceiling
+
+
+def token_counter(model: str):
+    """Exact counts with tiktoken when installed, ~4 chars/token otherwise."""
+    try:
+        import tiktoken
+        enc = tiktoken.encoding_for_model(model)
+        return lambda text: len(enc.encode(text, disallowed_special=()))
+    except Exception:  # not installed, unknown model, or encoding not downloadable offline
+        return lambda text: len(text) // 4 + 1
+
+
+def pack_batches(items, count_tokens, max_tokens=MAX_TOKENS_PER_REQUEST, max_inputs=MAX_INPUTS_PER_REQUEST):
+    """Yield lists of items whose total token count stays under `max_tokens`."""
+    batch, batch_tokens = [], 0
+    for item in items:
+        tokens = count_tokens(item[1])
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch, batch_tokens
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch, batch_tokens
+
+
+@dataclass
+class EmbedStats:
+    batches: int = 0
+    inputs: int = 0
+    tokens: int = 0
+    retries: int = 0
+    cached: int = 0
+    elapsed: float = 0.0
+
+
+class Embedder:
+    def __init__(self, client, model: str, workers: int = 4,
+                 max_batch_tokens: int = MAX_TOKENS_PER_REQUEST,
+                 max_retries: int = 6, backoff: float = 1.0, max_backoff: float = 60.0,
+                 cache=None):
+        # We do our own retries; the SDK's would stack on top of them
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.workers = max(1, workers)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.count_tokens = token_counter(model)
+        self.cache = cache
+        self.stats = EmbedStats()
+
+    def embed_batch(self, texts: list) -> list:
+        import openai
+
+        retryable = (openai.RateLimitError, openai.APIConnectionError,
+                     openai.APITimeoutError, openai.InternalServerError)
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self.client.embeddings.create(model=self.model, input=texts)
+                return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+            except retryable as e:
+                if attempt == self.max_retries:
+                    raise
+                self.stats.retries += 1
+                time.sleep(self._delay(e, attempt))
+
+    def _delay(self, error, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # Full jitter keeps parallel workers from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def run(self, items, on_batch) -> EmbedStats:
+        """
+        Embed `items` (tuples with the text at index 1) and call
+        `on_batch(batch, vectors)` on the calling thread as each batch finishes.
+        At most 2 × workers batches are in flight, so `items` may be a generator.
+        """
+        started = time.monotonic()
+
+        def uncached(items):
+            """Hand cache hits straight to `on_batch`; yield only the misses."""
+            hits = []
+
+            def deliver():
+                on_batch([item for item, _ in hits], [vec for _, vec in hits])
+                self.stats.cached += len(hits)
+                hits.clear()
+
+            for item in items:
+                vec = self.cache.get(item[1])
+                if vec is None:
+                    yield item
+                    continue
+                hits.append((item, vec))
+                if len(hits) >= MAX_INPUTS_PER_REQUEST:
+                    deliver()
+            if hits:
+                deliver()
+
+        if self.cache is not None:
+            items = uncached(items)
+        batches = pack_batches(items, self.count_tokens, self.max_batch_tokens)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+
+            def drain(return_when):
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    batch, tokens = pending.pop(future)
+                    vectors = future.result()
+                    if self.cache is not None:
+                        self.cache.put_many([item[1] for item in batch], vectors)
+                    on_batch(batch, vectors)
+                    self.stats.batches += 1
+                    self.stats.inputs += len(batch)
+                    self.stats.tokens += tokens
+                    print(f"    batch {self.stats.batches}: {len(batch)} chunks, ~{tokens} tokens")
+
+            for batch, tokens in batches:
+                if len(pending) >= self.workers * 2:
+                    drain(FIRST_COMPLETED)
+                texts = [item[1] for item in batch]
+                pending[pool.submit(self.embed_batch, texts)] = (batch, tokens)
+            while pending:
+                drain(FIRST_COMPLETED)
+
+        if self.cache is not None:
+            self.cache.flush()
+        self.stats.elapsed = time.monotonic() - started
+        return self.stats
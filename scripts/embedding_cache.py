@@ -0,0 +1,358 @@
+"""
+embedding_cache.py — Persistent, content-addressed embedding cache
+
+Vectors live in a memory-mapped float32 matrix (`vectors.f32`), one row per
+cached text, keyed by sha256(model + normalized text). When the cache is
+full the least recently used 10% of rows are evicted and their slots reused.
+
+The key → row index is an append-only log: each flush appends the puts and
+evictions since the last one to `index.<n>.log`, so a build pays for what it
+added, not for the whole index. Once the log outgrows the index it is
+compacted into `index.json` (rows and last-use ticks) and a new log started.
+
+Every row also carries a 64-bit tag of the key it holds (`tags.u64`, 0 for
+a free row). Lookups only trust a row whose tag matches their key, and check
+it again after copying the vector, so a reader never returns a vector that
+the writer has since evicted and reused for another text.
+
+Layout:
+    embedding_cache/<model>/vectors.f32
+    embedding_cache/<model>/tags.u64
+    embedding_cache/<model>/index.json    compacted index; names the live log
+    embedding_cache/<model>/index.<n>.log puts / evictions since, one JSON array per line
+    embedding_cache/<model>/lock          held (flock) by the one writer
+
+Usage:
+    cache = EmbeddingCache("./embedding_cache", "text-embedding-3-small")
+    vec = cache.get(text)
+    if vec is None:
+        vec = embed(text)
+        cache.put(text, vec)
+    cache.flush()
+
+One process at a time owns a cache directory for writing: a writer holds an
+exclusive lock on it until `close()` or exit, and `get`/`put` are
+thread-safe within that process. Other processes (serve's pre-forked
+workers, or a `build` while `serve` is running) open it with
+`readonly=True` — or fall back to it when the lock is taken: they see the
+entries as of when they opened it (minus any the writer has since evicted),
+and `put` is a no-op.
+"""
+
+import fcntl
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+INITIAL_ROWS = 1024
+EVICT_FRACTION = 0.1
+FLUSH_EVERY = 64       # puts between log appends
+COMPACT_MIN = 4096     # log lines before compaction is considered
+LOCK_FILE = "lock"
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+def key_tag(key: str) -> int:
+    """The 64-bit row tag for a cache key; never 0, which marks a free row."""
+    return int(key[:16], 16) or 1
+
+
+class EmbeddingCache:
+    def __init__(self, root, model: str, max_entries: int = 200_000, readonly: bool = False):
+        self.dir = Path(root) / model.replace("/", "_")
+        self._lock_file = None
+        if not readonly:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            if not self._acquire():
+                # Two writers would each allocate rows from their own view and
+                # point the other's keys at the wrong vectors
+                print(f"⚠️  {self.dir} is open for writing in another process; using it read-only")
+                readonly = True
+        self.model = model
+        self.readonly = readonly
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._dirty = 0
+
+        self._index_path = self.dir / "index.json"
+        self._vectors_path = self.dir / "vectors.f32"
+        self._tags_path = self.dir / "tags.u64"
+        self.dim = None
+        self._entries = {}   # key → [row, last_used]
+        self._free = []
+        self._clock = 0
+        self._rows = 0
+        self._matrix = None
+        self._tags = None
+        self._log_gen = 0
+        self._log_lines = 0  # in the live log, appended or pending
+        self._pending = []   # log lines not yet appended
+        if self._index_path.exists() and self._vectors_path.exists():
+            self._load()
+
+    # ── lookups ──────────────────────────────
+    def get(self, text: str):
+        """Return the cached vector as a float32 array, or None."""
+        return self.get_many([text])[0]
+
+    def get_many(self, texts) -> list:
+        out = []
+        with self._lock:
+            for text in texts:
+                key = cache_key(self.model, text)
+                entry = self._entries.get(key)
+                vec = None
+                if entry is not None:
+                    row, tag = entry[0], key_tag(key)
+                    # The tag is checked again after the copy: a writer in another
+                    # process may evict and reuse the row in between
+                    if self._tags[row] == tag:
+                        vec = np.array(self._matrix[row])
+                        if self._tags[row] != tag:
+                            vec = None
+                if vec is None:
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self.hits += 1
+                self._clock += 1
+                entry[1] = self._clock
+                out.append(vec)
+        return out
+
+    # ── inserts ──────────────────────────────
+    def put(self, text: str, vector) -> None:
+        self.put_many([text], [vector])
+
+    def put_many(self, texts, vectors) -> None:
+        if self.readonly:
+            return
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(self.model, text)
+                vector = np.asarray(vector, dtype=np.float32)
+                if self.dim is None:
+                    self.dim = int(vector.shape[0])
+                    self._open()
+                    self._write_index(self._snapshot())
+                if key in self._entries:
+                    continue
+                row = self._allocate()
+                self._tags[row] = 0
+                self._matrix[row] = vector
+                self._tags[row] = key_tag(key)
+                self._clock += 1
+                self._entries[key] = [row, self._clock]
+                self._log(["put", key, row, self._clock])
+                self._dirty += 1
+            if self._dirty >= FLUSH_EVERY:
+                self._flush()
+            compact = self._should_compact()
+        if compact:
+            self.compact()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+            compact = self._should_compact()
+        if compact:
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the log into index.json and start a new, empty log."""
+        if self.readonly or not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if self._matrix is None:
+                    return
+                self._flush()
+                old_gen = self._log_gen
+                self._log_gen += 1
+                self._log_lines = 0
+                snapshot = self._snapshot()
+            # Serialized outside the lock, so lookups and puts carry on; until
+            # the replace lands, loading replays the old log and then the new
+            self._write_index(snapshot)
+            for gen in range(old_gen, -1, -1):
+                log = self._log_path(gen)
+                if not log.exists():
+                    break
+                log.unlink()
+        finally:
+            self._compact_lock.release()
+
+    def close(self) -> None:
+        """Compact and release the writer lock; later `put`s are no-ops."""
+        self.compact()
+        with self._lock:
+            self._flush()
+            self.readonly = True
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    # ── stats ────────────────────────────────
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "evictions": self.evictions,
+        }
+
+    # ── internals ────────────────────────────
+    def _acquire(self) -> bool:
+        """Take the directory's writer lock; False if another process holds it."""
+        f = open(self.dir / LOCK_FILE, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def _log_path(self, gen: int) -> Path:
+        return self.dir / f"index.{gen}.log"
+
+    def _load(self) -> None:
+        data = json.loads(self._index_path.read_text(encoding="utf-8"))
+        self.dim = data["dim"]
+        self._entries = data["entries"]
+        self._clock = data["clock"]
+        self._log_gen = data.get("log", 0)
+        # A compaction that didn't finish leaves the next log behind too
+        gen = self._log_gen
+        while self._log_path(gen).exists():
+            self._log_gen = gen
+            self._log_lines = self._replay(self._log_path(gen))
+            gen += 1
+        self._rows = self._vectors_path.stat().st_size // (self.dim * 4)
+        self._open()
+        # Drop anything the tags disagree with: rows past the end, or an entry
+        # whose eviction was logged after a crash had already reused its row
+        tags = np.asarray(self._tags)
+        self._entries = {k: e for k, e in self._entries.items()
+                         if e[0] < self._rows and tags[e[0]] == key_tag(k)}
+        if not self.readonly:
+            used = {row for row, _ in self._entries.values()}
+            self._free = sorted(set(range(self._rows)) - used, reverse=True)
+
+    def _replay(self, path: Path) -> int:
+        lines = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:  # torn last line
+                    break
+                lines += 1
+                if op[0] == "put":
+                    self._entries[op[1]] = [op[2], op[3]]
+                    self._clock = max(self._clock, op[3])
+                else:
+                    self._entries.pop(op[1], None)
+        return lines
+
+    def _open(self, rows: int | None = None) -> None:
+        if self.readonly:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+            self._tags = self._map_tags("r", self._rows)
+            return
+        rows = rows or self._rows or INITIAL_ROWS
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._tags.flush()
+            del self._matrix, self._tags
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < rows * self.dim * 4:
+                f.truncate(rows * self.dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        self._tags = self._map_tags("r+", rows)
+        self._free.extend(range(rows - 1, self._rows - 1, -1))
+        self._rows = rows
+
+    def _map_tags(self, mode: str, rows: int):
+        if mode == "r+":
+            fresh = not self._tags_path.exists()
+            with open(self._tags_path, "ab") as f:
+                if f.tell() < rows * 8:
+                    f.truncate(rows * 8)
+            tags = np.memmap(self._tags_path, dtype=np.uint64, mode="r+", shape=(rows,))
+            if fresh:  # a cache from before row tags: tag what the index says
+                for key, (row, _) in self._entries.items():
+                    if row < rows:
+                        tags[row] = key_tag(key)
+            return tags
+        if not self._tags_path.exists() or self._tags_path.stat().st_size < rows * 8:
+            return np.zeros(rows, dtype=np.uint64)  # untagged: every lookup misses
+        return np.memmap(self._tags_path, dtype=np.uint64, mode="r", shape=(rows,))
+
+    def _allocate(self) -> int:
+        if len(self._entries) >= self.max_entries:
+            self._evict()
+        if not self._free:
+            self._open(min(self._rows * 2, self.max_entries))
+        return self._free.pop()
+
+    def _evict(self) -> None:
+        count = max(1, int(self.max_entries * EVICT_FRACTION))
+        oldest = sorted(self._entries.items(), key=lambda kv: kv[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self._entries[key]
+            # Untagged before the row is reused, so no reader trusts it meanwhile
+            self._tags[row] = 0
+            self._free.append(row)
+            self._log(["evict", key])
+        self.evictions += len(oldest)
+
+    def _log(self, op: list) -> None:
+        self._pending.append(json.dumps(op) + "\n")
+        self._log_lines += 1
+
+    def _should_compact(self) -> bool:
+        return not self.readonly and self._log_lines > max(COMPACT_MIN, len(self._entries))
+
+    def _snapshot(self) -> dict:
+        return {"model": self.model, "dim": self.dim, "clock": self._clock, "log": self._log_gen,
+                "entries": {k: list(e) for k, e in self._entries.items()}}
+
+    def _write_index(self, data: dict) -> None:
+        tmp = self._index_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(self._index_path)
+
+    def _flush(self) -> None:
+        if self._matrix is None or self.readonly:
+            return
+        # Vectors reach the file before the log lines that point at them
+        self._matrix.flush()
+        self._tags.flush()
+        if self._pending:
+            with open(self._log_path(self._log_gen), "a", encoding="utf-8") as f:
+                f.writelines(self._pending)
+            self._pending = []
+        self._dirty = 0
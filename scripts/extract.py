@@ -0,0 +1,261 @@
+"""
+extract.py — Single-pass page extraction shared by the scrapers
+
+Each document is parsed once. A backend turns the parse tree into a stream of
+start / end / text events, and one pass over that stream collects everything
+both scrapers need:
+
+    title, description        <title>, <meta name="description">
+    headings, paragraphs      h1–h3 anywhere, <p> inside the main container
+    images, links             <img src>, same-host <a href> with their text
+    text, sections            main container strings, grouped under h1–h3
+    internal_links            same-host http(s) URLs to crawl next (nav included; www. and
+                              non-www. count as one host, frontier.py canonicalizes them)
+
+nav, header, footer, script, style, iframe and noscript are left out of the
+content (but their links are still crawled). The main container is the first
+<main>, else the first <article>, else <body>.
+
+Backends, fastest first; the first one installed is the default:
+    selectolax   pip install selectolax   (lexbor)
+    lxml         pip install lxml
+    html.parser  BeautifulSoup + the standard library parser
+
+Usage:
+    from extract import extract
+    page = extract(html, url, base_url)               # default backend
+    page = extract(html, url, base_url, "lxml")
+"""
+
+from urllib.parse import urljoin, urlparse
+
+HEADINGS = frozenset(("h1", "h2", "h3"))
+BLOCKS = frozenset(("p", "li", "td", "th", "dd", "dt", "blockquote", "pre", "figcaption",
+                    "div", "section", "article", "main", "body"))
+NOISE = frozenset(("nav", "header", "footer", "script", "style", "iframe", "noscript"))
+
+START, END, TEXT = 0, 1, 2
+MAIN, ARTICLE, BODY = 1, 2, 4     # content scopes a string can be in
+
+
+# ─────────────────────────────────────────────
+# Backends: parse tree → (event, tag or text, attrs)
+# ─────────────────────────────────────────────
+def _selectolax_events(html: str):
+    from selectolax.lexbor import LexborHTMLParser
+
+    root = LexborHTMLParser(html).root
+    if root is None:
+        return
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        tag = node.tag
+        if done:
+            yield END, tag, None
+        elif tag == "-text":
+            yield TEXT, node.text_content, None
+        elif not tag.startswith("-"):  # skip comments and the doctype
+            yield START, tag, {k: v or "" for k, v in node.attributes.items()}
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(list(node.iter(include_text=True))))
+
+
+def _lxml_events(html: str):
+    import lxml.html
+
+    stack = [(lxml.html.document_fromstring(html), False)]
+    while stack:
+        el, done = stack.pop()
+        if done:
+            yield END, el.tag, None
+        elif isinstance(el.tag, str):
+            yield START, el.tag, el.attrib
+            if el.text:
+                yield TEXT, el.text, None
+            stack.append((el, True))
+            stack.extend((child, False) for child in reversed(el))
+            continue
+        # Text after an element (or a comment) belongs to its parent
+        if el.tail:
+            yield TEXT, el.tail, None
+
+
+def _bs4_events(html: str):
+    from bs4 import BeautifulSoup, NavigableString, Tag
+
+    stack = [(child, False) for child in reversed(BeautifulSoup(html, "html.parser").contents)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            yield END, node.name, None
+        elif isinstance(node, Tag):
+            attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in node.attrs.items()}
+            yield START, node.name, attrs
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.contents))
+        elif type(node) is NavigableString:  # not comments, doctypes, CDATA
+            yield TEXT, str(node), None
+
+
+BACKENDS = {
+    "selectolax": (_selectolax_events, "selectolax.lexbor"),
+    "lxml": (_lxml_events, "lxml.html"),
+    "html.parser": (_bs4_events, "bs4"),
+}
+
+
+def available_backends() -> list:
+    import importlib
+
+    out = []
+    for name, (_, module) in BACKENDS.items():
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+        out.append(name)
+    return out
+
+
+_default = None
+
+
+def default_backend() -> str:
+    global _default
+    if _default is None:
+        found = available_backends()
+        if not found:
+            raise ImportError("no HTML parser installed: pip install selectolax (or lxml, beautifulsoup4)")
+        _default = found[0]
+    return _default
+
+
+# ─────────────────────────────────────────────
+# The single pass
+# ─────────────────────────────────────────────
+def _site_host(netloc: str) -> str:
+    netloc = netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def _join(parts) -> str:
+    return " ".join(s.strip() for s in parts if s.strip())
+
+
+def extract(html: str, url: str, base_url: str | None = None, backend: str | None = None) -> dict:
+    """Parse `html` once and return everything both scrapers read from a page."""
+    events = BACKENDS[backend or default_backend()][0]
+    host = _site_host(urlparse(base_url or url).netloc)
+    title, description = None, ""
+    headings, images, links, internal = [], [], [], set()
+    items = []        # (kind, text, scopes, block) in document order, for the main container
+    captures = []     # open elements whose text is being collected: [depth, tag, parts, extra]
+    saved = []        # state to restore when the current element ends
+    scopes = skip = block = blocks = seen = 0
+
+    for event, value, attrs in events(html):
+        if event == TEXT:
+            if skip:
+                continue
+            for cap in captures:
+                cap[2].append(value)
+            if scopes and value.strip():
+                in_heading = any(cap[1] in HEADINGS for cap in captures)
+                items.append(("string", value.strip(), scopes, None if in_heading else block))
+            continue
+
+        if event == END:
+            depth = len(saved)
+            while captures and captures[-1][0] == depth:
+                _, tag, parts, extra = captures.pop()
+                text = _join(parts)
+                if tag in HEADINGS:
+                    if text:
+                        headings.append(text)
+                    items.append(("heading", text, extra, None))
+                elif tag == "p":
+                    items.append(("p", text, extra, None))
+                elif tag == "a":
+                    links.append({"text": text, "href": extra})
+                else:  # title
+                    title = "".join(parts).strip()
+            scopes, skip, block = saved.pop()
+            continue
+
+        saved.append((scopes, skip, block))
+        depth = len(saved)
+        href = attrs.get("href") if value == "a" else None
+        full = urljoin(url, href) if href else None
+        if full and _site_host(urlparse(full).netloc) == host:
+            if urlparse(full).scheme in ("http", "https"):
+                internal.add(full.split("#")[0].rstrip("/"))
+        else:
+            full = None
+        if skip or value in NOISE:
+            skip += 1
+            continue
+
+        # The first main / article / body opens a scope; everything inside carries its bit
+        scope = {"main": MAIN, "article": ARTICLE, "body": BODY}.get(value, 0)
+        if scope and not seen & scope:
+            seen |= scope
+            scopes |= scope
+        if value in BLOCKS:
+            blocks += 1
+            block = blocks
+
+        if value in HEADINGS or value == "p":
+            captures.append([depth, value, [], scopes])
+        elif full:
+            captures.append([depth, "a", [], full.split("#")[0]])
+        elif value == "img" and attrs.get("src"):
+            images.append({"src": urljoin(url, attrs["src"]), "alt": (attrs.get("alt") or "").strip()})
+        elif value == "title" and title is None:
+            captures.append([depth, "title", [], None])
+        elif value == "meta" and attrs.get("name") == "description" and not description:
+            description = (attrs.get("content") or "").strip()
+
+    # Content comes from the most specific container the page has
+    level = MAIN if seen & MAIN else ARTICLE if seen & ARTICLE else BODY
+    text, paragraphs = [], []
+    sections = [{"heading": "", "paragraphs": []}]
+    block, parts = None, []
+
+    def close():
+        if parts:
+            sections[-1]["paragraphs"].append(" ".join(parts))
+            parts.clear()
+
+    for kind, value, item_scopes, item_block in items:
+        if not item_scopes & level:
+            continue
+        if kind == "heading":
+            close()
+            block = None
+            sections.append({"heading": value, "paragraphs": []})
+        elif kind == "p":
+            if value:
+                paragraphs.append(value)
+        else:
+            text.append(value)
+            if item_block is None:  # heading text
+                continue
+            if item_block != block:
+                close()
+                block = item_block
+            parts.append(value)
+    close()
+
+    return {
+        "url": url,
+        "title": title or "",
+        "description": description,
+        "headings": headings,
+        "paragraphs": paragraphs,
+        "images": images,
+        "links": links,
+        "text": "\n\n".join(text),
+        "sections": [s for s in sections if s["heading"] or s["paragraphs"]],
+        "internal_links": internal,
+    }
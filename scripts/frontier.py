@@ -0,0 +1,371 @@
+"""
+frontier.py — Crawl frontier: canonical URLs, seen-set, priorities, robots and sitemaps
+
+Everything crawler.py needs to decide what to fetch next, and whether to
+fetch it at all:
+
+    canonicalize   one spelling per page: lowercase scheme/host, www/non-www and
+                   http/https folded into the site's own, default ports, fragments,
+                   tracking params (utm_*, gclid, …) and trailing slashes dropped,
+                   remaining query params sorted
+    SeenSet        64-bit URL hashes; 8 bytes per URL when persisted
+    Frontier       priority queue ordered by (depth, newest sitemap lastmod, URL),
+                   with max-depth / max-pages limits, robots.txt rules, and
+                   aliases learned from redirects and <link rel=canonical>
+    discover       robots.txt + sitemap.xml (and sitemap indexes) → seed URLs
+
+The frontier file (e.g. pages.frontier.json) keeps the learned aliases
+between runs, so a URL known to redirect or to declare another canonical is
+never fetched again. When a crawl stops early (deadline, --max-pages) it
+also keeps the pending URLs and the seen-set, and `--resume` continues
+from there.
+
+Usage:
+    frontier = Frontier.load("pages.frontier.json", Site.from_url(BASE_URL), max_depth=3)
+    frontier.add(BASE_URL)
+    entry = await frontier.get()
+    ...
+    frontier.task_done(entry)
+    frontier.save(complete=True)
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import re
+import xml.etree.ElementTree as ET
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from html import unescape as html_unescape
+from pathlib import Path
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+TRACKING_PARAMS = {"gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+                   "_ga", "_gl", "_hsenc", "_hsmi", "ref", "ref_src"}
+TRACKING_PREFIXES = ("utm_",)
+PATH_SAFE = "/:@!$&'()*+,;=-._~"    # RFC 3986 pchar + "/": never percent-encoded
+DEFAULT_PORTS = {"http": 80, "https": 443}
+MAX_SITEMAPS = 50                    # sitemap files followed from one site (indexes included)
+FRONTIER_VERSION = 1
+
+CANONICAL_RE = re.compile(r"<link\b[^>]*\brel\s*=\s*[\"']?canonical\b[^>]*>", re.I)
+HREF_RE = re.compile(r"\bhref\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.I)
+
+
+# ─────────────────────────────────────────────
+# Canonical URLs
+# ─────────────────────────────────────────────
+@dataclass(frozen=True)
+class Site:
+    scheme: str
+    host: str          # as the site spells it, e.g. www.friendshipdaycare.com
+    port: int | None   # None = the scheme's default
+
+    @classmethod
+    def from_url(cls, url: str) -> "Site":
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port if parts.port != DEFAULT_PORTS.get(scheme) else None
+        return cls(scheme, (parts.hostname or "").lower(), port)
+
+    def matches(self, host: str, port: int | None) -> bool:
+        """Same site: www. prefix and http/https default ports don't matter."""
+        return _bare(host) == _bare(self.host) and port == self.port
+
+    @property
+    def origin(self) -> str:
+        return f"{self.scheme}://{self.host}" + (f":{self.port}" if self.port else "")
+
+
+def _bare(host: str) -> str:
+    return host[4:] if host.startswith("www.") else host
+
+
+def canonicalize(url: str, site: Site | None = None) -> str | None:
+    """The one spelling of `url` the crawler keys pages by; None for non-HTTP URLs."""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower().rstrip(".")
+        port = parts.port
+    except ValueError:  # malformed port or IPv6 literal
+        return None
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if port == DEFAULT_PORTS[scheme]:
+        port = None
+    if site and site.matches(host, port):
+        scheme, host, port = site.scheme, site.host, site.port
+    netloc = host + (f":{port}" if port else "")
+
+    path = re.sub(r"/{2,}", "/", quote(unquote(parts.path), safe=PATH_SAFE)).rstrip("/")
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def canonical_link(html: str, url: str) -> str | None:
+    """The href of the page's <link rel=canonical>, resolved against `url`."""
+    tag = CANONICAL_RE.search(html)
+    if not tag:
+        return None
+    href = HREF_RE.search(tag.group(0))
+    if not href:
+        return None
+    return urljoin(url, html_unescape(next(g for g in href.groups() if g is not None).strip()))
+
+
+def parse_lastmod(text: str | None) -> float | None:
+    """Sitemap <lastmod> / ISO timestamp → epoch seconds (dates are UTC midnight)."""
+    if not text:
+        return None
+    try:
+        when = datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+# ─────────────────────────────────────────────
+# Seen-set
+# ─────────────────────────────────────────────
+class SeenSet:
+    """URLs as 64-bit BLAKE2b hashes; collisions are negligible at site scale."""
+
+    def __init__(self, hashes=()):
+        self._hashes = set(hashes)
+
+    @staticmethod
+    def key(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def add(self, url: str) -> bool:
+        """Add `url`; False if it was already there."""
+        k = self.key(url)
+        if k in self._hashes:
+            return False
+        self._hashes.add(k)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return self.key(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def to_bytes(self) -> bytes:
+        return array("Q", sorted(self._hashes)).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SeenSet":
+        hashes = array("Q")
+        hashes.frombytes(data)
+        return cls(hashes)
+
+
+# ─────────────────────────────────────────────
+# Frontier
+# ─────────────────────────────────────────────
+@dataclass(order=True)
+class Entry:
+    depth: int
+    recency: float                   # -lastmod: newer pages first within a depth
+    url: str
+    lastmod: float | None = field(default=None, compare=False)
+
+
+class Frontier:
+    def __init__(self, site: Site, path=None, max_depth: int | None = None, max_pages: int | None = None,
+                 aliases: dict | None = None):
+        self.site = site
+        self.path = Path(path) if path else None
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.aliases = aliases or {}     # canonical URL → the URL it redirects / declares canonical
+        self.seen = SeenSet()
+        self.robots = None               # RobotFileParser once discover() has run
+        self.user_agent = "*"
+        self.taken = 0                   # entries handed to workers (the max-pages budget)
+        self.skipped = {"offsite": 0, "robots": 0, "depth": 0}
+        self.resumed = False
+        self._queue = asyncio.PriorityQueue()
+        self._active = {}                # url → entry handed out and not yet done
+        self._deferred = []              # entries left over once max-pages was reached
+
+    @classmethod
+    def load(cls, path, site: Site, resume: bool = False, **limits) -> "Frontier":
+        """Aliases always carry over; pending URLs and the seen-set only with `resume`."""
+        path = Path(path)
+        data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        if data.get("version") != FRONTIER_VERSION:
+            data = {}
+        frontier = cls(site, path, aliases=data.get("aliases"), **limits)
+        if resume and data.get("pending"):
+            frontier.seen = SeenSet.from_bytes(base64.b64decode(data["seen"]))
+            for depth, url, lastmod in data["pending"]:
+                frontier._queue.put_nowait(Entry(depth, -(lastmod or 0), url, lastmod))
+            frontier.resumed = True
+        return frontier
+
+    def canonical(self, url: str) -> str | None:
+        """Canonical form of an on-site URL, following learned aliases; None if off-site."""
+        url = canonicalize(url, self.site)
+        if url is None:
+            return None
+        parts = urlsplit(url)
+        if not self.site.matches(parts.hostname or "", parts.port):
+            return None
+        return self.aliases.get(url, url)
+
+    def add(self, url: str, depth: int = 0, lastmod: float | None = None) -> bool:
+        """Queue `url` unless it is off-site, disallowed, too deep or already seen."""
+        url = self.canonical(url)
+        if url is None:
+            self.skipped["offsite"] += 1
+            return False
+        if url in self.seen:
+            return False
+        if self.max_depth is not None and depth > self.max_depth:
+            self.skipped["depth"] += 1
+            return False
+        if self.robots and not self.robots.can_fetch(self.user_agent, url):
+            self.skipped["robots"] += 1
+            self.seen.add(url)
+            return False
+        self.seen.add(url)
+        self._queue.put_nowait(Entry(depth, -(lastmod or 0), url, lastmod))
+        return True
+
+    def alias(self, url: str, canonical: str) -> bool:
+        """
+        `url` turned out to be `canonical` (redirect or rel=canonical). Returns
+        True if `canonical` is new and the page should be kept under that URL,
+        False if it is a duplicate of a page already seen.
+        """
+        if canonical == url:
+            return True
+        self.aliases[url] = canonical
+        return self.seen.add(canonical)
+
+    async def get(self) -> Entry:
+        """Next entry by priority; blocks while the queue is empty."""
+        while True:
+            entry = await self._queue.get()
+            if self.max_pages is None or self.taken < self.max_pages:
+                self.taken += 1
+                self._active[entry.url] = entry
+                return entry
+            self._deferred.append(entry)     # over budget: kept for --resume
+            self._queue.task_done()
+
+    def task_done(self, entry: Entry) -> None:
+        self._active.pop(entry.url, None)
+        self._queue.task_done()
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def truncated(self) -> bool:
+        """max-pages stopped the crawl with URLs still to go."""
+        return bool(self._deferred)
+
+    def pending(self) -> list:
+        """Entries not crawled yet: queued, over budget, or in flight when the crawl stopped."""
+        while not self._queue.empty():
+            self._deferred.append(self._queue.get_nowait())
+        return sorted([*self._deferred, *self._active.values()])
+
+    def save(self, complete: bool) -> None:
+        """Aliases, plus the pending URLs and seen-set when the crawl stopped early."""
+        if self.path is None:
+            return
+        data = {"version": FRONTIER_VERSION, "aliases": dict(sorted(self.aliases.items()))}
+        pending = [] if complete else self.pending()
+        if pending:
+            data["pending"] = [[e.depth, e.url, e.lastmod] for e in pending]
+            data["seen"] = base64.b64encode(self.seen.to_bytes()).decode("ascii")
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data, indent=1, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+# ─────────────────────────────────────────────
+# robots.txt and sitemaps
+# ─────────────────────────────────────────────
+def parse_sitemap(data: bytes) -> tuple:
+    """(urls as [(loc, lastmod)], nested sitemap locs) from a urlset or sitemapindex."""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError:
+        return [], []
+    urls, sitemaps = [], []
+    for node in root:
+        loc = lastmod = None
+        for child in node:
+            name = child.tag.rsplit("}", 1)[-1]
+            if name == "loc":
+                loc = (child.text or "").strip()
+            elif name == "lastmod":
+                lastmod = parse_lastmod(child.text)
+        if not loc:
+            continue
+        if node.tag.rsplit("}", 1)[-1] == "sitemap":
+            sitemaps.append(loc)
+        else:
+            urls.append((loc, lastmod))
+    return urls, sitemaps
+
+
+async def discover(http, site: Site, user_agent: str, use_robots: bool = True, use_sitemaps: bool = True):
+    """
+    Fetch robots.txt and the sitemaps it lists (or /sitemap.xml). Returns
+    (robots parser or None, crawl delay or None, [(url, lastmod)]).
+    """
+    robots, delay, sitemap_urls = None, None, []
+    if use_robots or use_sitemaps:
+        try:
+            resp = await http.get(f"{site.origin}/robots.txt")
+            if resp.is_success:
+                robots = RobotFileParser()
+                robots.parse(resp.text.splitlines())
+                delay = robots.crawl_delay(user_agent)
+                sitemap_urls = robots.site_maps() or []
+        except Exception as e:
+            print(f"  ⚠ robots.txt: {e}")
+
+    found = []
+    if use_sitemaps:
+        queue, fetched = list(sitemap_urls) or [f"{site.origin}/sitemap.xml"], set()
+        while queue and len(fetched) < MAX_SITEMAPS:
+            url = queue.pop(0)
+            if url in fetched:
+                continue
+            fetched.add(url)
+            try:
+                resp = await http.get(url)
+                if not resp.is_success:
+                    continue
+                urls, nested = parse_sitemap(resp.content)
+            except Exception as e:
+                print(f"  ⚠ sitemap {url}: {e}")
+                continue
+            found.extend(urls)
+            queue.extend(nested)
+        if found:
+            print(f"  🗺  {len(found)} URLs from {len(fetched)} sitemap file(s)")
+
+    return (robots if use_robots else None), (delay if use_robots else None), found
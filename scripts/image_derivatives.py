@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Generate responsive image variants for public/images
+
+Every source image (downloaded from R2 or rendered by
+create_video_thumbnails.py) gets width variants in WebP and AVIF. Each
+source is decoded once and all of its variants are resized from that one
+decode; sources are spread over a process pool.
+
+Variant names carry the source's content hash (toys-640.3f2a9c1e.webp), so
+an unchanged source is skipped on the next run and a changed one gets fresh,
+cache-busting URLs. manifest.json tells the frontend what exists:
+
+    {
+      "toys.jpg": {
+        "width": 1600, "height": 1200, "hash": "3f2a9c1e…",
+        "blur": "data:image/webp;base64,…",        # tiny placeholder (next/image blurDataURL)
+        "variants": [{"src": "/images/responsive/toys-640.3f2a9c1e.webp",
+                      "width": 640, "height": 480, "format": "webp", "bytes": 31877}, …]
+      }
+    }
+
+Prerequisites:
+- Python 3 with Pillow (AVIF needs Pillow >= 11.3 built with libavif; otherwise
+  only WebP is written)
+
+Usage:
+    python3 scripts/image_derivatives.py
+    python3 scripts/image_derivatives.py --widths 480 960 1920 --formats webp --workers 8
+    python3 scripts/image_derivatives.py --force      # ignore the hash cache
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+SOURCE_FOLDER = Path("public/images")
+OUTPUT_FOLDER = Path("public/images/responsive")
+PUBLIC_FOLDER = Path("public")                 # URLs in the manifest are relative to this
+WIDTHS = [320, 640, 960, 1280, 1920]
+FORMATS = ["webp", "avif"]
+QUALITY = {"webp": 75, "avif": 50}
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+BLUR_WIDTH = 16                                # px; the placeholder is inlined as a data URI
+PIPELINE_VERSION = 1                           # bump when encoding changes; invalidates the cache
+VARIANT_RE = re.compile(r".+-\d+\.[0-9a-f]{8}\.(webp|avif)(\.tmp)?")  # <stem>-<width>.<hash8>.<fmt>
+
+
+def supported_formats(formats):
+    out = []
+    for fmt in formats:
+        if fmt == "avif" and not features.check("avif"):
+            print("⚠️  This Pillow build has no AVIF support; writing WebP only")
+            continue
+        out.append(fmt)
+    return out
+
+
+def content_hash(path, settings):
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def public_url(path):
+    """/images/… for files under public/, else the plain path"""
+    path = Path(path)
+    if path.is_relative_to(PUBLIC_FOLDER):
+        return "/" + path.relative_to(PUBLIC_FOLDER).as_posix()
+    return str(path)
+
+
+def variant_path(src):
+    if src.startswith("/"):
+        return PUBLIC_FOLDER / src.lstrip("/")
+    return Path(src)
+
+
+def list_sources(source_folder, output_folder):
+    """Source images, minus our own variants (and anything under a dedicated output folder)"""
+    output_folder = output_folder.resolve()
+    shared = output_folder == source_folder.resolve()
+    for path in sorted(source_folder.rglob("*")):
+        if path.suffix.lower() not in SOURCE_SUFFIXES or not path.is_file():
+            continue
+        parents = path.resolve().parents
+        if output_folder in parents and (not shared or VARIANT_RE.fullmatch(path.name)):
+            continue
+        yield path
+
+
+# ─────────────────────────────────────────────
+# One source → all its variants (runs in a worker process)
+# ─────────────────────────────────────────────
+def blur_placeholder(img):
+    small = img.copy()
+    small.thumbnail((BLUR_WIDTH, BLUR_WIDTH))
+    buf = io.BytesIO()
+    small.save(buf, "WEBP", quality=30)
+    return "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def derive(src, rel, digest, output_folder, widths, formats):
+    """Decode `src` once and write every width × format; returns its manifest entry"""
+    started = time.perf_counter()
+    with Image.open(src) as img:
+        width, height = img.size
+        # JPEG can decode straight at a reduced scale when every variant is smaller
+        if img.format == "JPEG":
+            img.draft("RGB", (max(widths), max(widths)))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    if (img.width > img.height) != (width > height):  # rotated by its EXIF orientation
+        width, height = height, width
+    img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info else "RGB")
+
+    # Never upscale; a source narrower than every width gets one variant at its own width
+    targets = sorted({w for w in widths if w < width} | {min(width, max(widths))}, reverse=True)
+    stem = rel.with_suffix("").as_posix().replace("/", "_")
+    variants = []
+    current = img
+    for w in targets:
+        h = max(1, round(img.height * w / img.width))
+        # Resize from the previous (larger) variant: cheaper, and still ≥ 1.5× the target
+        base = current if current.width >= w * 1.5 else img
+        current = base.resize((w, h), Image.LANCZOS, reducing_gap=3.0)
+        for fmt in formats:
+            out = output_folder / f"{stem}-{w}.{digest[:8]}.{fmt}"
+            tmp = out.with_name(out.name + ".tmp")
+            options = {"quality": QUALITY[fmt]}
+            if fmt == "webp":
+                options["method"] = 4
+            current.save(tmp, fmt.upper(), **options)
+            os.replace(tmp, out)
+            variants.append({"src": public_url(out), "width": w, "height": h, "format": fmt,
+                             "bytes": out.stat().st_size})
+
+    return {
+        "width": width,
+        "height": height,
+        "hash": digest,
+        "source_bytes": src.stat().st_size,
+        "blur": blur_placeholder(img),
+        "variants": sorted(variants, key=lambda v: (v["format"], v["width"])),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# ─────────────────────────────────────────────
+# Driver
+# ─────────────────────────────────────────────
+def run(source_folder=SOURCE_FOLDER, output_folder=OUTPUT_FOLDER, widths=WIDTHS, formats=FORMATS,
+        workers=None, force=False):
+    source_folder, output_folder = Path(source_folder), Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_folder / "manifest.json"
+    previous = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    old = {} if force else previous
+    formats = supported_formats(formats)
+    settings = {"v": PIPELINE_VERSION, "widths": sorted(widths), "formats": formats, "quality": QUALITY}
+
+    manifest, todo, cached = {}, [], 0
+    for src in list_sources(source_folder, output_folder):
+        rel = src.relative_to(source_folder)
+        digest = content_hash(src, settings)
+        entry = old.get(rel.as_posix())
+        if entry and entry["hash"] == digest and all(
+                variant_path(v["src"]).exists() for v in entry["variants"]):
+            manifest[rel.as_posix()] = entry
+            cached += 1
+        else:
+            todo.append((src, rel, digest))
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(derive, src, rel, digest, output_folder, widths, formats): rel
+                   for src, rel, digest in todo}
+        for future in as_completed(futures):
+            rel = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ Error processing {rel}: {e}")
+                # Keep serving the last good variants; the stale hash retries it next run
+                if rel.as_posix() in previous:
+                    manifest[rel.as_posix()] = previous[rel.as_posix()]
+                continue
+            manifest[rel.as_posix()] = entry
+            print(f"✅ {rel}: {len(entry['variants'])} variants in {entry['seconds']:.2f}s")
+
+    # Drop variants no source points at any more (changed or deleted sources);
+    # only files named like our own output, so a shared --out keeps everything else
+    live = {Path(v["src"]).name for e in manifest.values() for v in e["variants"]}
+    removed = 0
+    for path in output_folder.iterdir():
+        if path.is_file() and VARIANT_RE.fullmatch(path.name) and path.name not in live:
+            path.unlink()
+            removed += 1
+
+    tmp = manifest_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(dict(sorted(manifest.items())), indent=2), encoding="utf-8")
+    tmp.replace(manifest_path)
+    return {"processed": len(todo) - failed, "cached": cached, "failed": failed, "removed": removed,
+            "manifest": manifest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate responsive WebP/AVIF variants of public/images")
+    parser.add_argument("--src", type=Path, default=SOURCE_FOLDER, help="source image folder")
+    parser.add_argument("--out", type=Path, default=OUTPUT_FOLDER, help="variant folder (inside public/)")
+    parser.add_argument("--widths", type=int, nargs="+", default=WIDTHS)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="regenerate even if sources are unchanged")
+    args = parser.parse_args()
+
+    print("🖼  Generating responsive image variants...")
+    started = time.monotonic()
+    stats = run(args.src, args.out, args.widths, args.formats, args.workers, args.force)
+    manifest = stats["manifest"]
+
+    source_bytes = sum(e["source_bytes"] for e in manifest.values())
+    variant_bytes = {}
+    for e in manifest.values():
+        for v in e["variants"]:
+            variant_bytes[v["format"]] = variant_bytes.get(v["format"], 0) + v["bytes"]
+    print("\n" + "="*50)
+    print("📊 Derivative Summary:")
+    print(f"✅ Processed: {stats['processed']}  ⏭  Cached: {stats['cached']}  ❌ Failed: {stats['failed']}"
+          f"  🗑  Stale variants removed: {stats['removed']}")
+    print(f"📦 Sources: {source_bytes / 2**20:.1f} MB; variants: "
+          + ", ".join(f"{fmt} {b / 2**20:.1f} MB" for fmt, b in sorted(variant_bytes.items())))
+    print(f"⏱  {time.monotonic() - started:.1f}s → {args.out / 'manifest.json'}")
+
+
+if __name__ == "__main__":
+    main()
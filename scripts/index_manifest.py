@@ -0,0 +1,81 @@
+"""
+index_manifest.py — Record of what `rag_pipeline.py build` has indexed
+
+Chunk IDs are content hashes (URL + chunk text), so an unchanged chunk keeps
+its ID across builds and can be skipped, while edited text gets a new ID.
+The manifest maps every indexed page to its text hash and chunk IDs:
+
+    {
+      "model": "text-embedding-3-small",
+      "collection": "friendshipdaycare",
+      "chunking": "sections-v1:300",
+      "built_at": "2026-01-01T00:00:00+00:00",
+      "pages": {
+        "https://…/programs": {"sha256": "…", "chunks": ["3f2a…", "…"]}
+      }
+    }
+
+Comparing page hashes against pages.jsonl tells `build` exactly which pages
+were added, changed or removed, even if several scrapes ran in between.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def chunk_id(url: str, text: str) -> str:
+    return hashlib.sha256(f"{url}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def page_digest(page: dict) -> str:
+    return hashlib.sha256(f"{page.get('title', '')}\n{page['text']}".encode("utf-8")).hexdigest()
+
+
+class IndexManifest:
+    def __init__(self, path: Path, model: str, collection: str, pages: dict | None = None,
+                 loaded: bool = False, chunking: str = ""):
+        self.path = Path(path)
+        self.model = model
+        self.collection = collection
+        self.chunking = chunking
+        self.pages = pages or {}
+        self.loaded = loaded  # False: no usable manifest, the collection can't be trusted
+
+    @classmethod
+    def load(cls, path: Path, model: str, collection: str, chunking: str = "") -> "IndexManifest":
+        """Load the manifest; an empty one is returned if it is missing or was built differently."""
+        path = Path(path)
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if (data.get("model"), data.get("collection"), data.get("chunking", "")) == (model, collection, chunking):
+                return cls(path, model, collection, data.get("pages", {}), loaded=True, chunking=chunking)
+        return cls(path, model, collection, chunking=chunking)
+
+    def is_current(self, url: str, digest: str) -> bool:
+        return self.pages.get(url, {}).get("sha256") == digest
+
+    def chunks(self, url: str) -> list:
+        return self.pages.get(url, {}).get("chunks", [])
+
+    def urls(self) -> set:
+        return set(self.pages)
+
+    def set(self, url: str, digest: str, chunk_ids: list) -> None:
+        self.pages[url] = {"sha256": digest, "chunks": chunk_ids}
+
+    def remove(self, url: str) -> list:
+        return self.pages.pop(url, {}).get("chunks", [])
+
+    def save(self) -> None:
+        data = {
+            "model": self.model,
+            "collection": self.collection,
+            "chunking": self.chunking,
+            "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pages": self.pages,
+        }
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
@@ -0,0 +1,258 @@
+"""
+metrics.py — Prometheus-style metrics and per-request traces for rag_pipeline.py serve
+
+No client library: counters, gauges and histograms render themselves in
+the Prometheus text exposition format, which is all a scraper needs.
+
+    Registry     holds the metrics; render() is the /metrics body. Forked
+                 workers each dump(<dir>/<pid>.json) their values now and
+                 then, and render(merge=<dir>) adds every other worker's
+                 dump to this one's, so any worker answers for the server
+    Counter      monotonically increasing, per label set
+    Gauge        a value that goes up and down (in-flight requests)
+    Histogram    cumulative buckets + sum + count, per label set
+    Trace        timing spans and fields of one request, for the structured log line
+
+Usage:
+    registry = Registry()
+    stage = registry.histogram("rag_stage_seconds", "Time per stage", ["stage"])
+
+    trace = Trace("/chat")
+    with trace.span("embed"):
+        ...
+    stage.observe(trace.spans["embed"], stage="embed")
+    log.info(json.dumps(trace.as_dict()))
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (0, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra="") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(labels[n] for n in self.label_names)
+
+    def state(self) -> list:
+        """[[label values, value], …], JSON-ready"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, others=()) -> list:
+        """Sample lines for this process's values plus each `state()` in `others`."""
+        with self._lock:
+            values = dict(self._values)
+        for state in others:
+            for key, value in state:
+                key = tuple(key)
+                values[key] = self._add(values[key], value) if key in values else value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(values.items()):
+            lines.extend(self._samples(key, value))
+        return lines
+
+    @staticmethod
+    def _add(a, b):
+        return a + b
+
+    def _samples(self, key, value) -> list:
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def state(self) -> list:
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    @staticmethod
+    def _add(a, b):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1]
+
+    def _samples(self, key, value) -> list:
+        counts, total = value
+        lines, running = [], 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {running}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def dump(self, path) -> None:
+        """Write this process's values to `path`, for render(merge=…) in a sibling process."""
+        path = Path(path)
+        data = {"pid": os.getpid(), "metrics": {name: m.state() for name, m in self._metrics.items()}}
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(path)
+
+    def render(self, merge=None) -> str:
+        """
+        The text exposition of every metric. With `merge`, a directory of
+        dump()s, every other process's values are added to this one's. A
+        process that has exited still counts (its counters and histograms
+        would otherwise go backwards), except for its gauges.
+        """
+        others = []
+        if merge is not None:
+            for path in sorted(Path(merge).glob("*.json")):
+                try:
+                    data = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    continue
+                if data["pid"] != os.getpid():
+                    others.append((data["metrics"], _alive(data["pid"])))
+        lines = []
+        for name, metric in self._metrics.items():
+            states = [m.get(name, []) for m, alive in others if alive or not isinstance(metric, Gauge)]
+            lines.extend(metric.render(states))
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# ─────────────────────────────────────────────
+# Per-request trace
+# ─────────────────────────────────────────────
+class Trace:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.spans = {}    # stage → seconds
+        self.fields = {}   # anything else worth logging (tokens, cache hits, scores)
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = time.perf_counter() - started
+
+    def set(self, **fields) -> None:
+        self.fields.update(fields)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            "ts": round(time.time(), 3),
+            "endpoint": self.endpoint,
+            "seconds": round(self.elapsed, 4),
+            "spans": {name: round(s, 4) for name, s in self.spans.items()},
+            **self.fields,
+        }
@@ -0,0 +1,87 @@
+"""
+micro_batch.py — Coalesce concurrent calls into batched ones
+
+Requests that arrive within `window` seconds of each other (up to
+`max_batch` of them) are handed to one call of `fn(items)`, which returns
+one result per item; each caller gets its own result back. A batch is sent
+as soon as it is full, and the next one starts collecting while the
+previous one is still in flight.
+
+At low load a request waits at most `window` (a few ms); at peak load one
+embedding request and one matrix product replace dozens.
+
+Usage:
+    async def embed_many(questions):
+        resp = await client.embeddings.create(model=MODEL, input=questions)
+        return [d.embedding for d in resp.data]
+
+    embed = MicroBatcher(embed_many, max_batch=32, window=0.005)
+    vec = await embed.submit(question)
+"""
+
+import asyncio
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch: int = 32, window: float = 0.005):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self.batches = 0
+        self.items = 0
+        self._queue = None      # created in the running loop on first submit
+        self._full = None
+        self._task = None
+        self._inflight = set()
+
+    async def submit(self, item):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        if self._queue.qsize() >= self.max_batch - 1:
+            self._full.set()
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.window and self._queue.qsize() < self.max_batch - 1:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            task = asyncio.create_task(self._flush(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, batch):
+        batch = [(item, f) for item, f in batch if not f.cancelled()]  # caller went away
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @property
+    def mean_batch(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._inflight, return_exceptions=True)
@@ -0,0 +1,134 @@
+"""
+page_store.py — Streaming JSONL storage for scraped pages
+
+One page record per line. The scrapers append every page as soon as it is
+extracted and fsync it, so a crash mid-crawl keeps what was written so far
+(in `<file>.partial`); readers iterate lazily, one page in memory at a time.
+
+    PageWriter    append + fsync into <file>.partial, renamed over <file> on close
+    PageReader    lazy iteration, plus lookup by URL through a byte-offset index
+    export_json   the one-document JSON shape older consumers read, streamed compactly
+
+Usage:
+    with PageWriter("pages.jsonl") as out:
+        out.write({"url": ..., "title": ..., "text": ...})
+
+    for page in PageReader("pages.jsonl"):
+        ...
+
+    python page_store.py pages.jsonl pages.json                          # [page, ...]
+    python page_store.py site_content.jsonl site_content.json --site URL  # {"site", "total_pages", "pages"}
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+
+class PageWriter:
+    def __init__(self, path, fsync: bool = True):
+        self.path = Path(path)
+        self.partial = self.path.with_name(self.path.name + ".partial")
+        self.fsync = fsync
+        self.count = 0
+        self._file = open(self.partial, "w", encoding="utf-8")
+
+    def write(self, page: dict) -> None:
+        self.write_line(json.dumps(page, ensure_ascii=False))
+
+    def write_line(self, line: str) -> None:
+        """Append an already-serialized record (e.g. carried over from the last run)."""
+        self._file.write(line.rstrip("\n") + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.count += 1
+
+    def close(self) -> None:
+        """Finish the file: the partial output replaces `path`."""
+        self._file.close()
+        self.partial.replace(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:  # keep <file>.partial as it is and leave the last complete file alone
+            self._file.close()
+
+
+class PageReader:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._offsets = None
+
+    def __iter__(self):
+        for line in self.lines():
+            yield json.loads(line)
+
+    def lines(self):
+        """Raw JSON lines; a torn last line (crash during a write) is skipped."""
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n") and line.strip():
+                    yield line
+
+    def offsets(self) -> dict:
+        """URL → byte offset of its line, built on first use."""
+        if self._offsets is None:
+            self._offsets = {}
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if line.endswith(b"\n") and line.strip():
+                        self._offsets[json.loads(line)["url"]] = offset
+                    offset += len(line)
+        return self._offsets
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.offsets()
+
+    def urls(self) -> set:
+        return set(self.offsets())
+
+    def line(self, url: str) -> str:
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets()[url])
+            return f.readline().decode("utf-8")
+
+    def get(self, url: str) -> dict:
+        return json.loads(self.line(url))
+
+
+def export_json(src, dest, envelope: dict | None = None) -> int:
+    """
+    Stream a JSONL page file into one JSON document: a bare list of pages, or
+    `envelope` with the list added under "pages". Returns the page count.
+    """
+    dest = Path(dest)
+    tmp = dest.with_name(dest.name + ".tmp")
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as out:
+        out.write(json.dumps(envelope, ensure_ascii=False)[:-1] + ', "pages": [\n' if envelope else "[\n")
+        for line in PageReader(src).lines():
+            out.write((",\n" if count else "") + line.rstrip("\n"))
+            count += 1
+        out.write("\n]}\n" if envelope else "\n]\n")
+    tmp.replace(dest)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a JSONL page file as one JSON document")
+    parser.add_argument("src", type=Path)
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("--site", help='wrap as {"site", "total_pages", "pages"} (scrape_to_json shape)')
+    args = parser.parse_args()
+    envelope = None
+    if args.site:
+        envelope = {"site": args.site, "total_pages": sum(1 for _ in PageReader(args.src).lines())}
+    count = export_json(args.src, args.dest, envelope)
+    print(f"✅ {count} pages → {args.dest}")
@@ -0,0 +1,89 @@
+"""
+prefork.py — Run one ASGI app in N forked worker processes on a shared socket
+
+The parent imports everything, maps the index and builds the app once, then
+binds the listening socket and forks. Workers inherit the imported modules
+and the mapped pages copy-on-write instead of loading their own, and the
+kernel spreads incoming connections across them.
+
+The parent only supervises: a worker that dies is restarted, and SIGINT or
+SIGTERM is passed on to every worker, each of which shuts down gracefully.
+Workers run in their own process group, so a Ctrl-C in the terminal reaches
+them once, through the parent.
+
+Usage:
+    serve_forked(app, "0.0.0.0", 8000, workers=4)
+"""
+
+import os
+import signal
+import socket
+import sys
+import time
+
+RESTART_DELAY = 1.0     # seconds before replacing a worker that died
+BACKLOG = 2048
+
+
+def bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_forked(app, host: str, port: int, workers: int) -> None:
+    import uvicorn
+
+    sock = bind(host, port)
+    children = {}   # pid → worker number
+    stopping = False
+
+    def spawn(n: int) -> None:
+        sys.stdout.flush()  # or the child re-prints whatever is still buffered
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.setpgid(0, 0)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+                code = 0
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = n
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for n in range(workers):
+        spawn(n)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"🚀 Serving at http://localhost:{port} with {workers} workers (pids {', '.join(map(str, children))})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        n = children.pop(pid, None)
+        if n is None or stopping:
+            continue
+        print(f"⚠️  Worker {n} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        time.sleep(RESTART_DELAY)
+        if not stopping:
+            spawn(n)
+    sock.close()
@@ -3,187 +3,803 @@ rag_pipeline.py — Scrape → Chunk → Embed → RAG → Serve
 All-in-one for friendshipdaycare.com
 
 Install:
-    pip install playwright beautifulsoup4 openai chromadb fastapi uvicorn
+    pip install playwright httpx selectolax openai chromadb fastapi uvicorn
     playwright install chromium
 
 Steps:
     python rag_pipeline.py scrape     # crawl site → save pages
-    python rag_pipeline.py build      # chunk + embed → Chroma DB
-    python rag_pipeline.py serve      # run FastAPI chat endpoint
+                                      #   (--workers N, --per-host-rate R, --deadline S, --base-url URL,
+                                      #    --full to ignore pages.state.json and re-fetch everything,
+                                      #    --parser selectolax|lxml|html.parser, --parse-workers N,
+                                      #    --max-depth D, --max-pages N then --resume)
+    python rag_pipeline.py build      # chunk + dedup + embed → Chroma DB (incremental; --full to rebuild)
+    python rag_pipeline.py serve      # run FastAPI chat endpoint (/chat, /chat/stream SSE, /metrics)
+                                      #   (--retriever numpy --workers N: pre-forked workers sharing
+                                      #    one memory-mapped index, hot-swapped after each build)
+    python rag_pipeline.py export     # pages.jsonl → pages.json (one JSON list, for older tools)
 """
 
+import argparse
 import asyncio
+import dataclasses
 import json
-import sys
 from pathlib import Path
-from urllib.parse import urljoin, urlparse
+
+from chunker import CHUNK_TOKENS
 
 BASE_URL = "https://www.friendshipdaycare.com"
-PAGES_FILE = Path("pages.json")
+PAGES_FILE = Path("pages.jsonl")         # one page per line (page_store.py)
+JSON_EXPORT_FILE = Path("pages.json")    # `export`: the same pages as one JSON list
+STATE_FILE = Path("pages.state.json")    # per-URL ETag / Last-Modified / SHA-256
+FRONTIER_FILE = Path("pages.frontier.json")  # URL aliases; pending URLs after an early stop
+DIFF_FILE = Path("pages.diff.json")      # added / changed / removed from the last scrape
 CHROMA_DIR = "./chroma_db"
 COLLECTION = "friendshipdaycare"
+MANIFEST_FILE = Path("index_manifest.json")  # page hash → chunk IDs currently indexed
+VECTOR_INDEX_DIR = Path("vector_index")      # memory-mapped export for the numpy retriever
+EMBED_MODEL = "text-embedding-3-small"
+CHUNKER = "sections-v1"                      # bump when chunking changes; forces a full build
+EMBED_CACHE_DIR = "./embedding_cache"        # sha256(model + text) → float32 vector
+EMBED_CACHE_MAX = 200_000
+ANSWER_CACHE_THRESHOLD = 0.95                # cosine similarity to reuse an answer
+ANSWER_CACHE_TTL = 3600                      # seconds
+ANSWER_CACHE_MAX = 512
+CHAT_MODEL = "gpt-4o-mini"
+HTTP_MAX_CONNECTIONS = 100                   # pooled connections to the OpenAI API
+HTTP_MAX_KEEPALIVE = 20
+TOP_K = 4                                    # passages in the prompt (merged neighbours count once)
+HYBRID_CANDIDATES = 20                       # per-retriever list length fed into rank fusion
+CONTEXT_CANDIDATES = 12                      # fused hits reranked and packed into the context
+CONTEXT_TOKENS = 1200                        # token budget for the packed context
+BATCH_WINDOW = 0.005                         # seconds to gather concurrent questions into one batch
+BATCH_MAX = 32                               # questions per batched embedding call / top-k query
+SNAPSHOT_POLL = 2.0                          # seconds between checks for a rebuilt vector_index/
+METRICS_DUMP = 1.0                           # seconds between a forked worker's metrics dumps
 
 
 # ─────────────────────────────────────────────
 # STEP 1: SCRAPE
 # ─────────────────────────────────────────────
-async def scrape():
-    from playwright.async_api import async_playwright
-    from bs4 import BeautifulSoup
-
-    visited, to_visit, pages = set(), {BASE_URL}, []
-
-    def clean(html, url):
-        soup = BeautifulSoup(html, "html.parser")
-        for t in soup.select("nav,header,footer,script,style,iframe"):
-            t.decompose()
-        title = soup.title.string.strip() if soup.title else url
-        main = soup.find("main") or soup.find("article") or soup.find("body")
-        text = "\n\n".join(s.strip() for s in main.stripped_strings if s.strip()) if main else ""
-        return {"url": url, "title": title, "text": text}
-
-    def links(html, cur):
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(html, "html.parser")
-        out = set()
-        for a in soup.find_all("a", href=True):
-            full = urljoin(cur, a["href"])
-            p = urlparse(full)
-            if p.netloc == urlparse(BASE_URL).netloc and p.scheme in ("http","https"):
-                out.add(full.split("#")[0].rstrip("/"))
-        return out
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        await page.route("**/*.{png,jpg,jpeg,gif,svg,woff,woff2}", lambda r: r.abort())
-
-        while to_visit:
-            url = to_visit.pop()
-            if url in visited: continue
-            visited.add(url)
-            print(f"  → {url}")
-            try:
-                await page.goto(url, wait_until="domcontentloaded", timeout=15000)
-                html = await page.content()
-                data = clean(html, url)
-                if data["text"]:
-                    pages.append(data)
-                to_visit.update(links(html, url) - visited)
-            except Exception as e:
-                print(f"    ⚠ {e}")
-
-        await browser.close()
-
-    PAGES_FILE.write_text(json.dumps(pages, indent=2, ensure_ascii=False))
-    print(f"\n✅ Scraped {len(pages)} pages → {PAGES_FILE}")
+async def scrape(base_url=BASE_URL, config=None, parser=None):
+    from functools import partial
+    from crawl_state import CrawlState
+    from crawler import CrawlConfig, crawl
+    from extract import extract
+    from page_store import PageReader, PageWriter
+
+    config = config or CrawlConfig()
+
+    # Unchanged pages reuse their record from the last run
+    state = CrawlState.load(STATE_FILE)
+    previous = PageReader(PAGES_FILE) if PAGES_FILE.exists() else None
+    if previous is None:
+        config = dataclasses.replace(config, incremental=False)
+
+    # Each page is on disk the moment it is extracted; a crash leaves pages.jsonl.partial
+    with PageWriter(PAGES_FILE) as pages:
+        def handle(url, data):
+            if data["text"]:
+                pages.write({"url": url, "title": data["title"] or url,
+                             "text": data["text"], "sections": data["sections"]})
+            return data["internal_links"]
+
+        def unchanged(url):
+            if previous and url in previous:
+                pages.write_line(previous.line(url))
+
+        stats = await crawl([base_url.rstrip("/")], handle, config, state=state, on_unchanged=unchanged,
+                            parse=partial(extract, base_url=base_url, backend=parser),
+                            frontier_path=FRONTIER_FILE)
+        if not stats.complete and previous:
+            for u in sorted(previous.urls() - state.visited):
+                pages.write_line(previous.line(u))
+
+    diff = state.finish(complete=stats.complete)
+    state.save()
+    DIFF_FILE.write_text(json.dumps(diff, indent=2, ensure_ascii=False))
+
+    print(f"\n✅ Scraped {pages.count} pages → {PAGES_FILE}")
+    print(f"   {len(diff['added'])} added, {len(diff['changed'])} changed, "
+          f"{len(diff['removed'])} removed, {diff['unchanged']} unchanged → {DIFF_FILE}")
 
 
 # ─────────────────────────────────────────────
 # STEP 2: CHUNK + EMBED → CHROMA
 # ─────────────────────────────────────────────
-def build():
+def plan_chunks(pages, count_tokens, chunk_tokens=CHUNK_TOKENS, dedup=True):
+    """
+    Chunk (url, page) pairs, in a stable order, without embedding anything.
+    Returns (plan, sources, owner, titles): url → (page digest, chunk IDs);
+    chunk ID → every page it stands for; chunk ID → the page whose text is
+    embedded for it; url → title. With `dedup`, a chunk that repeats a kept
+    one (dedup.py) is listed under the kept chunk's ID.
+    """
+    from chunker import iter_chunks
+    from dedup import Deduplicator
+    from index_manifest import chunk_id, page_digest
+
+    deduper = Deduplicator() if dedup else None
+    plan, sources, owner, titles = {}, {}, {}, {}
+    for url, page in pages:
+        titles[url] = page["title"]
+        if deduper:
+            deduper.page(url, page["text"])  # counted; its chunks still decide what is kept
+        ids, own = [], set()
+        for text in iter_chunks(page, count_tokens, chunk_tokens):
+            cid = chunk_id(url, text)
+            if cid in own:
+                continue
+            own.add(cid)
+            kept = deduper.chunk(cid, text) if deduper else None
+            if kept is None:
+                owner[cid] = url
+            ids.append(kept or cid)
+        ids = list(dict.fromkeys(ids))
+        plan[url] = (page_digest(page), ids)
+        for cid in ids:
+            sources.setdefault(cid, []).append(url)
+    if deduper:
+        print(f"  🧬 Dedup: {deduper.summary()}")
+    return plan, sources, owner, titles
+
+
+def build(full=False, embed_workers=4, batch_tokens=None, chunk_tokens=CHUNK_TOKENS, dedup=True):
+    """
+    Incremental by default: only chunks the collection doesn't have yet are
+    embedded and upserted, and chunks no page produces any more are deleted
+    (whether the manifest recorded them or an interrupted build left them).
+    `full=True` drops the collection and re-indexes everything.
+
+    Pages are split along their headings and paragraphs into chunks of up
+    to `chunk_tokens` tokens. With `dedup`, near-duplicate chunks are
+    collapsed first (dedup.py): one copy is embedded, and its `sources`
+    metadata lists every page it stands for. A near-duplicate page only
+    shares the chunks it really repeats; the ones that differ are kept. Pages are planned in URL
+    order, so the same copy is kept on every build. Each chunk's `position`
+    metadata is its number within its page, which serve uses to merge
+    neighbouring chunks into one passage.
+
+    Planning keeps only chunk IDs and fingerprints; the texts to embed are
+    re-chunked page by page and streamed into the embedder. Embeddings run
+    in token-sized batches on `embed_workers` threads; each batch is
+    upserted as soon as it returns, so an interrupted build picks up where
+    it stopped.
+    """
     import chromadb
     from openai import OpenAI
+    from chunker import iter_chunks
+    from embedder import MAX_TOKENS_PER_REQUEST, Embedder, token_counter
+    from embedding_cache import EmbeddingCache
+    from index_manifest import IndexManifest, chunk_id
+    from page_store import PageReader
+    from retrievers import export_numpy_index
 
     client = OpenAI()
     chroma = chromadb.PersistentClient(path=CHROMA_DIR)
-    col = chroma.get_or_create_collection(COLLECTION)
-
-    pages = json.loads(PAGES_FILE.read_text())
 
-    def chunk(text, size=400, overlap=50):
-        words = text.split()
-        chunks = []
-        i = 0
-        while i < len(words):
-            chunks.append(" ".join(words[i:i+size]))
-            i += size - overlap
-        return chunks
-
-    docs, metas, ids = [], [], []
-    for page in pages:
-        for i, chunk_text in enumerate(chunk(page["text"])):
-            docs.append(chunk_text)
-            metas.append({"url": page["url"], "title": page["title"]})
-            ids.append(f"{page['url']}__chunk{i}")
+    manifest = IndexManifest.load(MANIFEST_FILE, EMBED_MODEL, COLLECTION, chunking=f"{CHUNKER}:{chunk_tokens}")
+    if full or not manifest.loaded:
+        # Also clears collections built before the manifest existed (positional IDs)
+        # and ones chunked with different settings
+        if COLLECTION in [c if isinstance(c, str) else c.name for c in chroma.list_collections()]:
+            chroma.delete_collection(COLLECTION)
+        manifest = IndexManifest(MANIFEST_FILE, EMBED_MODEL, COLLECTION, chunking=f"{CHUNKER}:{chunk_tokens}")
+        manifest.save()  # from here on an interrupted build resumes instead of starting over
+    col = chroma.get_or_create_collection(COLLECTION)
 
-    print(f"  Embedding {len(docs)} chunks...")
-    resp = client.embeddings.create(model="text-embedding-3-small", input=docs)
-    embeddings = [r.embedding for r in resp.data]
+    pages = PageReader(PAGES_FILE)  # read one page at a time
+    count_tokens = token_counter(EMBED_MODEL)
+    counts = {"unchanged": 0, "deleted": 0, "resumed": 0, "relinked": 0}
+    indexed = {}                    # chunk ID → pages it stood for in the last build
+    for url in manifest.urls():
+        for cid in manifest.chunks(url):
+            indexed.setdefault(cid, set()).add(url)
+
+    print(f"  Planning chunks{' and near-duplicates' if dedup else ''}...")
+    plan, sources, owner, titles = plan_chunks(((url, pages.get(url)) for url in sorted(pages.urls())),
+                                               count_tokens, chunk_tokens, dedup)
+    counts["unchanged"] = sum(manifest.is_current(url, digest) for url, (digest, _) in plan.items())
+    # Counted over the page's own chunks: one folded in from another page is not a gap between neighbours
+    positions = {cid: i for url, (_, ids) in plan.items()
+                 for i, cid in enumerate(c for c in ids if owner.get(c) == url)}
+
+    def metadata(cid):
+        url = owner[cid]
+        return {"url": url, "title": titles[url], "sources": "\n".join(sources[cid]), "position": positions[cid]}
+
+    resumed = set()  # upserted by an interrupted build, with the metadata it planned
+
+    def pending():
+        """Chunks the collection doesn't have yet, re-chunked one page at a time."""
+        fresh = {}
+        for cid, url in owner.items():
+            if cid not in indexed:
+                fresh.setdefault(url, set()).add(cid)
+        for url in sorted(fresh):
+            wanted = fresh[url]
+            batch = []
+            for text in iter_chunks(pages.get(url), count_tokens, chunk_tokens):
+                cid = chunk_id(url, text)
+                if cid in wanted:
+                    wanted.discard(cid)
+                    batch.append((cid, text, metadata(cid)))
+            # Chunks upserted by an interrupted build are already in the collection
+            done = set(col.get(ids=[c[0] for c in batch], include=[])["ids"]) if batch else set()
+            counts["resumed"] += len(done)
+            resumed.update(done)
+            yield from (c for c in batch if c[0] not in done)
+
+    def store(batch, vectors):
+        col.upsert(
+            ids=[cid for cid, _, _ in batch],
+            documents=[text for _, text, _ in batch],
+            metadatas=[meta for _, _, meta in batch],
+            embeddings=vectors,
+        )
 
-    col.add(documents=docs, embeddings=embeddings, metadatas=metas, ids=ids)
-    print(f"✅ Built Chroma DB → {CHROMA_DIR}  ({len(docs)} chunks)")
+    print(f"  Chunking + embedding new/changed pages with {embed_workers} workers...")
+    cache = EmbeddingCache(EMBED_CACHE_DIR, EMBED_MODEL, max_entries=EMBED_CACHE_MAX)
+    embedder = Embedder(client, EMBED_MODEL, workers=embed_workers,
+                        max_batch_tokens=batch_tokens or MAX_TOKENS_PER_REQUEST, cache=cache)
+    stats = embedder.run(pending(), store)
+    cache.close()
+    embedded = stats.inputs + stats.cached
+    print(f"  {stats.batches} batches, ~{stats.tokens} tokens, {stats.retries} retries, "
+          f"{stats.cached} from cache ({cache.hit_rate:.0%} hit rate) in {stats.elapsed:.1f}s")
+    if counts["resumed"]:
+        print(f"  Resumed: {counts['resumed']} chunks were already embedded")
+
+    # Kept chunks whose metadata changed (source pages, position on the page) only need an update;
+    # this also fills in `position` on collections built before it was stored
+    kept, relinked = [cid for cid in owner if cid in indexed or cid in resumed], []
+    for i in range(0, len(kept), 1000):
+        stored = col.get(ids=kept[i:i + 1000], include=["metadatas"])
+        relinked += [cid for cid, meta in zip(stored["ids"], stored["metadatas"]) if meta != metadata(cid)]
+    for i in range(0, len(relinked), 1000):
+        ids = relinked[i:i + 1000]
+        col.update(ids=ids, metadatas=[metadata(cid) for cid in ids])
+    counts["relinked"] = len(relinked)
+
+    # Diffed against the collection itself, not just the manifest: an interrupted build may have
+    # upserted chunks of a page that changed again before this one, which no manifest ever recorded
+    in_collection, offset = set(), 0
+    while True:
+        got = col.get(include=[], limit=10000, offset=offset)["ids"]
+        in_collection.update(got)
+        offset += len(got)
+        if len(got) < 10000:
+            break
+    stale = [cid for cid in in_collection if cid not in sources]
+    for i in range(0, len(stale), 1000):
+        col.delete(ids=stale[i:i + 1000])
+    counts["deleted"] = len(stale)
+
+    for url in manifest.urls() - plan.keys():
+        manifest.remove(url)
+    for url, (digest, ids) in plan.items():
+        manifest.set(url, digest, ids)
+    manifest.save()
+    exported = export_numpy_index(col, VECTOR_INDEX_DIR)
+    print(f"  Exported {exported} chunks → {VECTOR_INDEX_DIR}/ (numpy retriever)")
+    print(f"✅ Built Chroma DB → {CHROMA_DIR}  (+{embedded} embedded, -{counts['deleted']} deleted, "
+          f"{counts['relinked']} relinked, {counts['unchanged']} pages unchanged, {col.count()} chunks total)")
 
 
 # ─────────────────────────────────────────────
 # STEP 3: FASTAPI CHAT ENDPOINT
 # ─────────────────────────────────────────────
-def serve():
-    import chromadb
-    from openai import OpenAI
+def serve(answer_threshold=ANSWER_CACHE_THRESHOLD, answer_ttl=ANSWER_CACHE_TTL, retriever="chroma",
+          hybrid=True, top_k=TOP_K, host="0.0.0.0", port=8000, request_log=True,
+          batch_window=BATCH_WINDOW, batch_max=BATCH_MAX, workers=1, warm_questions=None,
+          snapshot_poll=SNAPSHOT_POLL, context_tokens=CONTEXT_TOKENS, candidates=CONTEXT_CANDIDATES):
+    """
+    POST /chat         → {"answer", "sources", "cached"}
+    POST /chat/stream  → text/event-stream: a `sources` event, then `data: {"token": …}`
+                         as the model produces them, then a `done` event
+    GET  /health       → 503 until the worker is warm, then cache and snapshot stats
+    GET  /metrics      → Prometheus text format: request and per-stage latency
+                         histograms, token counts, cache hits, retrieval scores
+                         (with `workers` > 1, summed over every worker; the
+                         others' share is at most METRICS_DUMP seconds old)
+
+    `retriever` picks the backend: "chroma" (the collection) or "numpy"
+    (the memory-mapped export in vector_index/, no Chroma import at all).
+    With `hybrid`, a BM25 search over the same chunks runs concurrently and
+    the two rankings are merged with reciprocal rank fusion.
+
+    With `request_log`, every request also prints one JSON line to stdout
+    with its stage timings, token counts, cache hits and retrieval scores.
+
+    The best `candidates` hits are reranked, neighbouring and overlapping
+    chunks of a page are merged, and the result is packed into
+    `context_tokens` (context.py); each request logs the tokens that saved.
+    `sources` lists the pages of the packed passages, then every other page
+    a deduplicated chunk in them stands for.
+
+    Questions arriving within `batch_window` seconds of each other (up to
+    `batch_max`) share one embeddings call and one batched top-k query;
+    `batch_max=1` sends every question on its own.
+
+    The numpy retriever and BM25 read the read-only snapshot in
+    vector_index/ (snapshot.py), mapped and warmed once before serving. With
+    `workers` > 1 (numpy retriever only) the app is built once and forked
+    (prefork.py), so every worker shares the imports and one copy of the
+    index. Each worker checks every `snapshot_poll` seconds for a new export
+    from `build` and swaps it in without dropping requests. Questions in the
+    `warm_questions` file (one per line) are embedded into the embedding
+    cache before the first worker starts.
+    """
+    import time
+    started = time.perf_counter()
+
+    import logging
+    import os
+    import shutil
+    import sys
+    import tempfile
+    from contextlib import asynccontextmanager
+
+    import httpx
+    from openai import AsyncOpenAI
     from fastapi import FastAPI
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
     from pydantic import BaseModel
     import uvicorn
+    from answer_cache import AnswerCache
+    from embedding_cache import EmbeddingCache
+    from bm25 import rrf_fuse
+    from context import ContextPacker
+    from embedder import token_counter
+    from metrics import BATCH_BUCKETS, CONTENT_TYPE, SCORE_BUCKETS, TOKEN_BUCKETS, Registry, Trace
+    from micro_batch import MicroBatcher
+    from retrievers import ChromaRetriever
+    from snapshot import Snapshot, version as snapshot_version
+
+    # One keep-alive connection pool shared by every request
+    http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    client = AsyncOpenAI(http_client=http)
+    chroma_store = None
+    if retriever != "numpy":
+        import chromadb
+        chroma_store = ChromaRetriever(chromadb.PersistentClient(path=CHROMA_DIR).get_collection(COLLECTION))
+
+    def load_snapshot():
+        snap = Snapshot.load(VECTOR_INDEX_DIR, lexical=hybrid)
+        mapped = snap.warm()
+        return snap, mapped
+
+    snap = None
+    if retriever == "numpy" or hybrid:
+        snap, mapped = load_snapshot()
+        print(f"📦 Mapped index snapshot: {len(snap)} chunks, {mapped / 2**20:.1f} MB ({VECTOR_INDEX_DIR}/) "
+              f"{time.perf_counter() - started:.2f}s after start")
+
+    cache = EmbeddingCache(EMBED_CACHE_DIR, EMBED_MODEL, max_entries=EMBED_CACHE_MAX)
+    if warm_questions:
+        warm_embedding_cache(cache, warm_questions)
+    if workers > 1:
+        # Forked workers must not write the same cache files; they read what is there now
+        cache.close()
+        cache = EmbeddingCache(EMBED_CACHE_DIR, EMBED_MODEL, max_entries=EMBED_CACHE_MAX, readonly=True)
+    # Every build rewrites the manifest, which drops all cached answers
+    answers = AnswerCache(
+        threshold=answer_threshold, ttl=answer_ttl, max_entries=ANSWER_CACHE_MAX,
+        version=lambda: MANIFEST_FILE.stat().st_mtime if MANIFEST_FILE.exists() else None,
+    )
+
+    registry = Registry()
+    # Forked workers each dump their metrics here; whichever one is scraped sums them all
+    metrics_dir = Path(tempfile.mkdtemp(prefix="rag-metrics-")) if workers > 1 else None
+    requests_total = registry.counter("rag_requests_total", "Chat requests by outcome (answered, cached, error)",
+                                      ["endpoint", "outcome"])
+    in_flight = registry.gauge("rag_requests_in_flight", "Chat requests being handled", ["endpoint"])
+    request_seconds = registry.histogram("rag_request_seconds", "End-to-end chat request latency", ["endpoint"])
+    stage_seconds = registry.histogram(
+        "rag_stage_seconds", "Latency per stage (embed, retrieve_dense, retrieve_lexical, retrieve, "
+        "pack, generate, first_token)", ["stage"])
+    tokens_total = registry.counter("rag_tokens_total", "Tokens reported by the API (embedding, prompt, completion)",
+                                    ["kind"])
+    cache_total = registry.counter("rag_cache_lookups_total", "Embedding and answer cache lookups",
+                                   ["cache", "result"])
+    top_score = registry.histogram("rag_retrieval_top_score", "Cosine similarity of the best dense hit",
+                                   buckets=SCORE_BUCKETS)
+    batch_size = registry.histogram("rag_batch_size", "Questions per batched embedding call / top-k query",
+                                    ["batch"], buckets=BATCH_BUCKETS)
+    snapshot_swaps = registry.counter("rag_snapshot_swaps_total", "Index snapshots swapped in after a build")
+    context_size = registry.histogram("rag_context_tokens", "Prompt context tokens sent, and saved by merging",
+                                      ["kind"], buckets=TOKEN_BUCKETS)
+
+    request_logger = logging.getLogger("rag_pipeline.requests")
+    if request_log and not request_logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+
+    def finish(trace, outcome):
+        """Record a finished request: metrics, then its log line."""
+        requests_total.inc(endpoint=trace.endpoint, outcome=outcome)
+        request_seconds.observe(trace.elapsed, endpoint=trace.endpoint)
+        for stage, seconds in trace.spans.items():
+            stage_seconds.observe(seconds, stage=stage)
+        for kind in ("embedding", "prompt", "completion"):
+            if trace.fields.get(f"{kind}_tokens"):
+                tokens_total.inc(trace.fields[f"{kind}_tokens"], kind=kind)
+        if trace.fields.get("top_score") is not None:
+            top_score.observe(trace.fields["top_score"])
+        if trace.fields.get("context_tokens") is not None:
+            context_size.observe(trace.fields["context_tokens"], kind="packed")
+            context_size.observe(trace.fields["context_saved"], kind="saved")
+        if workers > 1:
+            trace.set(worker=os.getpid())
+        if request_log:
+            request_logger.info(json.dumps({**trace.as_dict(), "outcome": outcome}, ensure_ascii=False))
+
+    async def embed_batch(questions):
+        """One embeddings call for every cache miss in the batch."""
+        batch_size.observe(len(questions), batch="embed")
+        unique = list(dict.fromkeys(questions))
+        emb = await client.embeddings.create(model=EMBED_MODEL, input=unique)
+        vecs = [d.embedding for d in sorted(emb.data, key=lambda d: d.index)]
+        await asyncio.to_thread(cache.put_many, unique, vecs)  # may append to or compact the index
+        # Tokens are billed per call; each request logs its share
+        tokens = round(emb.usage.prompt_tokens / len(questions), 1) if emb.usage else None
+        by_question = dict(zip(unique, vecs))
+        return [(by_question[q], len(questions), tokens) for q in questions]
+
+    dense_k = HYBRID_CANDIDATES if hybrid else candidates
+    packer = ContextPacker(token_counter(CHAT_MODEL), budget=context_tokens, max_passages=top_k)
+
+    async def search_batch(items):
+        """One top-k query per batch; both backends block, so off the event loop."""
+        batch_size.observe(len(items), batch="retrieve")
+        # Questions that arrived either side of a snapshot swap are split by snapshot
+        groups = {}
+        for i, (s, _) in enumerate(items):
+            groups.setdefault(id(s), (s, []))[1].append(i)
+        out = [None] * len(items)
+        for s, rows in groups.values():
+            store = chroma_store if chroma_store is not None else s.vectors
+            hits = await asyncio.to_thread(store.search_batch, [items[i][1] for i in rows], dense_k)
+            for i, h in zip(rows, hits):
+                out[i] = (h, len(items))
+        return out
 
-    app = FastAPI()
+    embedder = MicroBatcher(embed_batch, max_batch=batch_max, window=batch_window)
+    searcher = MicroBatcher(search_batch, max_batch=batch_max, window=batch_window)
+    ready = False
+    failed_version = None
+
+    async def refresh_snapshot():
+        """Swap in the export of a new build; running requests keep the old mapping."""
+        nonlocal snap, failed_version
+        current = snapshot_version(VECTOR_INDEX_DIR)
+        if current is None or current in (snap.version, failed_version):
+            return
+        try:
+            new, _ = await asyncio.to_thread(load_snapshot)
+        except (OSError, ValueError) as e:
+            failed_version = current
+            print(f"⚠️  Worker {os.getpid()} keeps its index snapshot: {e}")
+            return
+        snap = new
+        snapshot_swaps.inc()
+        print(f"🔄 Worker {os.getpid()} swapped in a new index snapshot ({len(new)} chunks)")
+
+    async def watch_snapshot():
+        while True:
+            await asyncio.sleep(snapshot_poll)
+            await refresh_snapshot()
+
+    def dump_metrics():
+        registry.dump(metrics_dir / f"{os.getpid()}.json")
+
+    async def publish_metrics():
+        while True:
+            await asyncio.sleep(METRICS_DUMP)
+            await asyncio.to_thread(dump_metrics)
+
+    async def warm_worker():
+        """First query on each backend (thread pool, BLAS, Chroma), then report ready."""
+        nonlocal ready
+        warm_started = time.perf_counter()
+        if snap is not None:
+            await refresh_snapshot()  # a restarted worker may have forked from an older one
+            await asyncio.to_thread(snap.vectors.search, [1.0] * snap.vectors.matrix.shape[1], 1)
+            if snap.lexical is not None:
+                await asyncio.to_thread(snap.lexical.search, "daycare", 1)
+        if chroma_store is not None and snap is not None and len(snap):
+            await asyncio.to_thread(chroma_store.search, snap.vectors.matrix[0], 1)
+        ready = True
+        print(f"✅ Worker {os.getpid()} ready ({time.perf_counter() - warm_started:.2f}s warm-up)")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        tasks = [asyncio.create_task(warm_worker())]
+        if snap is not None:
+            tasks.append(asyncio.create_task(watch_snapshot()))
+        if metrics_dir is not None:
+            tasks.append(asyncio.create_task(publish_metrics()))
+        yield
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if metrics_dir is not None:
+            dump_metrics()  # what this worker served keeps counting after it exits
+        await embedder.close()
+        await searcher.close()
+        await http.aclose()
+        cache.close()
+
+    app = FastAPI(lifespan=lifespan)
     app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
-    client = OpenAI()
-    chroma = chromadb.PersistentClient(path=CHROMA_DIR)
-    col = chroma.get_collection(COLLECTION)
-
     class Query(BaseModel):
         question: str
 
+    async def embed_question(question, trace):
+        # Repeat questions come from the cache
+        with trace.span("embed"):
+            vec = cache.get(question)
+            trace.set(embedding_cached=vec is not None)
+            cache_total.inc(cache="embedding", result="miss" if vec is None else "hit")
+            if vec is None:
+                vec, size, tokens = await embedder.submit(question)
+                trace.set(embedding_tokens=tokens, embed_batch=size)
+        return vec
+
+    def lookup_answer(vec, trace):
+        cached = answers.lookup(vec)
+        trace.set(answer_cached=cached is not None)
+        cache_total.inc(cache="answer", result="miss" if cached is None else "hit")
+        return cached
+
+    async def timed(trace, stage, fn, *args):
+        with trace.span(stage):
+            return await asyncio.to_thread(fn, *args)
+
+    async def search_dense(s, vec, trace):
+        with trace.span("retrieve_dense"):
+            hits, size = await searcher.submit((s, vec))
+        trace.set(retrieve_batch=size)
+        return hits
+
+    async def retrieve(question, vec, trace):
+        # Retrieve candidate chunks; the dense query is batched with concurrent requests.
+        # One snapshot for the whole request, even if a swap lands halfway.
+        s = snap
+        with trace.span("retrieve"):
+            if not hybrid:
+                hits = await search_dense(s, vec, trace)
+                trace.set(top_score=round(hits[0].score, 4) if hits else None)
+            else:
+                dense, lex = await asyncio.gather(
+                    search_dense(s, vec, trace),
+                    timed(trace, "retrieve_lexical", s.lexical.search, question, HYBRID_CANDIDATES),
+                )
+                # Read the best cosine before rank fusion overwrites the scores
+                trace.set(top_score=round(dense[0].score, 4) if dense else None, lexical_hits=len(lex))
+                hits = rrf_fuse([dense, lex], candidates)
+        # Rerank, merge neighbours and overlaps, pack into the token budget
+        with trace.span("pack"):
+            context, sources, packed = packer.pack(question, hits)
+        trace.set(scores=[round(h.score, 4) for h in hits[:top_k]], candidates=len(hits),
+                  context_chunks=packed.chunks, context_passages=packed.passages,
+                  context_tokens=packed.tokens, context_saved=packed.saved)
+        return context, sources
+
+    def record_usage(usage, trace):
+        if usage:
+            trace.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
     @app.post("/chat")
-    def chat(q: Query):
-        # Embed the question
-        emb = client.embeddings.create(model="text-embedding-3-small", input=[q.question])
-        vec = emb.data[0].embedding
-
-        # Retrieve top 4 chunks
-        results = col.query(query_embeddings=[vec], n_results=4)
-        chunks = results["documents"][0]
-        sources = [m["url"] for m in results["metadatas"][0]]
-        context = "\n\n---\n\n".join(chunks)
-
-        # Generate answer
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": (
-                    "You are a helpful assistant for Friendship Daycare. "
-                    "Answer questions using only the context provided. "
-                    "Be friendly and concise."
-                )},
-                {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {q.question}"}
-            ]
-        )
-        return {
-            "answer": resp.choices[0].message.content,
-            "sources": list(set(sources))
-        }
+    async def chat(q: Query):
+        trace = Trace("/chat")
+        in_flight.inc(endpoint=trace.endpoint)
+        try:
+            vec = await embed_question(q.question, trace)
+
+            # Near-identical question answered recently?
+            cached = lookup_answer(vec, trace)
+            if cached is not None:
+                finish(trace, "cached")
+                return {**cached, "cached": True}
+
+            context, sources = await retrieve(q.question, vec, trace)
+
+            # Generate answer
+            with trace.span("generate"):
+                resp = await client.chat.completions.create(model=CHAT_MODEL,
+                                                            messages=chat_messages(context, q.question))
+            record_usage(resp.usage, trace)
+            answer = {
+                "answer": resp.choices[0].message.content,
+                "sources": sources
+            }
+            answers.store(q.question, vec, answer)
+            finish(trace, "answered")
+            return {**answer, "cached": False}
+        except Exception as e:
+            trace.set(error=type(e).__name__)
+            finish(trace, "error")
+            raise
+        finally:
+            in_flight.dec(endpoint=trace.endpoint)
+
+    @app.post("/chat/stream")
+    async def chat_stream(q: Query):
+        trace = Trace("/chat/stream")
+        in_flight.inc(endpoint=trace.endpoint)
+        try:
+            vec = await embed_question(q.question, trace)
+            cached = lookup_answer(vec, trace)
+        except Exception as e:
+            trace.set(error=type(e).__name__)
+            finish(trace, "error")
+            in_flight.dec(endpoint=trace.endpoint)
+            raise
+
+        async def events():
+            outcome = "error"
+            try:
+                if cached is not None:
+                    yield sse({"sources": cached["sources"], "cached": True}, event="sources")
+                    yield sse({"token": cached["answer"]})
+                    yield sse({}, event="done")
+                    outcome = "cached"
+                    return
+
+                context, sources = await retrieve(q.question, vec, trace)
+                yield sse({"sources": sources, "cached": False}, event="sources")
+
+                parts = []
+                with trace.span("generate"):
+                    stream = await client.chat.completions.create(
+                        model=CHAT_MODEL, messages=chat_messages(context, q.question), stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    async for chunk in stream:
+                        record_usage(chunk.usage, trace)  # only the final chunk carries usage
+                        token = chunk.choices[0].delta.content if chunk.choices else None
+                        if token:
+                            if not parts:
+                                trace.spans["first_token"] = trace.elapsed
+                            parts.append(token)
+                            yield sse({"token": token})
+                answers.store(q.question, vec, {"answer": "".join(parts), "sources": sources})
+                yield sse({}, event="done")
+                outcome = "answered"
+            except Exception as e:
+                trace.set(error=type(e).__name__)
+                raise
+            finally:
+                finish(trace, outcome)
+                in_flight.dec(endpoint=trace.endpoint)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
     @app.get("/health")
-    def health():
-        return {"status": "ok"}
+    async def health():
+        if not ready:
+            return JSONResponse({"status": "starting", "worker": os.getpid()}, status_code=503)
+        return {"status": "ok", "worker": os.getpid(), "snapshot_chunks": len(snap) if snap is not None else None,
+                "embedding_cache": cache.stats(), "answer_cache": answers.stats()}
+
+    @app.get("/metrics")
+    async def metrics():
+        # Each forked worker keeps its own registry; this one's is live, the rest come from their dumps
+        body = await asyncio.to_thread(registry.render, metrics_dir)
+        return Response(body, media_type=CONTENT_TYPE)
+
+    if workers > 1:
+        from prefork import serve_forked
+        try:
+            serve_forked(app, host, port, workers)
+        finally:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+        return
+    print(f"🚀 Serving at http://localhost:{port}")
+    uvicorn.run(app, host=host, port=port)
+
+
+def warm_embedding_cache(cache, path, batch=256):
+    """Embed the questions in `path` (one per line) that the cache doesn't have yet."""
+    from openai import OpenAI
+
+    questions = [q.strip() for q in Path(path).read_text(encoding="utf-8").splitlines() if q.strip()]
+    missing = [q for q, vec in zip(questions, cache.get_many(questions)) if vec is None]
+    if missing:
+        with OpenAI() as client:
+            for i in range(0, len(missing), batch):
+                emb = client.embeddings.create(model=EMBED_MODEL, input=missing[i:i + batch])
+                cache.put_many(missing[i:i + batch], [d.embedding for d in sorted(emb.data, key=lambda d: d.index)])
+    cache.flush()
+    print(f"🔥 Embedding cache warm: {len(questions) - len(missing)} of {len(questions)} questions cached, "
+          f"{len(missing)} embedded")
+
+
+def chat_messages(context, question):
+    return [
+        {"role": "system", "content": (
+            "You are a helpful assistant for Friendship Daycare. "
+            "Answer questions using only the context provided. "
+            "Be friendly and concise."
+        )},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
+    ]
+
 
-    print("🚀 Serving at http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+def sse(data, event=None):
+    """Format one server-sent event."""
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 # ─────────────────────────────────────────────
 # CLI
 # ─────────────────────────────────────────────
 if __name__ == "__main__":
-    cmd = sys.argv[1] if len(sys.argv) > 1 else "help"
-    if cmd == "scrape":
-        asyncio.run(scrape())
-    elif cmd == "build":
-        build()
-    elif cmd == "serve":
-        serve()
+    from crawler import add_crawl_args, config_from_args
+    from extract import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Scrape → Chunk → Embed → RAG → Serve")
+    sub = parser.add_subparsers(dest="cmd")
+    sc = sub.add_parser("scrape", help="crawl site → save pages")
+    add_crawl_args(sc, BASE_URL)
+    sc.add_argument("--parser", choices=list(BACKENDS), help="HTML parser backend (default: fastest installed)")
+    b = sub.add_parser("build", help="chunk + embed → Chroma DB")
+    b.add_argument("--full", action="store_true", help="drop the collection and re-index every page")
+    b.add_argument("--embed-workers", type=int, default=4, help="concurrent embedding requests")
+    b.add_argument("--batch-tokens", type=int, default=None, help="max tokens per embedding request")
+    b.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="max tokens per chunk")
+    b.add_argument("--no-dedup", action="store_true", help="embed near-duplicate pages and chunks too")
+    sub.add_parser("export", help="pages.jsonl → pages.json")
+    s = sub.add_parser("serve", help="run FastAPI chat endpoint")
+    s.add_argument("--answer-threshold", type=float, default=ANSWER_CACHE_THRESHOLD,
+                   help="cosine similarity above which a cached answer is reused")
+    s.add_argument("--answer-ttl", type=float, default=ANSWER_CACHE_TTL,
+                   help="seconds a cached answer stays valid")
+    s.add_argument("--retriever", choices=["chroma", "numpy"], default="chroma",
+                   help="retrieval backend (numpy = memory-mapped vector_index/)")
+    s.add_argument("--dense-only", action="store_true", help="skip BM25 and rank fusion")
+    s.add_argument("--top-k", type=int, default=TOP_K, help="max passages passed to the model")
+    s.add_argument("--candidates", type=int, default=CONTEXT_CANDIDATES,
+                   help="retrieved chunks reranked and packed into the context")
+    s.add_argument("--context-tokens", type=int, default=CONTEXT_TOKENS, help="token budget for the context")
+    s.add_argument("--host", default="0.0.0.0")
+    s.add_argument("--port", type=int, default=8000)
+    s.add_argument("--no-request-log", action="store_true", help="don't print a JSON line per request")
+    s.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW * 1000,
+                   help="wait this long to batch concurrent questions into one embedding call / top-k query")
+    s.add_argument("--batch-max", type=int, default=BATCH_MAX, help="max questions per batch (1 = no batching)")
+    s.add_argument("--workers", type=int, default=1,
+                   help="pre-forked worker processes sharing one mapped index (needs --retriever numpy)")
+    s.add_argument("--warm-questions", type=Path, help="file of questions (one per line) to embed before serving")
+    s.add_argument("--snapshot-poll", type=float, default=SNAPSHOT_POLL,
+                   help="seconds between checks for a rebuilt index to hot-swap")
+    args = parser.parse_args()
+
+    if args.cmd == "scrape":
+        asyncio.run(scrape(args.base_url, config_from_args(args), args.parser))
+    elif args.cmd == "build":
+        build(full=args.full, embed_workers=args.embed_workers, batch_tokens=args.batch_tokens,
+              chunk_tokens=args.chunk_tokens, dedup=not args.no_dedup)
+    elif args.cmd == "export":
+        from page_store import export_json
+        print(f"✅ {export_json(PAGES_FILE, JSON_EXPORT_FILE)} pages → {JSON_EXPORT_FILE}")
+    elif args.cmd == "serve":
+        if args.workers > 1 and args.retriever != "numpy":
+            s.error("--workers > 1 needs --retriever numpy (a Chroma client can't be shared across a fork)")
+        serve(answer_threshold=args.answer_threshold, answer_ttl=args.answer_ttl, retriever=args.retriever,
+              hybrid=not args.dense_only, top_k=args.top_k, host=args.host, port=args.port,
+              request_log=not args.no_request_log, batch_window=args.batch_window_ms / 1000,
+              batch_max=args.batch_max, workers=args.workers, warm_questions=args.warm_questions,
+              snapshot_poll=args.snapshot_poll, context_tokens=args.context_tokens, candidates=args.candidates)
     else:
-        print("Usage: python rag_pipeline.py [scrape | build | serve]")
+        parser.print_help()
@@ -0,0 +1,195 @@
+"""
+retrievers.py — Pluggable top-k retrieval backends for rag_pipeline.py serve
+
+    ChromaRetriever  the persistent Chroma collection `build` writes
+    NumpyRetriever   an exported, memory-mapped float32 matrix; top-k is one
+                     matrix-vector product plus argpartition
+
+NumPy index layout (written by `export_numpy_index` at the end of `build`):
+
+    vector_index/embeddings.f32   (count, dim) unit-normalized float32, raw
+    vector_index/texts.bin        every chunk's UTF-8 text, concatenated
+    vector_index/offsets.npy      int64 (count + 1) byte offsets into texts.bin
+    vector_index/ids.npy          chunk IDs, fixed-width bytes
+    vector_index/url_idx.npy      int32 per-chunk index into the url table
+    vector_index/positions.npy    int32 chunk number within its page (-1: unknown),
+                                  from the chunk's `position` metadata
+    vector_index/source_offsets.npy  int64 (count + 1) offsets into source_idx.npy
+    vector_index/source_idx.npy   int32 url-table indexes of every page a chunk
+                                  stands for, from its `sources` metadata
+    vector_index/meta.json        format, dim, count, url + title table
+    vector_index/bm25_*           lexical inverted index over the same chunks (bm25.py)
+
+Everything sized by the chunk count is memory-mapped read-only, so serve
+workers forked from one process (or started separately) share one copy in
+the page cache; only the per-URL table is parsed into each process.
+
+Scores are cosine similarities for both backends.
+"""
+
+import json
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+from bm25 import write_bm25
+
+INDEX_FORMAT = 4             # bump when the layout changes; serve refuses older exports
+
+
+@dataclass
+class Hit:
+    id: str
+    text: str
+    url: str
+    title: str
+    score: float
+    position: int = -1       # chunk number within its page, where the backend knows it
+    sources: tuple = ()      # every page the chunk stands for (dedup.py), `url` included
+
+
+class Retriever(Protocol):
+    def search(self, vec, k: int) -> list: ...
+    def search_batch(self, vecs, k: int) -> list: ...
+
+
+# ─────────────────────────────────────────────
+# Chroma
+# ─────────────────────────────────────────────
+class ChromaRetriever:
+    def __init__(self, col):
+        self.col = col
+
+    def search(self, vec, k: int) -> list:
+        return self.search_batch([vec], k)[0]
+
+    def search_batch(self, vecs, k: int) -> list:
+        results = self.col.query(query_embeddings=[np.asarray(v, dtype=np.float32) for v in vecs], n_results=k)
+        out = []
+        for ids, docs, metas, dists in zip(results["ids"], results["documents"],
+                                           results["metadatas"], results["distances"]):
+            # Default space is squared L2; on unit vectors that is 2 - 2·cos
+            out.append([Hit(i, d, m["url"], m.get("title", ""), 1.0 - dist / 2, int(m.get("position", -1)),
+                            tuple(m["sources"].split("\n")) if m.get("sources") else ())
+                        for i, d, m, dist in zip(ids, docs, metas, dists)])
+        return out
+
+
+# ─────────────────────────────────────────────
+# NumPy
+# ─────────────────────────────────────────────
+class NumpyRetriever:
+    def __init__(self, path):
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"{path}/ was exported by an older build; run `rag_pipeline.py build` again")
+        self.urls = meta["urls"]
+        self.titles = meta["titles"]
+        self.ids = np.load(path / "ids.npy", mmap_mode="r")
+        self.url_idx = np.load(path / "url_idx.npy", mmap_mode="r")
+        self.positions = np.load(path / "positions.npy", mmap_mode="r")
+        self.source_offsets = np.load(path / "source_offsets.npy", mmap_mode="r")
+        self.source_idx = np.load(path / "source_idx.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        if meta["count"]:
+            self.matrix = np.memmap(path / "embeddings.f32", dtype=np.float32, mode="r",
+                                    shape=(meta["count"], meta["dim"]))
+            self.texts = np.memmap(path / "texts.bin", dtype=np.uint8, mode="r")
+        else:  # empty files can't be mapped
+            self.matrix = np.zeros((0, meta["dim"]), dtype=np.float32)
+            self.texts = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def text(self, i: int) -> str:
+        return bytes(self.texts[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def hit(self, i: int, score: float) -> Hit:
+        u = self.url_idx[i]
+        sources = self.source_idx[self.source_offsets[i]:self.source_offsets[i + 1]]
+        return Hit(self.ids[i].decode("utf-8"), self.text(i), self.urls[u], self.titles[u], float(score),
+                   int(self.positions[i]), tuple(self.urls[s] for s in sources))
+
+    def search(self, vec, k: int) -> list:
+        return self.search_batch([vec], k)[0]
+
+    def search_batch(self, vecs, k: int) -> list:
+        q = np.asarray(vecs, dtype=np.float32)
+        q /= np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in q]
+        scores = q @ self.matrix.T                       # (queries, count)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        out = []
+        for row, idx in zip(scores, top):
+            idx = idx[np.argsort(-row[idx])]
+            out.append([self.hit(i, row[i]) for i in idx])
+        return out
+
+
+def export_numpy_index(col, path) -> int:
+    """Dump a Chroma collection into the NumPy index layout; returns the chunk count."""
+    path = Path(path)
+    data = col.get(include=["embeddings", "documents", "metadatas"])
+    ids = list(data["ids"])
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    if not ids:
+        matrix = matrix.reshape(0, 0)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    urls, titles, url_pos, url_idx, positions = [], [], {}, [], []
+    for meta in data["metadatas"]:
+        if meta["url"] not in url_pos:
+            url_pos[meta["url"]] = len(urls)
+            urls.append(meta["url"])
+            titles.append(meta.get("title", ""))
+        url_idx.append(url_pos[meta["url"]])
+        positions.append(meta.get("position", -1))
+    # Pages that own no chunk (all of theirs are duplicates) only appear as sources
+    source_idx, source_offsets = [], [0]
+    for meta in data["metadatas"]:
+        for url in meta["sources"].split("\n") if meta.get("sources") else ():
+            if url not in url_pos:
+                url_pos[url] = len(urls)
+                urls.append(url)
+                titles.append("")
+            source_idx.append(url_pos[url])
+        source_offsets.append(len(source_idx))
+
+    encoded = [doc.encode("utf-8") for doc in data["documents"]]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    # Write next to the live index, then swap, so readers never see a half-written one
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    matrix.tofile(tmp / "embeddings.f32")
+    (tmp / "texts.bin").write_bytes(b"".join(encoded))
+    np.save(tmp / "offsets.npy", offsets)
+    np.save(tmp / "ids.npy", np.asarray([i.encode("utf-8") for i in ids], dtype=np.bytes_).reshape(len(ids)))
+    np.save(tmp / "url_idx.npy", np.asarray(url_idx, dtype=np.int32))
+    np.save(tmp / "positions.npy", np.asarray(positions, dtype=np.int32))
+    np.save(tmp / "source_offsets.npy", np.asarray(source_offsets, dtype=np.int64))
+    np.save(tmp / "source_idx.npy", np.asarray(source_idx, dtype=np.int32))
+    write_bm25(tmp, data["documents"])
+    (tmp / "meta.json").write_text(json.dumps({
+        "format": INDEX_FORMAT,
+        "dim": int(matrix.shape[1]) if len(ids) else 0,
+        "count": len(ids),
+        "urls": urls,
+        "titles": titles,
+    }, ensure_ascii=False), encoding="utf-8")
+    old = path.with_name(path.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if path.exists():
+        path.rename(old)
+    tmp.rename(path)
+    shutil.rmtree(old, ignore_errors=True)
+    return len(ids)
@@ -3,136 +3,104 @@ Playwright scraper → static JSON for friendshipdaycare.com
 No RAG, no LLM. Just clean structured data you can use directly.
 
 Usage:
-    pip install playwright beautifulsoup4
+    pip install playwright httpx selectolax      # or lxml, or beautifulsoup4
     playwright install chromium
     python scrape_to_json.py
-
-Output: site_content.json
+    python scrape_to_json.py --workers 8 --per-host-rate 10 --deadline 300
+    python scrape_to_json.py --parse-workers 4     # HTML parser processes (default: one per CPU)
+    python scrape_to_json.py --full    # ignore crawl state, re-fetch every page
+    python scrape_to_json.py --parser lxml
+
+Output: site_content.jsonl       (one page per line, fsynced as the crawl goes)
+        site_content.json        (the same pages as one document, for the site)
+        site_content.state.json  (per-URL ETag / Last-Modified / SHA-256)
+        site_content.diff.json   (added / changed / removed since last run)
 """
 
+import argparse
 import asyncio
+import dataclasses
 import json
-import re
+from functools import partial
 from pathlib import Path
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from crawl_state import CrawlState
+from crawler import CrawlConfig, add_crawl_args, config_from_args, crawl
+from extract import BACKENDS, extract
+from page_store import PageReader, PageWriter, export_json
 
 BASE_URL = "https://www.friendshipdaycare.com"
-OUTPUT_FILE = Path("site_content.json")
-
-visited = set()
-to_visit = {BASE_URL}
-results = []
-
-
-def extract_page_data(html: str, url: str) -> dict:
-    """Extract structured data from a page."""
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Remove noise
-    for tag in soup.select("nav, header, footer, script, style, iframe, noscript"):
-        tag.decompose()
-
-    title = soup.title.string.strip() if soup.title else ""
-    slug = urlparse(url).path.strip("/") or "home"
-
-    # Meta description
-    meta = soup.find("meta", attrs={"name": "description"})
-    description = meta["content"].strip() if meta and meta.get("content") else ""
-
-    # Headings
-    headings = [h.get_text(strip=True) for h in soup.find_all(["h1", "h2", "h3"]) if h.get_text(strip=True)]
-
-    # Main body text
-    main = soup.find("main") or soup.find("article") or soup.find("body")
-    paragraphs = []
-    if main:
-        for p in main.find_all("p"):
-            text = p.get_text(strip=True)
-            if text:
-                paragraphs.append(text)
-
-    # Images with alt text
-    images = []
-    for img in soup.find_all("img", src=True):
-        images.append({
-            "src": urljoin(url, img["src"]),
-            "alt": img.get("alt", "").strip()
-        })
-
-    # Internal links on this page
-    links = []
-    for a in soup.find_all("a", href=True):
-        full = urljoin(url, a["href"])
-        if urlparse(full).netloc == urlparse(BASE_URL).netloc:
-            links.append({
-                "text": a.get_text(strip=True),
-                "href": full.split("#")[0]
-            })
-
+PAGES_FILE = Path("site_content.jsonl")      # one page per line, written as the crawl goes
+OUTPUT_FILE = Path("site_content.json")      # {"site", "total_pages", "pages"} exported at the end
+STATE_FILE = Path("site_content.state.json")
+FRONTIER_FILE = Path("site_content.frontier.json")
+DIFF_FILE = Path("site_content.diff.json")
+BLOCKED_RESOURCES = "**/*.{png,jpg,jpeg,gif,svg,woff,woff2,ttf}"
+
+
+def extract_page_data(html: str, url: str, base_url: str = BASE_URL,
+                      parser: str | None = None) -> tuple[dict, set[str]]:
+    """Extract a page → (record, internal links to crawl next).
+
+    The record holds url, slug, title, description, headings, paragraphs,
+    images and links; the internal links are the set of absolute URLs on the site.
+    """
+    data = extract(html, url, base_url, parser)
     return {
         "url": url,
-        "slug": slug,
-        "title": title,
-        "description": description,
-        "headings": headings,
-        "paragraphs": paragraphs,
-        "images": images,
-        "links": links,
-    }
-
-
-def extract_internal_links(html: str, current_url: str) -> set:
-    soup = BeautifulSoup(html, "html.parser")
-    links = set()
-    for a in soup.find_all("a", href=True):
-        full = urljoin(current_url, a["href"])
-        parsed = urlparse(full)
-        if parsed.netloc == urlparse(BASE_URL).netloc and parsed.scheme in ("http", "https"):
-            links.add(full.split("#")[0].rstrip("/"))
-    return links
-
-
-async def scrape():
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        await page.route("**/*.{png,jpg,jpeg,gif,svg,woff,woff2,ttf}", lambda r: r.abort())
-
-        while to_visit:
-            url = to_visit.pop()
-            if url in visited:
-                continue
-            visited.add(url)
-
-            print(f"  Scraping: {url}")
-            try:
-                await page.goto(url, wait_until="domcontentloaded", timeout=15000)
-                html = await page.content()
-            except Exception as e:
-                print(f"    ⚠ Failed: {e}")
-                continue
-
-            data = extract_page_data(html, url)
-            results.append(data)
+        "slug": urlparse(url).path.strip("/") or "home",
+        "title": data["title"],
+        "description": data["description"],
+        "headings": data["headings"],
+        "paragraphs": data["paragraphs"],
+        "images": data["images"],
+        "links": data["links"],
+    }, data["internal_links"]
+
+
+async def scrape(base_url: str = BASE_URL, config: CrawlConfig | None = None, parser: str | None = None):
+    config = config or CrawlConfig(blocked_resources=BLOCKED_RESOURCES)
+
+    # Unchanged pages reuse their record from the last run
+    state = CrawlState.load(STATE_FILE)
+    previous = PageReader(PAGES_FILE) if PAGES_FILE.exists() else None
+    if previous is None:
+        config = dataclasses.replace(config, incremental=False)
+
+    # Each page is on disk the moment it is extracted; a crash leaves site_content.jsonl.partial
+    with PageWriter(PAGES_FILE) as pages:
+        def handle(url: str, parsed: tuple) -> set:
+            data, links = parsed
+            pages.write(data)
             print(f"    ✓ {data['title']} — {len(data['paragraphs'])} paragraphs")
+            return links
+
+        def unchanged(url: str):
+            if previous and url in previous:
+                pages.write_line(previous.line(url))
 
-            new_links = extract_internal_links(html, url)
-            to_visit.update(new_links - visited)
+        stats = await crawl([base_url.rstrip("/")], handle, config, state=state, on_unchanged=unchanged,
+                            parse=partial(extract_page_data, base_url=base_url, parser=parser),
+                            frontier_path=FRONTIER_FILE)
+        if not stats.complete and previous:
+            for u in sorted(previous.urls() - state.visited):
+                pages.write_line(previous.line(u))
 
-        await browser.close()
+    diff = state.finish(complete=stats.complete)
+    state.save()
+    DIFF_FILE.write_text(json.dumps(diff, indent=2, ensure_ascii=False), encoding="utf-8")
 
-    # Save everything to one JSON file
-    output = {
-        "site": BASE_URL,
-        "total_pages": len(results),
-        "pages": results
-    }
-    OUTPUT_FILE.write_text(json.dumps(output, indent=2, ensure_ascii=False), encoding="utf-8")
-    print(f"\n✅ Done! {len(results)} pages → {OUTPUT_FILE}")
+    # The site reads one JSON document; stream it out of the JSONL file
+    export_json(PAGES_FILE, OUTPUT_FILE, {"site": base_url, "total_pages": pages.count})
+    print(f"\n✅ Done! {pages.count} pages → {PAGES_FILE}, {OUTPUT_FILE}")
+    print(f"   {len(diff['added'])} added, {len(diff['changed'])} changed, "
+          f"{len(diff['removed'])} removed, {diff['unchanged']} unchanged → {DIFF_FILE}")
 
 
 if __name__ == "__main__":
-    asyncio.run(scrape())
+    parser = argparse.ArgumentParser(description="Scrape the site into structured JSON")
+    add_crawl_args(parser, BASE_URL)
+    parser.add_argument("--parser", choices=list(BACKENDS), help="HTML parser backend (default: fastest installed)")
+    args = parser.parse_args()
+    asyncio.run(scrape(args.base_url, config_from_args(args, blocked_resources=BLOCKED_RESOURCES), args.parser))
@@ -0,0 +1,91 @@
+"""
+snapshot.py — The read-only index snapshot serve answers from
+
+`build` exports vector_index/ (retrievers.export_numpy_index) by writing a
+new directory and renaming it over the old one. A Snapshot maps one such
+export — dense vectors, chunk texts and the BM25 postings — read-only:
+
+    shared     every process that maps the same files shares one physical
+               copy in the page cache, so N serve workers cost roughly one
+               index, not N
+    warm       `warm()` faults every page in before the worker reports
+               ready, so the first requests don't pay for disk reads
+    swappable  `version()` changes when a rebuild renames a new export into
+               place; serve loads and warms the new snapshot next to the old
+               one, then switches. Requests already running keep the old
+               mapping, which stays valid after its files are deleted.
+
+Usage:
+    snap = Snapshot.load(VECTOR_INDEX_DIR)
+    snap.warm()
+    ...
+    if version(VECTOR_INDEX_DIR) != snap.version:
+        snap = Snapshot.load(VECTOR_INDEX_DIR)
+"""
+
+import mmap
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bm25 import BM25Retriever
+from retrievers import NumpyRetriever
+
+LOAD_ATTEMPTS = 20
+LOAD_RETRY = 0.1     # seconds between attempts while a rebuild is swapping directories
+
+
+def version(path):
+    """Identity of the export currently at `path` (a rebuild writes a new meta.json), or None."""
+    try:
+        st = os.stat(Path(path) / "meta.json")
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+class Snapshot:
+    def __init__(self, path, lexical: bool = True):
+        self.path = Path(path)
+        self.version = version(path)
+        self.vectors = NumpyRetriever(path)
+        self.lexical = BM25Retriever(path, self.vectors) if lexical else None
+
+    @classmethod
+    def load(cls, path, lexical: bool = True) -> "Snapshot":
+        """Map the export at `path`, retrying if a rebuild swaps it mid-load."""
+        error = None
+        for _ in range(LOAD_ATTEMPTS):
+            before = version(path)
+            if before is not None:
+                try:
+                    snap = cls(path, lexical)
+                except (OSError, ValueError) as e:  # files renamed away, or a mix of two exports
+                    error = e
+                else:
+                    if version(path) == before:
+                        snap.version = before
+                        return snap
+            time.sleep(LOAD_RETRY)
+        raise error or FileNotFoundError(f"no index snapshot at {path}/ (run `rag_pipeline.py build`)")
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def arrays(self) -> list:
+        v = self.vectors
+        arrays = [v.matrix, v.texts, v.offsets, v.ids, v.url_idx, v.positions, v.source_offsets, v.source_idx]
+        if self.lexical is not None:
+            arrays += [self.lexical.docs, self.lexical.tfs]
+        return [a for a in arrays if a is not None]
+
+    def warm(self) -> int:
+        """Read one byte per page of every mapped array; returns the bytes mapped."""
+        total = 0
+        for a in self.arrays():
+            flat = np.asarray(a).reshape(-1).view(np.uint8)
+            flat[::mmap.PAGESIZE].sum(dtype=np.uint64)
+            total += flat.nbytes
+        return total
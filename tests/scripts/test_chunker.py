@@ -0,0 +1,14 @@
+from chunker import iter_chunks
+
+
+def count_tokens(text):
+    return len(text.split())
+
+
+def test_no_chunk_exceeds_max_tokens_under_a_long_heading():
+    page = {"sections": [{"heading": " ".join(["Heading"] * 350), "paragraphs": [" ".join(["word"] * 1000)]},
+                         {"heading": "Hours", "paragraphs": ["Open weekdays. " * 100]}]}
+    chunks = list(iter_chunks(page, count_tokens, 300))
+    assert all(count_tokens(c) <= 300 for c in chunks)
+    assert sum(c.count("word") for c in chunks) == 1000
+    assert all(not c.startswith("word") for c in chunks[:4])  # the cut heading still leads each chunk
@@ -0,0 +1,64 @@
+import asyncio
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import CrawlConfig, crawl
+
+HREF_RE = re.compile(r'href="([^"]+)"')
+
+
+def serve_site(pages):
+    """A local site whose home page links /p/0 … /p/<pages-1>; returns (server, base URL)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/":
+                links = "".join(f'<a href="/p/{i}">Page {i}</a>' for i in range(pages))
+            elif re.fullmatch(r"/p/\d+", self.path):
+                links = '<a href="/">Home</a>'
+            else:
+                self.send_error(404)
+                return
+            body = f"<html><body><main><h1>{self.path}</h1>{links}</main></body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+@pytest.mark.parametrize("pages", [8, 20])
+def test_resume_after_deadline_handles_every_page_once(tmp_path, pages):
+    server, base = serve_site(pages)
+    handled = Counter()
+
+    def handle(url, html):
+        handled[url] += 1
+        return {base + href for href in HREF_RE.findall(html)}
+
+    def run(**options):
+        config = CrawlConfig(fetch="http", sitemap=False, robots=False, incremental=False,
+                             per_host_rate=4, **options)
+        return asyncio.run(crawl([base + "/"], handle, config, frontier_path=tmp_path / "frontier.json"))
+
+    try:
+        first = run(deadline=pages / 4 * 0.4)
+        assert first.timed_out
+        run(resume=True)
+    finally:
+        server.shutdown()
+
+    expected = {base} | {f"{base}/p/{i}" for i in range(pages)}    # the home page is keyed without its slash
+    assert set(handled) == expected
+    assert all(n == 1 for n in handled.values())
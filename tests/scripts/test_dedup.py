@@ -0,0 +1,49 @@
+import random
+
+from chunker import iter_chunks
+from index_manifest import chunk_id
+from rag_pipeline import plan_chunks
+
+WORDS = ("our caring teachers guide every child through play art music stories outdoor time and quiet rest "
+         "meals snacks naps families learning friends garden blocks painting songs reading").split()
+_rng = random.Random(7)
+SHARED = " ".join(_rng.choice(WORDS) + ("." if i % 12 == 11 else "") for i in range(200))
+
+
+def count_tokens(text):
+    return len(text.split())
+
+
+def page(title, fee, hours):
+    return {"title": title, "text": f"{SHARED}\n\n{fee}\n\n{hours}",
+            "sections": [{"heading": title, "paragraphs": [SHARED, fee]},
+                         {"heading": "Hours", "paragraphs": [f"{SHARED} {hours}"]}]}
+
+
+def indexed_texts(pages):
+    plan, sources, owner, titles = plan_chunks(pages, count_tokens)
+    return [text for url, p in pages for text in iter_chunks(p, count_tokens) if owner.get(chunk_id(url, text)) == url]
+
+
+def test_chunks_differing_in_a_fact_are_both_indexed():
+    pages = [("https://example.com/infant", page("Infant room", "Infant room fees: $1,200", "Open 7am to 6pm")),
+             ("https://example.com/toddler", page("Toddler room", "Toddler room fees: $1,450", "Open 8am to 5pm"))]
+    texts = "\n".join(indexed_texts(pages))
+    for fact in ("$1,200", "$1,450", "7am to 6pm", "8am to 5pm"):
+        assert fact in texts
+
+
+def test_repeated_chunks_are_indexed_once():
+    block = {"title": "Contact", "text": SHARED, "sections": [{"heading": "Contact", "paragraphs": [SHARED]}]}
+    pages = [("https://example.com/a", block), ("https://example.com/b", block)]
+    plan, sources, owner, titles = plan_chunks(pages, count_tokens)
+    assert plan["https://example.com/a"][1] == plan["https://example.com/b"][1]
+    assert all(sources[cid] == ["https://example.com/a", "https://example.com/b"] for cid in owner)
+
+
+def test_near_duplicate_chunks_with_the_same_numbers_collapse():
+    pages = [("https://example.com/a", page("Programs", "Fees: $1,200", "Open 7am to 6pm")),
+             ("https://example.com/b", page("Programs", "Our fees: $1,200", "Open 7am to 6pm"))]
+    plan, sources, owner, titles = plan_chunks(pages, count_tokens)
+    assert set(plan["https://example.com/b"][1]) <= set(owner)
+    assert all(owner[cid] == "https://example.com/a" for cid in plan["https://example.com/b"][1])